@@ -33,6 +33,7 @@ from flask_mail import Mail
 from models.models import db, PHRegionTable, PHCityTable  # Import PHRegionTable
 from app.on_off_sse import message_events_blueprint
 from workers.on_off_functions.account_message import append_redis_message
+from workers.graph_functions.rate_limiter import GraphThrottledError
 # from workers.scheduler_celery import check_scheduled_adaccounts
 # from workers.only_campaign_fetcher import check_campaign_off_only
 
@@ -91,10 +92,9 @@ def seed_cities():
         db.session.commit()
         print("PH_CITY_TABLES seeded successfully!")
 
-def create_app():
-    app = Flask(__name__)
+def configure_app(app):
+    """Configuration shared by the API and the Celery workers: database, JWT, Celery and mail."""
     load_dotenv()
-    CORS(app)
     mail = Mail()
 
     app.logger.setLevel(logging.DEBUG)
@@ -121,19 +121,33 @@ def create_app():
     celery.set_default()
 
     # Configure Flask-Mail
-    def configure_mail(app):
-        app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
-        app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
-        app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-        app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-        app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True') == 'True'
-        app.config['MAIL_USE_SSL'] = os.getenv('MAIL_USE_SSL', 'False') == 'True'
-        mail.init_app(app)
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True') == 'True'
+    app.config['MAIL_USE_SSL'] = os.getenv('MAIL_USE_SSL', 'False') == 'True'
+    mail.init_app(app)
+
+    return app
+
+def create_worker_app():
+    """Flask app for Celery worker and beat processes.
+
+    Built once per process (see make_celery.py); tasks run inside its app
+    context and share its engine. No blueprints, schema creation or seeding:
+    the API process owns those.
+    """
+    return configure_app(Flask(__name__))
+
+def create_app():
+    app = Flask(__name__)
+    CORS(app)
+    configure_app(app)
 
     # Create database tables if they don't exist and seed regions
     with app.app_context():
         db.create_all()
-        configure_mail(app)
         seed_regions()  # Call the seed function after creating tables
         seed_cities()
 
@@ -159,6 +173,13 @@ def create_app():
             logging.error(f"Error processing request: {str(e)}")
             return jsonify({"error": "Internal server error"}), 500
 
+    @app.errorhandler(GraphThrottledError)
+    def graph_throttled(e):
+        """Graph asked us to back off for longer than a request may wait."""
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = str(int(e.retry_after) + 1)
+        return response, 429
+
     # Register the blueprints with prefixed routes
     app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
     app.register_blueprint(createbp, url_prefix='/api/v1/campaign')
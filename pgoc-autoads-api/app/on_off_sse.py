@@ -1,8 +1,19 @@
-import logging
+import os
+import re
 import time
+import logging
 import json
+from collections import namedtuple
 from flask import Blueprint, Response, request
-import redis
+from workers.on_off_functions.message_log import (
+    SCHEDULE_LOG, CAMPAIGN_ONLY_LOG, CAMPAIGN_NAME_LOG, CREATE_CAMPAIGN_LOG, ADSETS_LOG, PAGE_NAME_LOG,
+    AD_SPENT_LOG, EDIT_BUDGET_LOG, EDIT_LOCATION_LOG, FULL_HISTORY,
+    message_log_client, stream_key, read_initial, read_log, log_payload,
+)
+from app.sse_hub import (
+    APPEND_EVENT, DELETE_EVENT, start_hub, new_listener, listener_source, add_listener, remove_listener,
+    next_events, open_stream, close_stream,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -10,95 +21,245 @@ logging.basicConfig(level=logging.DEBUG)
 # Blueprint for SSE events
 message_events_blueprint = Blueprint("message_events", __name__)
 
-# Redis connections
-redis_websocket = redis.Redis(host="redisAds", port=6379, db=10, decode_responses=True)
-redis_websocket_only = redis.Redis(host="redisAds", port=6379, db=11, decode_responses=True)
-redis_websocket_off = redis.Redis(host="redisAds", port=6379, db=13, decode_responses=True)  # Redis DB 13
-# Redis connection for Create Campaigns
-redis_websocket_cc = redis.Redis(host="redisAds", port=6379, db=14, decode_responses=True)
-# Redis connection for AdSets
-redis_websocket_as = redis.Redis(host="redisAds",port=6379,db=15,decode_responses=True)
-# Redis connection for Page name on/off
-redis_websocket_pn = redis.Redis(host="redisAds", port=6379, db=12, decode_responses=True)
-# Redis connection for Ad Spent
-redis_websocket_asr = redis.Redis(host="redisAds", port=6379, db=9, decode_responses=True)
-# Redis connection for budget
-redis_websocket_budget = redis.Redis(host="redisAds", port=6379, db=8, decode_responses=True)
-# Redis connection for location
-redis_websocket_location = redis.Redis(host="redisAds", port=6379, db=7, decode_responses=True)
-
-# Ensure Redis keyspace notifications are enabled
-redis_websocket.config_set("notify-keyspace-events", "KEA")
-redis_websocket_only.config_set("notify-keyspace-events", "KEA")
-redis_websocket_off.config_set("notify-keyspace-events", "KEA")
-redis_websocket_cc.config_set("notify-keyspace-events", "KEA")
-redis_websocket_as.config_set("notify-keyspace-events", "KEA")
-redis_websocket_pn.config_set("notify-keyspace-events", "KEA")
-redis_websocket_asr.config_set("notify-keyspace-events", "KEA")
-
-def send_initial_data(redis_instance, specific_key):
-    """Fetch and send the latest Redis key data when client connects."""
-    existing_data = redis_instance.get(specific_key)
-    
-    if existing_data:
-        try:
-            parsed_data = json.loads(existing_data)
-            logging.info(f"Sending initial data for key {specific_key}: {parsed_data}")
-            yield f"data: {json.dumps({'key': specific_key, 'data': f" Last Message: {parsed_data}"})}\n\n"
-        except json.JSONDecodeError:
-            logging.error(f"Invalid JSON format in Redis key: {specific_key}")
-            yield f"data: {json.dumps({'key': specific_key, 'error': 'Invalid JSON format'})}\n\n"
-    else:
-        logging.warning(f"Key {specific_key} does not exist at connection time.")
-        yield f"data: {json.dumps({'key': specific_key, 'error': 'Key does not exist'})}\n\n"
-
-
-def listen_for_changes(redis_instance, specific_key, db_number):
-    """Continuously listens for changes and polls Redis for rapid updates."""
-    pubsub = redis_instance.pubsub()
-    channel_pattern = f"__keyspace@{db_number}__:{specific_key}"
-    pubsub.subscribe(channel_pattern)
-    
-    last_sent_data = None  
-    last_sent_time = 0  
-    logging.info(f"Listening for updates on Redis DB {db_number}, key: {specific_key}")
-
+# Channel names on /messageevents-multi, after the single-log endpoint each one replaces
+CHANNELS = {
+    "schedule": SCHEDULE_LOG,  # /messageevents
+    "only": CAMPAIGN_ONLY_LOG,  # /messageevents-only
+    "pagename": PAGE_NAME_LOG,  # /messageevents-pagename
+    "off": CAMPAIGN_NAME_LOG,  # /messageevents-off
+    "campaign-creations": CREATE_CAMPAIGN_LOG,  # /messageevents-campaign-creations
+    "adsets": ADSETS_LOG,  # /messageevents-adsets
+    "adspentreport": AD_SPENT_LOG,  # /messageevents-adspentreport
+    "editbudget": EDIT_BUDGET_LOG,  # /messageevents-editbudget
+    "editlocation": EDIT_LOCATION_LOG,  # /messageevents-editlocation
+}
+MESSAGE_LOGS = tuple(CHANNELS.values())
+# Most logs one multiplexed stream may follow
+SSE_MAX_CHANNELS = int(os.getenv("SSE_MAX_CHANNELS", 20))
+
+# A comment line is sent this often on a quiet stream; the write fails once the client has gone
+SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+# Streams with nothing new for this long are closed; the client reconnects with Last-Event-ID
+SSE_IDLE_TIMEOUT_SECONDS = int(os.getenv("SSE_IDLE_TIMEOUT_SECONDS", 1800))
+# Most messages read (and sent) per round, so a large backlog never sits in memory at once
+SSE_READ_BATCH = int(os.getenv("SSE_READ_BATCH", 500))
+
+# Keyspace notifications drive every SSE stream: appends wake listeners, a deleted log ends its streams
+message_log_client(SCHEDULE_LOG).config_set("notify-keyspace-events", "KEA")
+
+# Stream entry ids ("<ms>-<seq>") double as SSE event ids, so a reconnecting client resumes where it stopped
+EVENT_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+# One log a stream follows; `name` is its SSE event type on the multiplexed endpoint, None on the single-log ones
+Channel = namedtuple("Channel", "name log key")
+
+
+def sse_event(payload, event_id=None, event=None):
+    lines = f"event: {event}\n" if event else ""
+    lines += f"id: {event_id}\n" if event_id else ""
+    return f"{lines}data: {json.dumps(payload)}\n\n"
+
+
+def resume_id(last_event_id):
+    """The stream entry id to resume after, from a Last-Event-ID header; None for a fresh connection."""
+    if last_event_id and EVENT_ID_PATTERN.match(last_event_id.strip()):
+        return last_event_id.strip()
+    return None
+
+
+def encode_cursor(channels, positions):
+    """The SSE event id for the entries sent so far.
+
+    A single-log stream uses the entry id itself; a multiplexed one lists
+    "index=entry id" for every channel with a position, e.g. "0=1717-0,2=1718-3".
+    """
+    if channels[0].name is None:
+        return positions[0]
+    return ",".join(f"{index}={position}" for index, position in enumerate(positions) if position)
+
+
+def decode_cursor(channels, last_event_id):
+    """Per-channel entry ids to resume after (None where the client has nothing), from a Last-Event-ID header."""
+    positions = [None] * len(channels)
+    if channels[0].name is None:
+        positions[0] = resume_id(last_event_id)
+        return positions
+    for part in (last_event_id or "").strip().split(","):
+        index, _, position = part.partition("=")
+        if index.isdigit() and int(index) < len(channels) and EVENT_ID_PATTERN.match(position):
+            positions[int(index)] = position
+    return positions
+
+
+def send_initial_data(channel, entries, event_id):
+    """Send the log's current messages when a client connects. Returns the last entry id sent."""
+    if entries:
+        parsed_data = log_payload(channel.log, [message for _, message in entries])
+        logging.info(f"Sending initial data for key {channel.key}: {len(entries)} messages")
+        last_message = f" Last Message: {parsed_data}"
+        yield sse_event({'key': channel.key, 'data': last_message}, event_id(entries[-1][0]), channel.name)
+        return entries[-1][0]
+
+    logging.warning(f"Key {channel.key} does not exist at connection time.")
+    yield sse_event({'key': channel.key, 'error': 'Key does not exist'}, event=channel.name)
+    return "0-0"
+
+
+def send_new_messages(channel, entries, event_id):
+    """Send only `entries`, each event carrying the id of the last entry in it."""
+    logging.info(f"Sending update for key {channel.key}: {len(entries)} new messages")
+    if channel.log.shape == FULL_HISTORY:
+        # Full-history clients append what they receive: one event with just the new lines
+        yield sse_event(
+            {'key': channel.key, 'data': log_payload(channel.log, [message for _, message in entries])},
+            event_id(entries[-1][0]), channel.name,
+        )
+        return
+    # Writers flush in batches; latest-only clients still get every line, one event each
+    for entry_id, message in entries:
+        yield sse_event({'key': channel.key, 'data': log_payload(channel.log, [message])}, event_id(entry_id), channel.name)
+
+
+def stream_channels(channels, last_event_id=None):
+    """Generate one SSE stream following every log in `channels`.
+
+    Each channel gets its initial data (or, with a Last-Event-ID, only what it
+    missed), then the new messages whenever the hub reports an append. A
+    deleted log sends its error and is dropped; the stream ends when none
+    are left. Quiet streams get a heartbeat comment every SSE_HEARTBEAT_SECONDS
+    and are closed after SSE_IDLE_TIMEOUT_SECONDS without a message.
+    """
+    start_hub(MESSAGE_LOGS)
+    listener = new_listener()
+    sources = {}
+    # Registered before the initial reads, so nothing appended in between is missed
+    for index, channel in enumerate(channels):
+        add_listener(channel.log, stream_key(channel.key), listener)
+        sources[listener_source(channel.log, stream_key(channel.key))] = index
+
+    positions = decode_cursor(channels, last_event_id)
+
+    def event_id_for(index):
+        def event_id(entry_id):
+            positions[index] = entry_id
+            return encode_cursor(channels, positions)
+        return event_id
+
+    # Channels with messages waiting to be read
+    to_read = set()
+    open_channels = set(range(len(channels)))
     try:
-        while True:
-            new_data = redis_instance.get(specific_key)
-            if new_data and new_data != last_sent_data:
-                try:
-                    parsed_data = json.loads(new_data)
-                    current_time = time.time()
-
-                    if current_time - last_sent_time >= 0.05:
-                        logging.info(f"Sending update for key {specific_key}: {parsed_data}")
-                        yield f"data: {json.dumps({'key': specific_key, 'data': parsed_data})}\n\n"
-                        last_sent_data = new_data
-                        last_sent_time = current_time
-                except json.JSONDecodeError:
-                    logging.error(f"Invalid JSON format in Redis key: {specific_key}")
-
-            message = pubsub.get_message(timeout=0.1)
-            if message and message.get("type") == "message":
-                event_type = message.get("data")
-                if event_type == "del":
-                    logging.warning(f"Key {specific_key} deleted, notifying clients.")
-                    yield f"data: {json.dumps({'key': specific_key, 'error': 'Key no longer exists'})}\n\n"
-                    break  
-
-            time.sleep(0.1)  
+        for index, channel in enumerate(channels):
+            if positions[index]:
+                # The missed messages are read below, in batches
+                logging.info(f"Client resumed {channel.key} after {positions[index]}")
+                to_read.add(index)
+            else:
+                entries = read_initial(channel.log, channel.key)
+                positions[index] = yield from send_initial_data(channel, entries, event_id_for(index))
+
+        logging.info(f"Listening for updates on {', '.join(f'DB {channel.log.db} key {channel.key}' for channel in channels)}")
+        last_sent = time.monotonic()
+        while open_channels:
+            events = {} if to_read else next_events(listener, SSE_HEARTBEAT_SECONDS)
+            if events is None:
+                if time.monotonic() - last_sent >= SSE_IDLE_TIMEOUT_SECONDS:
+                    logging.info(f"Closing idle SSE stream for {', '.join(channel.key for channel in channels)}")
+                    break
+                yield ": heartbeat\n\n"
+                continue
+
+            for source, event in events.items():
+                index = sources.get(source)
+                if index not in open_channels:
+                    continue
+                if event == DELETE_EVENT:
+                    logging.warning(f"Key {channels[index].key} deleted, notifying clients.")
+                    yield sse_event({'key': channels[index].key, 'error': 'Key no longer exists'}, event=channels[index].name)
+                    open_channels.discard(index)
+                    to_read.discard(index)
+                elif event == APPEND_EVENT:
+                    to_read.add(index)
+
+            for index in sorted(to_read):
+                channel = channels[index]
+                entries = read_log(channel.log, channel.key, after=positions[index], count=SSE_READ_BATCH)
+                # A full batch means more is waiting; read it once this one is written out
+                if len(entries) < SSE_READ_BATCH:
+                    to_read.discard(index)
+                if entries:
+                    last_sent = time.monotonic()
+                    yield from send_new_messages(channel, entries, event_id_for(index))
 
     except Exception as e:
-        logging.error(f"Error in Redis listener for {specific_key}: {e}")
+        logging.error(f"Error in Redis listener for {', '.join(channel.key for channel in channels)}: {e}")
     finally:
-        pubsub.close()
+        for channel in channels:
+            remove_listener(channel.log, stream_key(channel.key), listener)
+
+
+def send_sse_signal(message_log, specific_key, last_event_id=None):
+    """Generates the SSE stream for a single message log."""
+    return stream_channels([Channel(None, message_log, specific_key)], last_event_id)
+
+
+def channels_response(channels):
+    """Stream `channels` to the client, within the process's connection cap."""
+    if not open_stream():
+        logging.warning(f"SSE connection cap reached, turning away client for keys: {[channel.key for channel in channels]}")
+        return Response("Too many open event streams", status=503, headers={"Retry-After": "5"})
+
+    response = Response(
+        stream_channels(channels, request.headers.get("Last-Event-ID")),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(close_stream)
+    return response
+
+
+def sse_response(message_log, room):
+    return channels_response([Channel(None, message_log, room)])
+
+
+def parse_channels(values):
+    """Channels from `channels=<name>:<key>` values (repeated or comma-separated), in order, without duplicates.
+
+    Returns (channels, error).
+    """
+    channels = []
+    for item in (item.strip() for value in values for item in value.split(",")):
+        if not item:
+            continue
+        name, _, key = item.partition(":")
+        if name not in CHANNELS or not key:
+            return None, f"Invalid channel '{item}'; expected <name>:<key> with name one of {', '.join(CHANNELS)}"
+        channel = Channel(name, CHANNELS[name], key)
+        if channel not in channels:
+            channels.append(channel)
+    if not channels:
+        return None, "Missing 'channels' query parameter"
+    if len(channels) > SSE_MAX_CHANNELS:
+        return None, f"At most {SSE_MAX_CHANNELS} channels per stream"
+    return channels, None
+
+
+@message_events_blueprint.route("/messageevents-multi")
+def message_events_multi():
+    """SSE endpoint that streams several message logs over one connection.
+
+    Query: channels=<name>:<key>, repeated or comma-separated, e.g.
+    channels=adsets:12-key,schedule:12-act_34-key. Each event's type is the
+    channel name and its data is what the single-log endpoint would send.
+    """
+    channels, error = parse_channels(request.args.getlist("channels"))
+    if error:
+        return error, 400
 
+    logging.info(f"Client connected to multiplexed SSE for {[f'{channel.name}:{channel.key}' for channel in channels]}")
 
-def send_sse_signal(redis_instance, specific_key, db_number):
-    """Generates the SSE stream for a Redis key, sends initial data, and listens for changes."""
-    yield from send_initial_data(redis_instance, specific_key)  
-    yield from listen_for_changes(redis_instance, specific_key, db_number)
+    return channels_response(channels)
 
 
 @message_events_blueprint.route("/messageevents")
@@ -111,7 +272,7 @@ def message_events():
     
     logging.info(f"Client connected to SSE for key: {room} on DB 10")
     
-    return Response(send_sse_signal(redis_websocket, room, 10), content_type="text/event-stream")
+    return sse_response(SCHEDULE_LOG, room)
 
 
 @message_events_blueprint.route("/messageevents-only")
@@ -124,7 +285,7 @@ def message_events_only():
     
     logging.info(f"Client connected to SSE for key: {room} on DB 11")
     
-    return Response(send_sse_signal(redis_websocket_only, room, 11), content_type="text/event-stream")
+    return sse_response(CAMPAIGN_ONLY_LOG, room)
 
 
 @message_events_blueprint.route("/messageevents-off")
@@ -137,7 +298,7 @@ def message_events_off():
     
     logging.info(f"Client connected to SSE for key: {room} on DB 13")
     
-    return Response(send_sse_signal(redis_websocket_off, room, 13), content_type="text/event-stream")
+    return sse_response(CAMPAIGN_NAME_LOG, room)
 
 @message_events_blueprint.route("/messageevents-campaign-creations")
 def messageevents_campaign_creations():
@@ -149,7 +310,7 @@ def messageevents_campaign_creations():
     
     logging.info(f"Client connected to SSE for key: {room} on DB 14")
     
-    return Response(send_sse_signal(redis_websocket_cc, room, 14), content_type="text/event-stream")
+    return sse_response(CREATE_CAMPAIGN_LOG, room)
 
 @message_events_blueprint.route("/messageevents-adsets")
 def messageevents_adsets():
@@ -161,7 +322,7 @@ def messageevents_adsets():
     
     logging.info(f"Client connected to SSE for key: {room} on DB 15")
     
-    return Response(send_sse_signal(redis_websocket_as, room, 15), content_type="text/event-stream")
+    return sse_response(ADSETS_LOG, room)
 
 @message_events_blueprint.route("/messageevents-pagename")
 def messageevents_pagename():
@@ -173,7 +334,7 @@ def messageevents_pagename():
     
     logging.info(f"Client connected to SSE for key: {room} on DB 12")
     
-    return Response(send_sse_signal(redis_websocket_pn, room, 12), content_type="text/event-stream")
+    return sse_response(PAGE_NAME_LOG, room)
 
 @message_events_blueprint.route("/messageevents-adspentreport")
 def messageevents_adspentreport():
@@ -185,7 +346,7 @@ def messageevents_adspentreport():
     
     logging.info(f"Client connected to SSE for key: {room} on DB 9")
     
-    return Response(send_sse_signal(redis_websocket_asr, room, 9), content_type="text/event-stream")
+    return sse_response(AD_SPENT_LOG, room)
 
 @message_events_blueprint.route("/messageevents-editbudget")
 def messageevents_editbudget():
@@ -197,7 +358,7 @@ def messageevents_editbudget():
     
     logging.info(f"Client connected to SSE for key: {room} on DB 8")
     
-    return Response(send_sse_signal(redis_websocket_budget, room, 8), content_type="text/event-stream")
+    return sse_response(EDIT_BUDGET_LOG, room)
 
 @message_events_blueprint.route("/messageevents-editlocation")
 def messageevents_editlocation():
@@ -209,4 +370,4 @@ def messageevents_editlocation():
     
     logging.info(f"Client connected to SSE for key: {room} on DB 7")
     
-    return Response(send_sse_signal(redis_websocket_location, room, 7), content_type="text/event-stream")
\ No newline at end of file
+    return sse_response(EDIT_LOCATION_LOG, room)
\ No newline at end of file
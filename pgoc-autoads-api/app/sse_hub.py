@@ -0,0 +1,168 @@
+import os
+import time
+import queue
+import logging
+import threading
+import redis
+from workers.on_off_functions.message_log import STREAM_SUFFIX, message_log_client
+
+# Keyspace events a listener cares about: new entries, or the log going away
+APPEND_EVENT = "xadd"
+DELETE_EVENT = "del"
+
+# Back-off before re-subscribing after the hub loses its Redis connection
+RECONNECT_DELAY_SECONDS = 1
+
+# Events waiting per listener; a full queue is folded into one event per log
+LISTENER_QUEUE_SIZE = int(os.getenv("SSE_LISTENER_QUEUE_SIZE", 64))
+# Open SSE streams per API process; further clients get a 503 and retry
+SSE_MAX_CONNECTIONS = int(os.getenv("SSE_MAX_CONNECTIONS", 2000))
+
+# {(db, stream key): {queue.Queue, ...}} for every SSE generator in this process.
+# Queue items are ((db, stream key), event), so one queue can serve several logs.
+_listeners = {}
+_listeners_lock = threading.Lock()
+_hub_pid = None
+_watched_dbs = set()
+_open_streams = 0
+
+
+def keyspace_pattern(db):
+    return f"__keyspace@{db}__:*:{STREAM_SUFFIX}"
+
+
+def parse_channel(channel):
+    """`__keyspace@{db}__:{stream key}` -> (db, stream key)."""
+    prefix, _, key = channel.partition("__:")
+    return int(prefix.replace("__keyspace@", "")), key
+
+
+def drain(listener):
+    events = []
+    while True:
+        try:
+            events.append(listener.get_nowait())
+        except queue.Empty:
+            return events
+
+
+def fold(items):
+    """{source: event} for a backlog of (source, event) items: a delete wins, otherwise one append."""
+    events_by_source = {}
+    for source, event in items:
+        events_by_source.setdefault(source, []).append(event)
+    folded = {}
+    for source, events in events_by_source.items():
+        if DELETE_EVENT in events:
+            folded[source] = DELETE_EVENT
+        else:
+            folded[source] = APPEND_EVENT if APPEND_EVENT in events else events[-1]
+    return folded
+
+
+def deliver(listener, source, event):
+    """Queue an event without ever blocking the hub on a slow stream."""
+    try:
+        listener.put_nowait((source, event))
+    except queue.Full:
+        try:
+            for item in fold(drain(listener) + [(source, event)]).items():
+                listener.put_nowait(item)
+        except queue.Full:
+            pass
+
+
+def dispatch(message):
+    source = parse_channel(message["channel"])
+    with _listeners_lock:
+        listeners = list(_listeners.get(source, ()))
+    for listener in listeners:
+        deliver(listener, source, message["data"])
+
+
+def nudge_all():
+    with _listeners_lock:
+        registrations = [(source, listener) for source, group in _listeners.items() for listener in group]
+    for source, listener in registrations:
+        deliver(listener, source, APPEND_EVENT)
+
+
+def run_hub(message_log):
+    """The process's single subscriber: one pattern per log database, events fanned out to local queues."""
+    while True:
+        pubsub = message_log_client(message_log).pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.psubscribe(*(keyspace_pattern(db) for db in sorted(_watched_dbs)))
+            logging.info(f"SSE hub subscribed to keyspace events for DBs {sorted(_watched_dbs)}")
+            # Entries added before this (re)subscription are picked up by each listener's next read
+            nudge_all()
+            for message in pubsub.listen():
+                if message.get("type") == "pmessage":
+                    dispatch(message)
+        except redis.RedisError as e:
+            logging.error(f"SSE hub lost its Redis subscription: {e}")
+        finally:
+            pubsub.close()
+        time.sleep(RECONNECT_DELAY_SECONDS)
+
+
+def start_hub(message_logs):
+    """Start the hub once per process (again after a fork) for the given log families."""
+    global _hub_pid
+    with _listeners_lock:
+        _watched_dbs.update(log.db for log in message_logs)
+        if _hub_pid == os.getpid():
+            return
+        _hub_pid = os.getpid()
+    threading.Thread(target=run_hub, args=(message_logs[0],), name="sse hub", daemon=True).start()
+
+
+def new_listener():
+    return queue.Queue(maxsize=LISTENER_QUEUE_SIZE)
+
+
+def listener_source(message_log, stream):
+    return message_log.db, stream
+
+
+def add_listener(message_log, stream, listener=None):
+    """Register for keyspace events on one log, on `listener` or a new queue. Returns the queue."""
+    if listener is None:
+        listener = new_listener()
+    with _listeners_lock:
+        _listeners.setdefault(listener_source(message_log, stream), set()).add(listener)
+    return listener
+
+
+def remove_listener(message_log, stream, listener):
+    with _listeners_lock:
+        group = _listeners.get(listener_source(message_log, stream))
+        if group is not None:
+            group.discard(listener)
+            if not group:
+                del _listeners[listener_source(message_log, stream)]
+
+
+def next_events(listener, timeout):
+    """Wait for the next event and fold in any backlog. Returns {source: event}, or None when `timeout` passes first."""
+    try:
+        first = listener.get(timeout=timeout)
+    except queue.Empty:
+        return None
+    return fold([first] + drain(listener))
+
+
+def open_stream():
+    """Take one of the process's SSE connection slots. Returns False when all are in use."""
+    global _open_streams
+    with _listeners_lock:
+        if _open_streams >= SSE_MAX_CONNECTIONS:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_stream():
+    global _open_streams
+    with _listeners_lock:
+        _open_streams -= 1
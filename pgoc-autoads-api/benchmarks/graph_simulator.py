@@ -0,0 +1,577 @@
+"""
+Local stand-in for the Facebook Graph API endpoints the workers call.
+
+Serves campaigns (with nested adsets), adsets, insights, batch requests,
+status/budget POSTs, adimages, advideos, adcreatives, ads and targeting
+search for synthetic ad accounts, with configurable account sizes,
+latency, page sizes and throttling.
+
+Run standalone:
+    python -m benchmarks.graph_simulator --port 8765 --accounts 20
+and point the workers at it with GRAPH_API_HOST=http://localhost:8765
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, parse_qsl
+from flask import Flask, request, Response
+from werkzeug.serving import make_server
+
+# Synthetic ad account ids start here so they never collide with real ones
+BASE_ACCOUNT_ID = 990000000000
+
+DEFAULT_CONFIG = {
+    "accounts": 10,
+    "campaigns_per_account": 40,
+    "adsets_per_campaign": 5,
+    "campaign_code": "BENCH",
+    # Share of campaigns whose name carries the campaign code
+    "match_ratio": 0.5,
+    # Graph defaults to 25 rows per page when no limit is given
+    "default_page_size": 25,
+    "max_page_size": 1000,
+    "nested_page_size": 25,
+    # Upper bound for nested .limit(N) expansions, so large campaigns still truncate
+    "max_nested_page_size": 100,
+    "latency_ms": 80,
+    "latency_jitter_ms": 40,
+    "batch_op_latency_ms": 5,
+    # How long an async insights report run stays "Job Running"
+    "report_run_seconds": 3,
+    # Probability that any call fails with a user-level throttle (code 17)
+    "throttle_rate": 0.0,
+    # Per-account call budget per window before code 80004 is returned
+    "calls_per_window": 600,
+    "window_seconds": 300,
+}
+
+CAMPAIGN_STATUSES = ["ACTIVE", "PAUSED"]
+AD_EFFECTIVE_STATUSES = ["ACTIVE", "ADSET_PAUSED", "PENDING_REVIEW", "DISAPPROVED"]
+
+
+def graph_error(message, code, status_code=400, error_type="OAuthException"):
+    return status_code, {"error": {"message": message, "type": error_type, "code": code, "fbtrace_id": "SIMULATED"}}
+
+
+def percent(used, budget):
+    return min(int(used * 100 / budget), 100) if budget else 0
+
+
+class GraphSimulator:
+    """In-memory ad accounts plus call accounting, shared by every request thread."""
+
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.lock = threading.Lock()
+        self.entities = {}
+        self.accounts = {}
+        self.next_id = 1
+        self.reset_stats()
+        for index in range(self.config["accounts"]):
+            self.build_account(str(BASE_ACCOUNT_ID + index))
+
+    # ---- data ----
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return str(880000000000000 + self.next_id)
+
+    def build_account(self, account_id):
+        rng = random.Random(int(account_id))
+        code = self.config["campaign_code"]
+        campaign_ids = []
+
+        for c in range(self.config["campaigns_per_account"]):
+            campaign_id = self.new_id()
+            prefix = code if rng.random() < self.config["match_ratio"] else "OTHER"
+            daily_budget = rng.randint(500, 5000) * 100
+            self.entities[campaign_id] = {
+                "type": "campaign",
+                "account_id": account_id,
+                "id": campaign_id,
+                "name": f"{prefix}-{c:03d} {rng.choice(['REGULAR', 'TEST'])} Campaign",
+                "status": rng.choice(CAMPAIGN_STATUSES),
+                "daily_budget": str(daily_budget),
+                "budget_remaining": str(rng.randint(0, daily_budget)),
+                "adset_ids": [],
+            }
+            campaign_ids.append(campaign_id)
+
+            for a in range(self.config["adsets_per_campaign"]):
+                adset_id = self.new_id()
+                self.entities[adset_id] = {
+                    "type": "adset",
+                    "account_id": account_id,
+                    "id": adset_id,
+                    "campaign_id": campaign_id,
+                    "name": f"{prefix}-{c:03d} Adset {a}",
+                    "status": rng.choice(CAMPAIGN_STATUSES),
+                    "ad_statuses": [rng.choice(AD_EFFECTIVE_STATUSES) for _ in range(rng.randint(1, 3))],
+                }
+                self.entities[campaign_id]["adset_ids"].append(adset_id)
+
+        self.accounts[account_id] = {"id": f"act_{account_id}", "name": f"Benchmark Account {account_id}", "campaign_ids": campaign_ids}
+
+    def insights_row(self, entity_id, day):
+        rng = random.Random(f"{entity_id}:{day}")
+        spend = round(rng.uniform(50, 3000), 2)
+        checkouts = rng.randint(0, 40)
+        row = {"spend": str(spend), "actions": []}
+        if checkouts:
+            row["actions"].append({"action_type": "omni_initiated_checkout", "value": str(checkouts)})
+        return row
+
+    # ---- accounting ----
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {
+                "http_requests": 0,
+                "graph_calls": 0,
+                "throttled": 0,
+                "per_account": defaultdict(int),
+                "per_endpoint": defaultdict(int),
+            }
+            self.windows = {}
+
+    def snapshot_stats(self):
+        with self.lock:
+            return {
+                "http_requests": self.stats["http_requests"],
+                "graph_calls": self.stats["graph_calls"],
+                "throttled": self.stats["throttled"],
+                "per_account": dict(self.stats["per_account"]),
+                "per_endpoint": dict(self.stats["per_endpoint"]),
+            }
+
+    def charge(self, account_id, endpoint):
+        """Count one Graph call and return (usage_pct, seconds_until_reset)."""
+        now = time.time()
+        with self.lock:
+            self.stats["graph_calls"] += 1
+            self.stats["per_endpoint"][endpoint] += 1
+            if not account_id:
+                return 0, 0
+
+            self.stats["per_account"][account_id] += 1
+            window = self.windows.get(account_id)
+            if not window or now - window["start"] >= self.config["window_seconds"]:
+                window = {"start": now, "calls": 0}
+                self.windows[account_id] = window
+            window["calls"] += 1
+
+            reset_in = int(window["start"] + self.config["window_seconds"] - now)
+            return percent(window["calls"], self.config["calls_per_window"]), reset_in
+
+    def usage_headers(self, account_id, usage_pct, reset_in):
+        if not account_id:
+            return {}
+        regain_minutes = (reset_in + 59) // 60 if usage_pct >= 100 else 0
+        return {
+            "x-ad-account-usage": json.dumps({"acc_id_util_pct": usage_pct, "reset_time_duration": reset_in}),
+            "x-business-use-case-usage": json.dumps({
+                account_id: [{
+                    "type": "ads_management",
+                    "call_count": usage_pct,
+                    "total_cputime": usage_pct // 2,
+                    "total_time": usage_pct // 2,
+                    "estimated_time_to_regain_access": regain_minutes,
+                }]
+            }),
+        }
+
+    # ---- routing ----
+
+    def account_of(self, parts):
+        if parts and parts[0].startswith("act_"):
+            return parts[0][4:]
+        if parts and parts[0] in self.entities:
+            return self.entities[parts[0]]["account_id"]
+        return None
+
+    def handle(self, method, path, params, body, base_url):
+        """Serve one Graph call. Returns (status_code, payload, headers)."""
+        parts = [p for p in path.split("/") if p]
+        if parts and parts[0].startswith("v") and parts[0][1:].replace(".", "").isdigit():
+            parts = parts[1:]
+
+        account_id = self.account_of(parts)
+        endpoint = f"{method} {'/'.join(['act' if p.startswith('act_') else ('{id}' if p.isdigit() else p) for p in parts]) or '/'}"
+        usage_pct, reset_in = self.charge(account_id, endpoint)
+        headers = self.usage_headers(account_id, usage_pct, reset_in)
+
+        if usage_pct >= 100:
+            with self.lock:
+                self.stats["throttled"] += 1
+            status, payload = graph_error("User request limit reached", 80004)
+            return status, payload, headers
+
+        if self.config["throttle_rate"] and random.random() < self.config["throttle_rate"]:
+            with self.lock:
+                self.stats["throttled"] += 1
+            status, payload = graph_error("User request limit reached", 17)
+            return status, payload, headers
+
+        status, payload = self.route(method, parts, params, body, base_url, path)
+        return status, payload, headers
+
+    def route(self, method, parts, params, body, base_url, path):
+        if not parts and method == "GET" and params.get("ids"):
+            # Multi-id read: {id: fields} for every requested object, failing as a whole on unknown ids
+            ids = params["ids"].split(",")
+            missing = [i for i in ids if i not in self.entities]
+            if missing:
+                return graph_error(f"Some of the aliases you requested do not exist: {','.join(missing)}", 803)
+            return 200, {i: self.render(self.entities[i], params.get("fields", "id"), base_url) for i in ids}
+
+        if not parts:
+            return graph_error("Unsupported request", 100)
+
+        if parts[0] == "me":
+            if len(parts) == 1:
+                return 200, {"id": "1000", "name": "Benchmark User"}
+            if parts[1] == "adaccounts":
+                rows = [{"id": a["id"], "name": a["name"]} for a in self.accounts.values()]
+                return 200, self.page(rows, params, base_url, path)
+
+        if parts[0] == "search":
+            return 200, self.targeting_search(params)
+
+        if parts[0].startswith("act_"):
+            account_id = parts[0][4:]
+            if account_id not in self.accounts:
+                return graph_error(f"Unsupported get request. Object with ID '{parts[0]}' does not exist", 100)
+            edge = parts[1] if len(parts) > 1 else None
+            return self.account_edge(method, account_id, edge, params, body, base_url, path)
+
+        entity = self.entities.get(parts[0])
+        if not entity:
+            return graph_error(f"Unsupported request. Object with ID '{parts[0]}' does not exist", 100)
+
+        if entity["type"] == "report_run":
+            return self.report_run(entity, parts, params, base_url, path)
+
+        if len(parts) > 1 and parts[1] == "adsets" and entity["type"] == "campaign":
+            rows = [self.render(self.entities[i], params.get("fields", "id,name,status"), base_url) for i in entity["adset_ids"]]
+            return 200, self.page(rows, params, base_url, path)
+
+        if method == "POST":
+            with self.lock:
+                for field in ("status", "daily_budget", "name"):
+                    if field in body:
+                        entity[field] = str(body[field])
+            return 200, {"success": True}
+
+        return 200, self.render(entity, params.get("fields", "id,name"), base_url)
+
+    def account_edge(self, method, account_id, edge, params, body, base_url, path):
+        account = self.accounts[account_id]
+
+        if edge == "campaigns" and method == "GET":
+            rows = [self.render(self.entities[i], params.get("fields", "id"), base_url) for i in account["campaign_ids"]]
+            return 200, self.page(self.apply_filtering(rows, params), params, base_url, path)
+
+        if edge == "adsets" and method == "GET":
+            adsets = [self.entities[a] for c in account["campaign_ids"] for a in self.entities[c]["adset_ids"]]
+            rows = [self.render(a, params.get("fields", "id"), base_url) for a in adsets]
+            return 200, self.page(self.apply_filtering(rows, params), params, base_url, path)
+
+        if edge == "insights" and method == "GET":
+            return 200, self.page(self.insights(account, params), params, base_url, path)
+
+        if edge == "insights" and method == "POST":
+            report_run_id = self.new_id()
+            with self.lock:
+                self.entities[report_run_id] = {
+                    "type": "report_run", "account_id": account_id, "id": report_run_id,
+                    "params": dict(body), "created": time.time(),
+                }
+            return 200, {"report_run_id": report_run_id}
+
+        if edge == "targetingsearch":
+            return 200, self.targeting_search(params)
+
+        if method != "POST":
+            return graph_error(f"Unsupported get request on edge '{edge}'", 100)
+
+        if edge == "adimages":
+            name = body.get("name", "image")
+            return 200, {"images": {name: {"hash": self.new_id(), "url": f"https://scontent.example/{name}.jpg"}}}
+
+        if edge in ("advideos", "adsets", "ads", "campaigns"):
+            entity_id = self.new_id()
+            if edge == "campaigns":
+                with self.lock:
+                    self.entities[entity_id] = {
+                        "type": "campaign", "account_id": account_id, "id": entity_id,
+                        "name": body.get("name", "Campaign"), "status": body.get("status", "PAUSED"),
+                        "daily_budget": str(body.get("daily_budget", "0")), "budget_remaining": "0", "adset_ids": [],
+                    }
+                    account["campaign_ids"].append(entity_id)
+            return 200, {"id": entity_id}
+
+        if edge == "adcreatives":
+            creative_id = self.new_id()
+            page_id = body.get("object_story_spec", {}).get("page_id", "1")
+            with self.lock:
+                self.entities[creative_id] = {
+                    "type": "creative", "account_id": account_id, "id": creative_id,
+                    "name": body.get("name", "Creative"),
+                    "effective_object_story_id": f"{page_id}_{creative_id}",
+                }
+            return 200, {"id": creative_id}
+
+        return graph_error(f"Unsupported post request on edge '{edge}'", 100)
+
+    def report_run(self, entity, parts, params, base_url, path):
+        elapsed = time.time() - entity["created"]
+        duration = self.config["report_run_seconds"]
+
+        if len(parts) > 1 and parts[1] == "insights":
+            if elapsed < duration:
+                return graph_error("Report is not ready yet", 100)
+            rows = self.insights(self.accounts[entity["account_id"]], entity["params"])
+            return 200, self.page(rows, params, base_url, path)
+
+        done = elapsed >= duration
+        return 200, {
+            "id": entity["id"],
+            "async_status": "Job Completed" if done else "Job Running",
+            "async_percent_completion": 100 if done else int(elapsed * 100 / duration),
+        }
+
+    # ---- rendering ----
+
+    def render(self, entity, fields, base_url):
+        """Return the requested fields, expanding nested `adsets{...}` / `ads{...}` edges."""
+        row = {}
+        for field, nested, limit in split_fields(fields):
+            if field == "adsets" and entity["type"] == "campaign":
+                adsets = [self.render(self.entities[i], nested or "id", base_url) for i in entity["adset_ids"]]
+                size = min(limit or self.config["nested_page_size"], self.config["max_nested_page_size"])
+                row["adsets"] = {"data": adsets[:size]}
+                if len(adsets) > size:
+                    query = urlencode({"fields": nested or "id", "limit": size, "after": str(size)})
+                    row["adsets"]["paging"] = {
+                        "cursors": {"after": str(size)},
+                        "next": f"{base_url}/v22.0/{entity['id']}/adsets?{query}",
+                    }
+            elif field == "ads" and entity["type"] == "adset":
+                row["ads"] = {"data": [{"effective_status": s} for s in entity["ad_statuses"]]}
+            elif field in entity and field not in ("type", "adset_ids", "ad_statuses", "account_id"):
+                row[field] = entity[field]
+        return row
+
+    def page(self, rows, params, base_url, path):
+        limit = min(int(params.get("limit", self.config["default_page_size"])), self.config["max_page_size"])
+        offset = int(params.get("after", 0) or 0)
+        result = {"data": rows[offset:offset + limit]}
+        if offset + limit < len(rows):
+            next_params = {**params, "after": str(offset + limit), "limit": str(limit)}
+            next_params.pop("access_token", None)
+            result["paging"] = {
+                "cursors": {"after": str(offset + limit)},
+                "next": f"{base_url}{path}?{urlencode(next_params)}",
+            }
+        return result
+
+    def apply_filtering(self, rows, params):
+        """Support the subset of Graph `filtering` the workers use (CONTAIN, EQUAL, IN)."""
+        raw = params.get("filtering")
+        if not raw:
+            return rows
+        try:
+            rules = json.loads(raw)
+        except ValueError:
+            return rows
+
+        def matches(row, rule):
+            value = str(row.get(rule.get("field", "").split(".")[-1], ""))
+            operator = rule.get("operator", "EQUAL").upper()
+            expected = rule.get("value")
+            if operator == "CONTAIN":
+                return str(expected).lower() in value.lower()
+            if operator == "IN":
+                return value in [str(v) for v in expected or []]
+            return value == str(expected)
+
+        return [row for row in rows if all(matches(row, rule) for rule in rules)]
+
+    def insights(self, account, params):
+        level = params.get("level", "account")
+        fields = params.get("fields", "spend")
+        since, until = insight_range(params)
+        per_day = params.get("time_increment") == "1"
+
+        if level == "adset":
+            entities = [self.entities[a] for c in account["campaign_ids"] for a in self.entities[c]["adset_ids"]]
+        else:
+            entities = [self.entities[c] for c in account["campaign_ids"]]
+
+        rows = []
+        for entity in entities:
+            days = [since + timedelta(days=d) for d in range((until - since).days + 1)]
+            buckets = [[d] for d in days] if per_day else [days]
+            for bucket in buckets:
+                spend = 0.0
+                checkouts = 0.0
+                for day in bucket:
+                    daily = self.insights_row(entity["id"], day.isoformat())
+                    spend += float(daily["spend"])
+                    checkouts += sum(float(a["value"]) for a in daily["actions"])
+
+                row = {"spend": f"{spend:.2f}", "date_start": bucket[0].isoformat(), "date_stop": bucket[-1].isoformat()}
+                if "actions" in fields and checkouts:
+                    row["actions"] = [{"action_type": "omni_initiated_checkout", "value": str(int(checkouts))}]
+                if level == "adset":
+                    row["adset_id"] = entity["id"]
+                    row["adset_name"] = entity["name"]
+                    row["campaign_id"] = entity["campaign_id"]
+                else:
+                    row["campaign_id"] = entity["id"]
+                    row["campaign_name"] = entity["name"]
+                rows.append(row)
+        return rows
+
+    def targeting_search(self, params):
+        query = params.get("q", "interest")
+        return {"data": [
+            {"id": str(6000000000000 + abs(hash((query, i))) % 10 ** 9), "name": f"{query} {i}", "type": "interests", "path": ["Interests", query]}
+            for i in range(3)
+        ]}
+
+    def batch(self, raw_batch, base_url):
+        """Execute a Graph batch; every operation counts as a separate call. Returns (status, payload, headers)."""
+        try:
+            operations = json.loads(raw_batch)
+        except ValueError:
+            return (*graph_error("Invalid batch parameter", 100), {})
+
+        results = []
+        usage_headers = {}
+        for op in operations[:50]:
+            relative_url = op.get("relative_url", "")
+            path, _, query = relative_url.partition("?")
+            params = dict(parse_qsl(query))
+            body = dict(parse_qsl(op.get("body", "")))
+            status, payload, headers = self.handle(op.get("method", "GET").upper(), "/" + path, params, body, base_url)
+            # Like Graph, the outer response reports the usage after the last operation
+            usage_headers.update(headers)
+            time.sleep(self.config["batch_op_latency_ms"] / 1000.0)
+            results.append({"code": status, "headers": [], "body": json.dumps(payload)})
+        return 200, results, usage_headers
+
+
+def split_fields(fields):
+    """Split 'id,adsets.limit(50){id,name}' into [('id', None, None), ('adsets', 'id,name', 50)]."""
+    result = []
+    depth = 0
+    current = ""
+    for char in fields + ",":
+        if char == "," and depth == 0:
+            if current:
+                name, _, nested = current.partition("{")
+                name, _, modifier = name.strip().partition(".limit(")
+                limit = int(modifier.rstrip(")")) if modifier else None
+                result.append((name, nested[:-1] if nested else None, limit))
+            current = ""
+            continue
+        depth += char == "{"
+        depth -= char == "}"
+        current += char
+    return result
+
+
+def insight_range(params):
+    today = datetime.now().date()
+    since = params.get("time_range[since]")
+    until = params.get("time_range[until]")
+    if "time_range" in params:
+        try:
+            time_range = json.loads(params["time_range"])
+            since, until = time_range.get("since"), time_range.get("until")
+        except ValueError:
+            pass
+    if since and until:
+        return datetime.strptime(since, "%Y-%m-%d").date(), datetime.strptime(until, "%Y-%m-%d").date()
+    if params.get("date_preset") == "last_7d":
+        return today - timedelta(days=7), today - timedelta(days=1)
+    return today, today
+
+
+def create_simulator_app(simulator):
+    app = Flask(__name__)
+
+    def respond(status, payload, headers=None):
+        return Response(json.dumps(payload), status=status, headers=headers or {}, mimetype="application/json")
+
+    def sleep_latency():
+        config = simulator.config
+        jitter = random.uniform(0, config["latency_jitter_ms"]) if config["latency_jitter_ms"] else 0
+        time.sleep((config["latency_ms"] + jitter) / 1000.0)
+
+    @app.route("/__stats", methods=["GET"])
+    def stats():
+        return respond(200, simulator.snapshot_stats())
+
+    @app.route("/__reset", methods=["POST"])
+    def reset():
+        simulator.reset_stats()
+        return respond(200, {"success": True})
+
+    @app.route("/", defaults={"path": ""}, methods=["GET", "POST"])
+    @app.route("/<path:path>", methods=["GET", "POST"])
+    def graph(path):
+        with simulator.lock:
+            simulator.stats["http_requests"] += 1
+        sleep_latency()
+
+        base_url = request.host_url.rstrip("/")
+        params = request.args.to_dict()
+        body = request.get_json(silent=True) or request.form.to_dict()
+
+        if request.method == "POST" and "batch" in body:
+            status, payload, headers = simulator.batch(body["batch"], base_url)
+            return respond(status, payload, headers)
+
+        status, payload, headers = simulator.handle(request.method, "/" + path, params, body, base_url)
+        return respond(status, payload, headers)
+
+    return app
+
+
+def start_simulator(config=None, host="127.0.0.1", port=0):
+    """Start the simulator on a background thread. Returns (simulator, server, base_url)."""
+    simulator = GraphSimulator(config)
+    server = make_server(host, port, create_simulator_app(simulator), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return simulator, server, f"http://{host}:{server.server_port}"
+
+
+def add_config_arguments(parser):
+    """Expose every DEFAULT_CONFIG key as a --kebab-case option."""
+    for key, value in DEFAULT_CONFIG.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+
+
+def config_from_args(args):
+    return {key: getattr(args, key) for key in DEFAULT_CONFIG}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Graph API simulator")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    simulator = GraphSimulator(config_from_args(args))
+    print(f"Graph simulator on http://{args.host}:{args.port} with {len(simulator.accounts)} accounts "
+          f"(act_{BASE_ACCOUNT_ID}..act_{BASE_ACCOUNT_ID + len(simulator.accounts) - 1})")
+    make_server(args.host, args.port, create_simulator_app(simulator), threaded=True).serve_forever()
@@ -0,0 +1,188 @@
+"""
+Worker throughput benchmarks against the local Graph simulator.
+
+Runs fetch_campaign, fetch_adsets, fetch_ad_spend_data and
+create_simple_campaign_task in-process (Celery eager mode) against
+benchmarks.graph_simulator and reports tasks/sec, Graph calls per account
+and p50/p99 task latency for each worker.
+
+Needs the same Postgres/Redis as the API, so run it inside the celery container:
+    docker compose exec celery python -m benchmarks.run_benchmarks --accounts 10 --rounds 3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+from benchmarks.graph_simulator import BASE_ACCOUNT_ID, add_config_arguments, config_from_args, start_simulator
+
+WORKERS = ["fetch_campaign", "fetch_adsets", "fetch_ad_spend_data", "create_simple_campaign_task"]
+
+BENCHMARK_USER_ID = "benchmark"
+BENCHMARK_TOKEN = "SIMULATED_ACCESS_TOKEN"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def schedule_for(watch):
+    today = datetime.now().strftime("%Y-%m-%d")
+    return {
+        "time": datetime.now().strftime("%H:%M"),
+        "campaign_code": "BENCH",
+        "watch": watch,
+        "cpp_metric": "500",
+        "on_off": "OFF",
+        "status": "Running",
+        "cpp_date_start": today,
+        "cpp_date_end": today,
+    }
+
+
+def build_cases():
+    """Map each worker name to (task, per_account, args_builder). Imported lazily so GRAPH_API_HOST applies."""
+    from workers.campaign_fetcher import fetch_campaign
+    from workers.on_off_adsets_worker import fetch_adsets
+    from workers.ad_spent_worker import fetch_ad_spend_data
+    from workers.create_campaig_celery import create_simple_campaign_task
+
+    def create_args(account_id):
+        return [
+            account_id, BENCHMARK_USER_ID, BENCHMARK_TOKEN, f"bench-{account_id}", f"BENCH-{account_id} Created",
+            "Benchmark Page", "100000000000001", "SKU", "MAT", "BENCH", 500,
+            "Headline", "Primary text", "Product", "https://example.com/bench.mp4", None,
+            [["Shopping"], ["Fashion"]], None, [{"regions": []}, {"regions": []}],
+        ]
+
+    return {
+        "fetch_campaign": (fetch_campaign, True, lambda a: [BENCHMARK_USER_ID, a, BENCHMARK_TOKEN, schedule_for("Campaigns")]),
+        "fetch_adsets": (fetch_adsets, True, lambda a: [BENCHMARK_USER_ID, a, BENCHMARK_TOKEN, schedule_for("Adsets")]),
+        "fetch_ad_spend_data": (fetch_ad_spend_data, False, lambda a: [BENCHMARK_USER_ID, BENCHMARK_TOKEN]),
+        "create_simple_campaign_task": (create_simple_campaign_task, True, create_args),
+    }
+
+
+def skip_fixed_sleeps():
+    """Drop the hard-coded waits in the campaign creation flow so only Graph time is measured."""
+    import workers.create_campaig_celery as create_module
+    import controllers.create_ads_controller as ads_module
+
+    for module in (create_module, ads_module):
+        module.time = SimpleNamespace(sleep=lambda seconds: None, time=time.time)
+
+
+def run_worker(name, case, simulator, account_ids, rounds, concurrency):
+    task, per_account, build_args = case
+    targets = account_ids if per_account else [None]
+
+    simulator.reset_stats()
+    latencies = []
+    failures = 0
+
+    def run_one(account_id):
+        started = time.perf_counter()
+        result = task.apply(args=build_args(account_id))
+        elapsed = time.perf_counter() - started
+        return elapsed, result.successful()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(rounds):
+            for elapsed, ok in executor.map(run_one, targets):
+                latencies.append(elapsed)
+                failures += 0 if ok else 1
+    wall = time.perf_counter() - started
+
+    stats = simulator.snapshot_stats()
+    return {
+        "worker": name,
+        "tasks": len(latencies),
+        "failures": failures,
+        "wall_seconds": round(wall, 3),
+        "tasks_per_sec": round(len(latencies) / wall, 3) if wall else 0.0,
+        "graph_calls_per_account": round(stats["graph_calls"] / (len(account_ids) * rounds), 2),
+        "http_requests_per_account": round(stats["http_requests"] / (len(account_ids) * rounds), 2),
+        "throttled": stats["throttled"],
+        "p50_seconds": round(percentile(latencies, 50), 3),
+        "p99_seconds": round(percentile(latencies, 99), 3),
+        "endpoints": stats["per_endpoint"],
+    }
+
+
+def cleanup(account_ids):
+    """Remove rows and throttle state the benchmark created for the synthetic accounts."""
+    from models.models import db, CampaignsScheduled
+    from workers.graph_functions.rate_limiter import redis_throttle, throttle_key
+
+    CampaignsScheduled.query.filter(CampaignsScheduled.ad_account_id.in_([int(a) for a in account_ids])).delete(synchronize_session=False)
+    db.session.commit()
+    redis_throttle.delete(*[throttle_key(f"act_{a}") for a in account_ids])
+
+
+def print_report(results):
+    header = f"{'worker':<30}{'tasks':>7}{'fail':>6}{'tasks/s':>10}{'calls/acct':>12}{'http/acct':>11}{'thrtl':>7}{'p50 s':>9}{'p99 s':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['worker']:<30}{r['tasks']:>7}{r['failures']:>6}{r['tasks_per_sec']:>10}{r['graph_calls_per_account']:>12}"
+              f"{r['http_requests_per_account']:>11}{r['throttled']:>7}{r['p50_seconds']:>9}{r['p99_seconds']:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Celery workers against the Graph simulator")
+    parser.add_argument("--workers", default=",".join(WORKERS), help="Comma-separated subset of: " + ", ".join(WORKERS))
+    parser.add_argument("--rounds", type=int, default=3, help="How many times each account is processed per worker")
+    parser.add_argument("--concurrency", type=int, default=10, help="Tasks run in parallel")
+    parser.add_argument("--keep-fixed-sleeps", action="store_true", help="Keep the 45s/5s waits in campaign creation")
+    parser.add_argument("--output", help="Also write the results as JSON to this path")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    simulator, server, base_url = start_simulator(config_from_args(args))
+    # Must be set before any worker module imports graph_client
+    os.environ["GRAPH_API_HOST"] = base_url
+
+    from app import create_app
+
+    app = create_app()
+    celery = app.extensions["celery"]
+    celery.conf.task_always_eager = True
+
+    if not args.keep_fixed_sleeps:
+        skip_fixed_sleeps()
+
+    account_ids = [str(BASE_ACCOUNT_ID + i) for i in range(args.accounts)]
+    cases = build_cases()
+    results = []
+
+    try:
+        with app.app_context():
+            cleanup(account_ids)
+            for name in [w.strip() for w in args.workers.split(",") if w.strip()]:
+                if name not in cases:
+                    print(f"Unknown worker '{name}', skipping", file=sys.stderr)
+                    continue
+                print(f"Running {name} ...", file=sys.stderr)
+                results.append(run_worker(name, cases[name], simulator, account_ids, args.rounds, args.concurrency))
+                # Each worker starts with a fresh usage window
+                cleanup(account_ids)
+    finally:
+        server.shutdown()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": config_from_args(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
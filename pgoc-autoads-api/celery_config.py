@@ -1,13 +1,16 @@
 from celery import Celery, Task
 from flask import Flask
 from celery.schedules import crontab
+from workers.graph_functions.circuit_breaker import CircuitOpenError
 
 
 def celery_init_app(app: Flask) -> Celery:
     class FlaskTask(Task):
         """Ensures Celery tasks run within Flask app context and retry on failure."""
         autoretry_for = (Exception,)  # Retries on any exception
+        dont_autoretry_for = (CircuitOpenError,)  # Dead tokens/accounts won't recover within the retries
         retry_kwargs = {"max_retries": 5, "countdown": 10}  # 5 retries, 10 sec delay
+        flask_app = app  # For signal handlers, which run outside __call__
 
         def __call__(self, *args, **kwargs):
             with app.app_context():
@@ -18,7 +21,7 @@ def celery_init_app(app: Flask) -> Celery:
         task_cls=FlaskTask,
         broker=app.config.get("CELERY_BROKER_URL", "redis://redisAds:6379/0"),
         backend=app.config.get("CELERY_RESULT_BACKEND", "redis://redisAds:6379/0"),
-        include=["workers.scheduler_celery", "workers.only_campaign_fetcher", "workers.delete_campaign_data_auto"],  # Auto-discover tasks
+        include=["workers.scheduler_celery", "workers.only_campaign_fetcher", "workers.schedule_dispatcher", "workers.delete_campaign_data_auto"],  # Auto-discover tasks
     )
 
     celery_app.conf.update(
@@ -36,6 +39,10 @@ def celery_init_app(app: Flask) -> Celery:
                 "task": "workers.only_campaign_fetcher.check_campaign_off_only",
                 "schedule": crontab(minute="*"),
             },
+            "dispatch_scheduled_tasks_every_minute": {
+                "task": "workers.schedule_dispatcher.dispatch_scheduled_tasks",
+                "schedule": crontab(minute="*"),
+            },
             "delete_campaign_data": {
                 "task": "workers.delete_campaign_data_auto.delete_old_campaigns",
                 "schedule": crontab(hour=0, minute=0),
@@ -2,7 +2,7 @@ from venv import logger
 from flask import jsonify, request
 from models.models import db, User, AccessToken
 from datetime import datetime, timedelta
-import requests
+from workers.graph_functions.graph_client import graph_request
 import pytz
 import logging
 
@@ -271,7 +271,7 @@ def fetch_facebook_user_info(access_token):
             'fields': 'id,name'
         }
 
-        response = requests.get(url, params=params)
+        response = graph_request("GET", url, params=params)
 
         if response.status_code == 200:
             return response.json()
@@ -299,7 +299,7 @@ def fetch_token_debug_info(access_token):
     """
     try:
         # Check if the token works by making a simple API call
-        test_response = requests.get(f"{FACEBOOK_GRAPH_URL}/me", params={'access_token': access_token})
+        test_response = graph_request("GET", f"{FACEBOOK_GRAPH_URL}/me", params={'access_token': access_token})
 
         if test_response.status_code == 200:
             # Token is valid - simulate token info
@@ -1,17 +1,8 @@
-import redis
-import json
 from datetime import datetime
 import pytz
 from flask import request, jsonify
 from workers.ad_spent_worker import fetch_ad_spend_data  # adjust import as needed
-
-# Redis client for websocket messages
-redis_websocket_asr = redis.Redis(
-    host="redisAds",
-    port=6379,
-    db=9,
-    decode_responses=True
-)
+from workers.on_off_functions.message_log import seed_log_message, AD_SPENT_LOG
 
 def ad_spent(data):
     data = request.get_json()
@@ -24,9 +15,8 @@ def ad_spent(data):
 
 
     websocket_key = f"{user_id}-key"
-    if not redis_websocket_asr.exists(websocket_key):
-        # Set with expiry of 1 hour (3600 seconds), adjust if needed
-        redis_websocket_asr.set(websocket_key, json.dumps({"message": ["User-Id Created"]}), ex=3600)
+    # Start the log with an expiry of 1 hour (3600 seconds), adjust if needed
+    seed_log_message(AD_SPENT_LOG, websocket_key, "User-Id Created", ttl=3600)
 
     try:
         task = fetch_ad_spend_data.apply_async(args=[user_id, access_token], countdown=0)
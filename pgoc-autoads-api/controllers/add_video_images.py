@@ -2,6 +2,7 @@ import base64
 from io import BytesIO
 import mimetypes
 import requests
+from workers.graph_functions.graph_client import graph_request
 from PIL import Image
 import re
 
@@ -64,7 +65,7 @@ def add_video(ad_account_id, access_token, title, file_url):
     }
     
     # Make the POST request to Facebook API
-    response = requests.post(url, headers=headers, json=video_data)
+    response = graph_request("POST", url, headers=headers, json=video_data)
     
     # Return the response from the Facebook API
     return response.json()
@@ -120,7 +121,7 @@ def add_ad_image(ad_account_id, access_token, file_url, image_name):
     }
 
     # Call the Facebook API
-    response = requests.post(upload_url, headers=headers, json=payload)
+    response = graph_request("POST", upload_url, headers=headers, json=payload)
 
     if response.status_code == 200:
         creative_image_url = response.json().get("images", {}).get(image_name, {}).get("url")
@@ -1,20 +1,14 @@
 import json
 from flask import jsonify
-import redis
 from sqlalchemy.orm.attributes import flag_modified
 from models.models import User, db, CampaignOffOnly
+from workers.schedule_functions.schedule_index import CAMPAIGN_OFF_ONLY, index_account_schedules, remove_account_schedules
+from workers.on_off_functions.message_log import delete_log, CAMPAIGN_ONLY_LOG
 from datetime import datetime
 import pytz
 
 manila_tz = pytz.timezone("Asia/Manila")
 
-redis_websocket = redis.Redis(
-    host="redisAds",
-    port=6379,
-    db=11,  # Updated to Redis DB 11
-    decode_responses=True
-)
-
 def add_schedule_logic(data):
     ad_account_id = data.get("ad_account_id")
     user_id = data.get("user_id")
@@ -81,6 +75,7 @@ def add_schedule_logic(data):
         db.session.rollback()
         return {"error": f"Database error: {str(e)}"}, 500
 
+    index_account_schedules(CAMPAIGN_OFF_ONLY, ad_account_id, existing_schedule.schedule_data)
     return {
         "message": message,
         "updated_schedule": existing_schedule.schedule_data,
@@ -158,6 +153,7 @@ def append_schedule_logic(data):
 
     try:
         db.session.commit()
+        index_account_schedules(CAMPAIGN_OFF_ONLY, ad_account_id, updated_schedule_data)
         return {
             "message": f"New campaign schedules added successfully: {', '.join(str(v['campaign_name']) for v in filtered_new_campaigns.values())}",
             "updated_schedule": existing_schedule.schedule_data
@@ -212,6 +208,7 @@ def remove_schedule_time_logic(data):
 
     try:
         db.session.commit()
+        index_account_schedules(CAMPAIGN_OFF_ONLY, ad_account_id, updated_schedule_data)
         return jsonify({"message": f"Schedule entry for time {time_to_remove} removed successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -238,10 +235,11 @@ def delete_schedule_logic(data):
         # Delete the schedule from the database
         db.session.delete(existing_schedule)
         db.session.commit()
+        remove_account_schedules(CAMPAIGN_OFF_ONLY, ad_account_id)
 
         # Construct Redis key and delete it
         redis_key = f"{user_id}-{ad_account_id}-key"
-        redis_websocket.delete(redis_key)  # Delete the key from Redis
+        delete_log(CAMPAIGN_ONLY_LOG, redis_key)  # Delete the account's message log
 
         return {
             "message": f"Schedule for ad_account_id {ad_account_id} linked to user {user_id} has been deleted, along with Redis key {redis_key}"
@@ -308,6 +306,7 @@ def edit_schedule_logic(data):
 
     try:
         db.session.commit()
+        index_account_schedules(CAMPAIGN_OFF_ONLY, ad_account_id, existing_schedule.schedule_data)
         return {
             "message": f"Schedule entry for time {time_to_edit} updated successfully.",
             "updated_schedule": existing_schedule.schedule_data
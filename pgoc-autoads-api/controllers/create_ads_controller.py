@@ -1,16 +1,16 @@
 # controllers/create_campaign_controller.py
 import logging
 from flask import json
-import requests
+import httpx
+from workers.graph_functions.graph_client import graph_request
 from datetime import datetime, timedelta
 import pytz
-import requests
 import time
 
 
 # Helper function to make requests to Facebook API
 def make_facebook_api_request(url, headers, data):
-    response = requests.post(url, headers=headers, json=data)
+    response = graph_request("POST", url, headers=headers, json=data, invalidates_reads=True)
     return response.json()
 
 
@@ -138,7 +138,7 @@ def create_adset(
 
     for attempt in range(1, max_retries + 1):
         try:
-            response = requests.post(url, headers=headers, json=adset_data)
+            response = graph_request("POST", url, headers=headers, json=adset_data, invalidates_reads=True)
             response_data = response.json()
 
             # If request is successful, return response
@@ -156,7 +156,7 @@ def create_adset(
                 logging.error(f"Request failed: {response_data} [{attempt}/{max_retries}]")
                 time.sleep(general_delay)
 
-        except requests.exceptions.RequestException as req_err:
+        except httpx.HTTPError as req_err:
             logging.error(f"Request error occurred: {req_err} [{attempt}/{max_retries}]")
             time.sleep(general_delay)
 
@@ -247,7 +247,7 @@ def create_ad_creative(ad_account_id, access_token, name, page_id, video_id, tit
         manila_tz = pytz.timezone('Asia/Manila')
 
         for attempt in range(1, MAX_RETRIES + 1):
-            response = requests.post(url, headers=headers, json=payload)
+            response = graph_request("POST", url, headers=headers, json=payload, invalidates_reads=True)
             response_data = response.json()
 
             if response.status_code == 200:
@@ -322,7 +322,7 @@ def create_ad(ad_account_id, access_token, name, adset_id, creative_id):
     manila_tz = pytz.timezone('Asia/Manila')
 
     for attempt in range(1, MAX_RETRIES + 1):
-        response = requests.post(url, headers=headers, json=ad_data)
+        response = graph_request("POST", url, headers=headers, json=ad_data, invalidates_reads=True)
         response_data = response.json()
 
         if response.status_code == 200:
@@ -376,7 +376,7 @@ def create_ad_usepost(ad_account_id, access_token, name, adset_id, object_story_
     manila_tz = pytz.timezone('Asia/Manila')
 
     for attempt in range(1, MAX_RETRIES + 1):
-        response = requests.post(url, headers=headers, json=ad_data)
+        response = graph_request("POST", url, headers=headers, json=ad_data, invalidates_reads=True)
         response_data = response.json()
 
         if response.status_code == 200:
@@ -434,7 +434,7 @@ def get_best_interests_for_keywords(access_token, interest_keywords):
                 'Authorization': f'Bearer {access_token}',
                 'Content-Type': 'application/json'
             }
-            response = requests.get(url, headers=headers, params=params)
+            response = graph_request("GET", url, headers=headers, params=params)
             if response.status_code == 200:
                 return response.json().get('data', [])
             return []
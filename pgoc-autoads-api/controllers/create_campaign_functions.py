@@ -1,6 +1,6 @@
 from models.models import db, Campaign
 from sqlalchemy.exc import SQLAlchemyError
-import requests
+from workers.graph_functions.graph_client import graph_request
 import logging
 
 
@@ -18,7 +18,7 @@ def delete_facebook(entity_id, access_token):
         headers = {"Authorization": f"Bearer {access_token}"}
 
         # Make DELETE request
-        response = requests.delete(delete_url, headers=headers)
+        response = graph_request("DELETE", delete_url, headers=headers, invalidates_reads=True)
 
         # Check response status
         if response.status_code == 200:
@@ -1,17 +1,8 @@
-import redis
-import json
 from datetime import datetime
 import pytz
 from flask import request, jsonify
 from workers.edit_budget_worker import update_budget_by_campaign_name
-
-# Redis client for budget update websocket/logging
-redis_websocket_budget = redis.Redis(
-    host="redisAds",
-    port=6379,
-    db=8,
-    decode_responses=True
-)
+from workers.on_off_functions.message_log import seed_log_message, EDIT_BUDGET_LOG
 
 def edit_budget(data):
     data = request.get_json()
@@ -28,8 +19,7 @@ def edit_budget(data):
         return jsonify({"error": "Missing one or more required fields"}), 400
 
     websocket_key = f"{user_id}-key"
-    if not redis_websocket_budget.exists(websocket_key):
-        redis_websocket_budget.set(websocket_key, json.dumps({"message": ["Budget update initiated"]}), ex=3600)
+    seed_log_message(EDIT_BUDGET_LOG, websocket_key, "Budget update initiated", ttl=3600)
 
     try:
         task = update_budget_by_campaign_name.apply_async(
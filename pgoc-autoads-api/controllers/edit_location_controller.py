@@ -1,20 +1,10 @@
-import redis
-import json
 from datetime import datetime
 import pytz
 from flask import request, jsonify
 
 # Import the new worker task
 from workers.edit_location_worker import update_locations_by_campaign_components
-
-# Redis client for location update websocket/logging
-# Using a different DB (e.g., db=9) to keep logs separate
-redis_websocket_location = redis.Redis(
-    host="redisAds",
-    port=6379,
-    db=9,
-    decode_responses=True
-)
+from workers.on_off_functions.message_log import seed_log_message, EDIT_LOCATION_LOG
 
 def edit_locations(data):
     """
@@ -38,10 +28,9 @@ def edit_locations(data):
     if not isinstance(new_regions_city, list):
         return jsonify({"error": "'new_regions_city' must be an array of location names"}), 400
 
-    # Set up Redis key for real-time logging
-    websocket_key = f"{user_id}-location-key"
-    if not redis_websocket_location.exists(websocket_key):
-        redis_websocket_location.set(websocket_key, json.dumps({"message": ["Location update initiated"]}), ex=3600)
+    # Start the log the worker and /messageevents-editlocation use for real-time logging
+    websocket_key = f"{user_id}-key"
+    seed_log_message(EDIT_LOCATION_LOG, websocket_key, "Location update initiated", ttl=3600)
 
     try:
         # Asynchronously call the new Celery worker task
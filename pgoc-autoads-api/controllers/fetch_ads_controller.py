@@ -1,4 +1,4 @@
-import requests
+from workers.graph_functions.graph_client import graph_request
 
 def fetch_campaigns_with_insights(ad_account_id, access_token):
     """
@@ -16,7 +16,7 @@ def fetch_campaigns_with_insights(ad_account_id, access_token):
     
     all_campaign_data = {}
     while True:
-        response = requests.get(base_url, params=params)
+        response = graph_request("GET", base_url, params=params)
         
         if response.status_code != 200:
             return {"error": "Failed to fetch data", "details": response.text}
@@ -1,17 +1,8 @@
 import time
 from flask import Blueprint, request, jsonify
-import redis
-import json
 from datetime import datetime
 from workers.on_off_adsets_worker import fetch_adsets
-
-# Initialize Redis connection
-redis_websocket_as = redis.Redis(
-    host="redisAds",
-    port=6379,
-    db=15,  
-    decode_responses=True
-)
+from workers.on_off_functions.message_log import seed_log_message, ADSETS_LOG
 
 def add_adset_off(data):
     data = request.get_json()
@@ -24,10 +15,9 @@ def add_adset_off(data):
     if not (ad_account_id and user_id and access_token and schedule_data):
         return jsonify({"error": "Missing required fields"}), 400
 
-    # Create WebSocket Redis key if it doesn't exist
+    # Start the user's message log if it doesn't exist
     websocket_key = f"{user_id}-key"
-    if not redis_websocket_as.exists(websocket_key):
-        redis_websocket_as.set(websocket_key, json.dumps({"message": ["User-Id Created"]}))
+    seed_log_message(ADSETS_LOG, websocket_key, "User-Id Created")
 
     # Since every call has only one schedule, directly process it
     schedule = schedule_data[0]
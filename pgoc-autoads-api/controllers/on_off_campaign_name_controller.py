@@ -1,16 +1,7 @@
 import time
 from flask import Blueprint, request, jsonify
-import redis
-import json
 from workers.on_off_campaign_name_worker import fetch_campaign_off
-
-# Initialize Redis connection
-redis_on_off_websocket = redis.Redis(
-    host="redisAds",
-    port=6379,
-    db=13,  
-    decode_responses=True
-)
+from workers.on_off_functions.message_log import seed_log_message, CAMPAIGN_NAME_LOG
 
 def add_campaign_off(data):
     data = request.get_json()
@@ -23,10 +14,9 @@ def add_campaign_off(data):
     if not (ad_account_id and user_id and access_token and schedule_data):
         return jsonify({"error": "Missing required fields"}), 400
 
-    # Create WebSocket Redis key if it doesn’t exist
+    # Start the user's message log if it doesn’t exist
     websocket_key = f"{user_id}-key"
-    if not redis_on_off_websocket.exists(websocket_key):
-        redis_on_off_websocket.set(websocket_key, json.dumps({"message": ["User-Id Created"]}))
+    seed_log_message(CAMPAIGN_NAME_LOG, websocket_key, "User-Id Created")
 
     # Since every call has only one schedule, directly process it
     schedule = schedule_data[0]
@@ -1,17 +1,8 @@
 import logging
 import time
 from flask import Blueprint, request, jsonify
-import redis
-import json
 from workers.on_off_page_worker import fetch_campaign_off
-
-# Initialize Redis connection
-redis_websocket_pn = redis.Redis(
-    host="redisAds",
-    port=6379,
-    db=12,  
-    decode_responses=True
-)
+from workers.on_off_functions.message_log import seed_log_message, append_log_message, PAGE_NAME_LOG
 
 def add_pagename_off(data):
     
@@ -29,11 +20,10 @@ def add_pagename_off(data):
         if not (ad_account_id and user_id and access_token and schedule_data):
             return jsonify({"error": "Missing required fields in one of the schedule entries."}), 400
 
-        # Create WebSocket Redis key if it doesn't exist
+        # Start the user's message log if it doesn't exist
         websocket_key = f"{user_id}-key"
-        if not redis_websocket_pn.exists(websocket_key):
-            redis_websocket_pn.set(websocket_key, json.dumps({"message": ["User-Id Created"]}))
-            logging.info(f"Created Redis key for user_id: {user_id} with initial message.")
+        if seed_log_message(PAGE_NAME_LOG, websocket_key, "User-Id Created"):
+            logging.info(f"Created message log for user_id: {user_id} with initial message.")
 
         # Process each schedule in the schedule_data array
         for schedule in schedule_data:
@@ -50,9 +40,10 @@ def add_pagename_off(data):
             page_count = len(page_names)
             if page_count > 1:
                 logging.info(f"Processing {page_count} page names: {', '.join(page_names)}")
-                redis_websocket_pn.set(
-                    websocket_key, 
-                    json.dumps({"message": [f"Processing {page_count} page names for {ad_account_id}: {', '.join(page_names)}"]})
+                append_log_message(
+                    PAGE_NAME_LOG,
+                    websocket_key,
+                    f"Processing {page_count} page names for {ad_account_id}: {', '.join(page_names)}"
                 )
 
             # Introduce a delay before calling Celery Task
@@ -1,19 +1,13 @@
 from flask import json
-import redis
 from models.models import User, db, CampaignsScheduled
 from datetime import datetime
 import pytz
 from sqlalchemy.orm.attributes import flag_modified
+from workers.schedule_functions.schedule_index import SCHEDULED_CAMPAIGNS, index_account_schedules, remove_account_schedules
+from workers.on_off_functions.message_log import delete_log, SCHEDULE_LOG
 
 manila_tz = pytz.timezone("Asia/Manila")
 
-redis_websocket = redis.Redis(
-    host="redisAds",
-    port=6379,
-    db=10,
-    decode_responses=True
-)
-
 def check_duplicate_times(ad_account_id, schedule_data):
     existing_schedule = CampaignsScheduled.query.filter_by(ad_account_id=ad_account_id).first()
     if existing_schedule:
@@ -157,6 +151,7 @@ def add_schedule_logic(data):
 
     try:
         db.session.commit()
+        index_account_schedules(SCHEDULED_CAMPAIGNS, ad_account_id, existing_schedule.schedule_data)
         return {
             "message": f"Schedule updated successfully. {message}",
             "updated_schedule": existing_schedule.schedule_data,
@@ -230,6 +225,7 @@ def append_schedule_logic(data):
 
     try:
         db.session.commit()
+        index_account_schedules(SCHEDULED_CAMPAIGNS, ad_account_id, updated_schedule_data)
         return {
             "message": "Schedule successfully appended",
             "updated_schedule": updated_schedule_data,
@@ -312,6 +308,7 @@ def edit_schedule_campaign_logic(data):
     # Attempt to commit the changes to the database
     try:
         db.session.commit()
+        index_account_schedules(SCHEDULED_CAMPAIGNS, ad_account_id, existing_schedule.schedule_data)
         return {
             "message": f"Schedule entry for time {time_to_edit} updated successfully.",
             "updated_schedule": existing_schedule.schedule_data
@@ -362,6 +359,7 @@ def pause_schedule_campaign_logic(data):
 
     existing_schedule.schedule_data = updated_schedule_data
     db.session.commit()
+    index_account_schedules(SCHEDULED_CAMPAIGNS, ad_account_id, updated_schedule_data)
     return {
         "message": "Schedule updated successfully.",
         "updated_schedule": updated_schedule_data,
@@ -410,6 +408,7 @@ def remove_schedule_time_logic(data):
 
     try:
         db.session.commit()
+        index_account_schedules(SCHEDULED_CAMPAIGNS, ad_account_id, updated_schedule_data)
         return {"message": f"Schedule entry {time_to_remove} removed successfully"}, 200
     except Exception as e:
         db.session.rollback()
@@ -436,10 +435,11 @@ def delete_schedule_logic(data):
         # Delete the schedule from the database
         db.session.delete(existing_schedule)
         db.session.commit()
+        remove_account_schedules(SCHEDULED_CAMPAIGNS, ad_account_id)
 
         # Construct Redis key and delete it
         redis_key = f"{user_id}-{ad_account_id}-key"
-        redis_websocket.delete(redis_key)  # Delete the key from Redis
+        delete_log(SCHEDULE_LOG, redis_key)  # Delete the account's message log
 
         return {
             "message": f"Schedule for ad_account_id {ad_account_id} linked to user {user_id} has been deleted, along with Redis key {redis_key}"
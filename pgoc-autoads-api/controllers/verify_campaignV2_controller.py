@@ -1,4 +1,4 @@
-import requests
+from workers.graph_functions.graph_client import graph_request
 from flask import jsonify
 from models.models import db, User
 
@@ -7,7 +7,7 @@ FACEBOOK_GRAPH_API_URL = "https://graph.facebook.com/v22.0"
 def get_facebook_user_id(access_token):
     """Validate access token and return Facebook user ID or error."""
     url = f"{FACEBOOK_GRAPH_API_URL}/me?access_token={access_token}"
-    response = requests.get(url).json()
+    response = graph_request("GET", url).json()
     if "error" in response:
         return None, response["error"]["message"]
     return response["id"], None
@@ -15,7 +15,7 @@ def get_facebook_user_id(access_token):
 def get_ad_accounts(ad_account_id, access_token):
     """Check if the access token has access to a specific ad account."""
     url = f"{FACEBOOK_GRAPH_API_URL}/act_{ad_account_id}?access_token={access_token}"
-    response = requests.get(url).json()
+    response = graph_request("GET", url).json()
     if "error" in response:
         return False, response["error"]["message"]
     return True, None
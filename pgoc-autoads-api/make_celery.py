@@ -1,8 +1,8 @@
-from app import create_app
+from app import create_worker_app
 
 
 # Create the Flask app instance
-flask_app = create_app()
+flask_app = create_worker_app()
 
 # Access the Celery app instance from Flask's extensions
 celery_app = flask_app.extensions["celery"]
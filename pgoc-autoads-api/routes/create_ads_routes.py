@@ -171,14 +171,8 @@ current_time_manila = datetime.now(manila_tz)
 #         logging.error(f"Critical error during campaign creation: {str(e)}")
 #         return jsonify({"error": "An error occurred", "details": str(e)}), 500
         
-redis_on_off_websocket = redis.Redis(
-    host="redisAds",
-    port=6379,
-    db=14,  
-    decode_responses=True
-)
-
 from workers.on_off_functions.create_campaign_message import append_redis_message_create_campaigns
+from workers.on_off_functions.message_log import seed_log_message, CREATE_CAMPAIGN_LOG
 
 @createbp.route('/create-campaigns', methods=['POST'])
 def create_multiple_simple_campaigns():
@@ -201,10 +195,9 @@ def create_multiple_simple_campaigns():
             append_redis_message_create_campaigns(user_id, f"[ERROR] Invalid user_id: {user_id}. User not found.")
             raise ValueError(f"Invalid user_id: {user_id}. User not found.")
         
-        # Create WebSocket Redis key if it doesn’t exist
+        # Start the user's message log if it doesn’t exist
         websocket_key = f"{user_id}-key"
-        if not redis_on_off_websocket.exists(websocket_key):
-            redis_on_off_websocket.set(websocket_key, json.dumps({"message": ["User-Id Created"]}))
+        if seed_log_message(CREATE_CAMPAIGN_LOG, websocket_key, "User-Id Created"):
             append_redis_message_create_campaigns(user_id, "[INFO] WebSocket key created.")
 
         tasks = []
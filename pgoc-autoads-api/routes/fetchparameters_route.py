@@ -1,5 +1,5 @@
 from flask import Blueprint, json, request, jsonify
-import requests
+from workers.graph_functions.graph_client import graph_request
 
 # Create a new Blueprint for parameters-related functionality
 parameters_bp = Blueprint('parameters', __name__)
@@ -57,7 +57,7 @@ def get_interests():
             }
 
             # Make the GET request to Facebook's Graph API
-            response = requests.get(url, headers=headers, params=params)
+            response = graph_request("GET", url, headers=headers, params=params)
 
             # Check for any errors in the response
             if response.status_code != 200:
@@ -116,7 +116,7 @@ def get_ad_videos():
         }
 
         # Make the GET request to the Facebook API
-        response = requests.get(url, params=params)
+        response = graph_request("GET", url, params=params)
 
         # Check for any errors in the response
         if response.status_code != 200:
@@ -173,7 +173,7 @@ def get_ad_images():
         }
 
         # Make the GET request to the Facebook API
-        response = requests.get(url, params=params)
+        response = graph_request("GET", url, params=params)
 
         # Check for any errors in the response
         if response.status_code != 200:
@@ -240,7 +240,7 @@ def get_best_interests():
                 'Authorization': f'Bearer {access_token}',
                 'Content-Type': 'application/json'
             }
-            response = requests.get(url, headers=headers, params=params)
+            response = graph_request("GET", url, headers=headers, params=params)
             if response.status_code == 200:
                 return response.json().get('data', [])
             return []
@@ -1,14 +1,12 @@
-import json
 from flask import Blueprint, request, jsonify
 import pytz
-import redis
 from controllers.scheduler_controller import add_schedule_logic, append_schedule_logic, delete_schedule_logic, edit_schedule_campaign_logic, remove_schedule_time_logic, pause_schedule_campaign_logic
 from models.models import User, db, CampaignsScheduled
+from workers.on_off_functions.message_log import seed_log_message, SCHEDULE_LOG
 from datetime import datetime, timedelta
 
 schedule_bp = Blueprint("schedule_bp", __name__)
 
-redis_websocket = redis.Redis(host="redisAds", port=6379, db=10, decode_responses=True)
 manila_tz = pytz.timezone("Asia/Manila")
 
 @schedule_bp.route("/create-campaign-schedule", methods=["POST"])
@@ -75,26 +73,14 @@ def get_user_ad_accounts():
 
     user_schedules = CampaignsScheduled.query.filter_by(user_id=user_id).all()
 
-    # Get current time in Manila timezone
-    now = datetime.now(manila_tz)
-    
-    # Get next midnight (12:00 AM Manila time)
-    tomorrow_midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-    
-    # Convert to UNIX timestamp
-    expire_timestamp = int(tomorrow_midnight.timestamp())
-
     ad_accounts = []
     
     for schedule in user_schedules:
         ad_account_id = schedule.ad_account_id or "N/A"
         redis_key = f"{user_id}-{ad_account_id}-key"
 
-        # Check if the key exists in Redis
-        if not redis_websocket.exists(redis_key):
-            # Create default Redis entry with only a "message" field
-            redis_websocket.set(redis_key, json.dumps({"message": [f"Last Check Message: {schedule.last_check_message}"] or ["No recent activity"]}))
-            redis_websocket.expireat(redis_key, expire_timestamp)  # Expire at 12:00 AM Manila time
+        # Start the account's message log (expires at 12:00 AM) unless it already has entries
+        seed_log_message(SCHEDULE_LOG, redis_key, f"Last Check Message: {schedule.last_check_message}")
 
         ad_accounts.append({
             "ad_account_id": ad_account_id,
@@ -0,0 +1,25 @@
+"""Cooperative (gevent) server for the API.
+
+Each request, including every open SSE stream, runs in a greenlet instead of
+an OS thread, so thousands of idle dashboards cost memory rather than threads.
+Patching must happen before anything imports sockets, threads or queues.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os
+import logging
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+from app import create_app
+
+PORT = int(os.getenv("FLASK_RUN_PORT", 5095))
+# Concurrent connections of any kind; SSE streams are further capped by SSE_MAX_CONNECTIONS
+SERVER_MAX_CONNECTIONS = int(os.getenv("SERVER_MAX_CONNECTIONS", 5000))
+
+app = create_app()
+
+if __name__ == "__main__":
+    logging.info(f"Serving on 0.0.0.0:{PORT} with gevent, up to {SERVER_MAX_CONNECTIONS} connections")
+    WSGIServer(("0.0.0.0", PORT), app, spawn=Pool(SERVER_MAX_CONNECTIONS)).serve_forever()
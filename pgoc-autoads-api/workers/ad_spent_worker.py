@@ -1,25 +1,20 @@
 import json
 import logging
 import pytz
-import requests
-import time
 from datetime import datetime
 from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
 from celery import shared_task
+from workers.graph_functions.graph_client import FACEBOOK_GRAPH_URL, graph_request
 from workers.on_off_functions.ad_spent_message import append_redis_message_adspent
 
 # Constants
-FACEBOOK_GRAPH_URL = "https://graph.facebook.com/v22.0"
 manila_tz = pytz.timezone("Asia/Manila")
 
 # Logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-# Session with connection pooling
-session = requests.Session()
-session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=3))
 
 def get_current_time():
     """Get current time in Manila timezone"""
@@ -29,13 +24,12 @@ def append_message(user_id, message):
     """Append message with current Manila time"""
     timestamp = get_current_time()
     append_redis_message_adspent(user_id, f"[{timestamp}] {message}")
-    time.sleep(0.1)  # Small delay to ensure SSE can display the message
 
 def get_facebook_user_info(access_token):
     url = f"{FACEBOOK_GRAPH_URL}/me"
     params = {"access_token": access_token, "fields": "id,name"}
     try:
-        response = session.get(url, params=params, timeout=10)
+        response = graph_request("GET", url, params=params)
         if response.status_code == 200:
             return response.json()
         logger.error(f"User info error: {response.status_code}, {response.text}")
@@ -50,7 +44,7 @@ def get_ad_accounts(access_token):
     ad_accounts = []
     try:
         while url:
-            response = session.get(url, params=params if '?' not in url else {}, timeout=15)
+            response = graph_request("GET", url, params=params if '?' not in url else {})
             if response.status_code != 200:
                 logger.error(f"Ad accounts error: {response.status_code}, {response.text}")
                 break
@@ -111,10 +105,10 @@ def process_single_account_batch(account_data):
             {"method": "GET", "relative_url": f"act_{ad_account_id}/insights?fields=campaign_id,campaign_name,spend&level=campaign&date_preset=today&limit=1000"}
         ]
 
-        response = session.post(
+        response = graph_request(
+            "POST",
             FACEBOOK_GRAPH_URL,
             data={"access_token": access_token, "batch": json.dumps(batch)},
-            timeout=30
         )
 
         if response.status_code != 200:
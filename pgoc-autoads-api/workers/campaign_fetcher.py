@@ -2,14 +2,19 @@ import logging
 import re
 import redis
 import pytz
-import requests
-import json
 from celery import shared_task
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from sqlalchemy.orm.attributes import flag_modified
 from models.models import db, CampaignsScheduled
 from workers.on_off_functions.account_message import append_redis_message
 from workers.update_status import process_scheduled_campaigns, process_adsets
+from workers.graph_functions.hierarchy_fetcher import fetch_campaign_tree
+from workers.graph_functions.campaign_query import fetch_matching_campaigns
+from workers.graph_functions.insights_cache import get_campaign_and_adset_insights
+from workers.graph_functions.circuit_breaker import is_circuit_open
+from workers.schedule_functions.pending_queue import queue_pending_schedule, run_coalesced
+from workers.schedule_functions.account_lock import AccountLock, LockLostError, CAMPAIGN_FETCH
 
 # Redis Client
 redis_client = redis.StrictRedis(host="redisAds", port=6379, db=2, decode_responses=True)
@@ -17,152 +22,175 @@ redis_client = redis.StrictRedis(host="redisAds", port=6379, db=2, decode_respon
 # Timezone
 manila_tz = pytz.timezone("Asia/Manila")
 
-# Facebook API
-FACEBOOK_API_VERSION = "v22.0"
-FACEBOOK_GRAPH_URL = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}"
-
-def fetch_facebook_data(url, access_token):
-    """Fetch data from Facebook API and handle errors."""
-    try:
-        response = requests.get(url, headers={"Authorization": f"Bearer {access_token}"}, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+def cpp_from_rows(level, items):
+    """Map campaign_id or adset_id to CPP for insights rows of `level`."""
+    cpp_data = {}
+    for item in items:
+        entity_id = item.get(f"{level}_id")
+        spend = float(item.get("spend", 0))
 
-        if "error" in data:
-            logging.error(f"Facebook API Error: {data['error']}")
-            return {"error": data["error"]}
+        actions = {action["action_type"]: float(action["value"]) for action in item.get("actions", [])}
+        initiate_checkout_value = actions.get("omni_initiated_checkout", 0)
 
-        return data
+        cpp_data[entity_id] = spend / initiate_checkout_value if initiate_checkout_value > 0 else 0
 
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching data from Facebook API: {e}")
-        return {"error": {"message": str(e), "type": "RequestException"}}
+    return cpp_data
 
-def get_cpp_from_insights(ad_account_id, access_token, level, cpp_date_start, cpp_date_end):
+def get_cpp_from_insights(ad_account_id, access_token, cpp_date_start, cpp_date_end):
     """
     Fetch CPP values from Facebook insights API within a specific date range.
-    Returns a dictionary mapping campaign_id or adset_id to CPP values.
+    Returns (campaign CPPs, adset CPPs, error), both maps from one adset-level read.
+    On error both maps are empty and must not be used to decide statuses.
     """
-    cpp_data = {}
-    url = (f"{FACEBOOK_GRAPH_URL}/act_{ad_account_id}/insights"
-           f"?level={level}&fields={level}_id,actions,spend"
-           f"&time_range[since]={cpp_date_start}&time_range[until]={cpp_date_end}")
-
-    while url:
-        response_data = fetch_facebook_data(url, access_token)
-        if "error" in response_data:
-            logging.error(f"Error fetching {level} insights: {response_data['error'].get('message', 'Unknown error')}")
-            break
+    # Campaign totals are rolled up from the adset rows instead of a second level=campaign read
+    campaign_items, adset_items, error = get_campaign_and_adset_insights(ad_account_id, access_token, cpp_date_start, cpp_date_end)
+    if error:
+        logging.error(f"Error fetching insights: {error.get('message', 'Unknown error')}")
+        return {}, {}, error
 
-        for item in response_data.get("data", []):
-            entity_id = item.get(f"{level}_id")
-            spend = float(item.get("spend", 0))
+    return cpp_from_rows("campaign", campaign_items), cpp_from_rows("adset", adset_items), None
 
-            actions = {action["action_type"]: float(action["value"]) for action in item.get("actions", [])}
-            initiate_checkout_value = actions.get("omni_initiated_checkout", 0)
+def schedule_date_range(schedule):
+    today = datetime.now().strftime("%Y-%m-%d")
+    return schedule.get("cpp_date_start", today), schedule.get("cpp_date_end", today)
 
-            cpp_data[entity_id] = spend / initiate_checkout_value if initiate_checkout_value > 0 else 0
-
-        url = response_data.get("paging", {}).get("next")  # Pagination
-
-    return cpp_data
+def fetch_compatibility_key(schedule):
+    """Schedules with the same watch type and CPP date range can share one fetch."""
+    return (schedule.get("watch", "").strip().lower(), *schedule_date_range(schedule))
 
 @shared_task
 def fetch_campaign(user_id, ad_account_id, access_token, matched_schedule):
     """Fetch campaigns for an ad account and store structured data in CampaignsScheduled."""
-    lock_key = f"lock:fetch_campaign:{ad_account_id}"
-    lock = redis_client.lock(lock_key, timeout=300)
+    lock = AccountLock(CAMPAIGN_FETCH, ad_account_id)
     pending_schedules_key = f"pending_schedules:{ad_account_id}"
 
     logging.info(f"Schedule Data: {matched_schedule}")
     append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Fetching Campaign Data for {ad_account_id} schedule {matched_schedule}")
 
+    if is_circuit_open(access_token, ad_account_id):
+        msg = f"Skipping {ad_account_id}: access token or ad account keeps failing authorization."
+        append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+        return msg
+
     if not lock.acquire(blocking=False):
         logging.info(f"Fetch campaign already running for {ad_account_id}. Adding to queue...")
-        redis_client.rpush(pending_schedules_key, json.dumps(matched_schedule))
+        queue_pending_schedule(redis_client, pending_schedules_key, user_id, access_token, matched_schedule)
         return f"Fetch already in progress for {ad_account_id}, queued process_scheduled_campaigns"
 
-    try:
-        matched_campaigns = {}
-        schedule_code = matched_schedule["campaign_code"].lower()
+    # The lock holder also runs whatever gets queued for this account meanwhile
+    return run_coalesced(
+        redis_client, lock, pending_schedules_key, user_id, access_token, matched_schedule,
+        fetch_compatibility_key,
+        lambda group_user_id, group_access_token, schedules: fetch_campaign_group(
+            group_user_id, ad_account_id, group_access_token, schedules, lock
+        ),
+    )
+
+def fetch_campaign_group(user_id, ad_account_id, access_token, schedules, lock):
+    """Fetch one snapshot for compatible schedules, then apply each schedule's rule to it."""
+    if is_circuit_open(access_token, ad_account_id):
+        msg = f"Skipping {ad_account_id}: access token or ad account keeps failing authorization."
+        append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+        return msg
 
-        campaign_url = f"{FACEBOOK_GRAPH_URL}/act_{ad_account_id}/campaigns?fields=id,name,status,adsets{{id,name,status}}"
-        campaigns_data = fetch_facebook_data(campaign_url, access_token)
+    try:
+        if len(schedules) > 1:
+            append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Running {len(schedules)} queued schedules against one campaign fetch")
 
-        if "error" in campaigns_data:
-            error_msg = campaigns_data["error"].get("message", "Unknown error")
-            logging.error(f"Facebook API Error: {error_msg}")
-            append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_msg}")
-            return f"Error fetching campaign data for {ad_account_id}: {error_msg}"
+        schedule_codes = [schedule["campaign_code"].lower() for schedule in schedules]
 
-        # Fetch CPP data before processing campaigns
-        cpp_date_start = matched_schedule.get("cpp_date_start", datetime.now().strftime("%Y-%m-%d"))
-        cpp_date_end = matched_schedule.get("cpp_date_end", datetime.now().strftime("%Y-%m-%d"))
-        cpp_campaign_data = get_cpp_from_insights(ad_account_id, access_token, "campaign", cpp_date_start, cpp_date_end)
-        cpp_adset_data = get_cpp_from_insights(ad_account_id, access_token, "adset", cpp_date_start, cpp_date_end)
-
-        for campaign in campaigns_data.get("data", []):
-            campaign_id = campaign["id"]
-            campaign_name = campaign["name"]
-            campaign_status = campaign["status"]
-            campaign_CPP = cpp_campaign_data.get(campaign_id, 0)
-
-            if schedule_code in campaign_name.lower():
-                matched_campaigns[campaign_id] = {
-                    "campaign_name": campaign_name,
-                    "STATUS": campaign_status,
-                    "CPP": campaign_CPP,
-                    "on_off": matched_schedule["on_off"],
-                    "ADSETS": {
-                        adset["id"]: {
-                            "NAME": adset["name"],
-                            "STATUS": adset["status"],
-                            "CPP": cpp_adset_data.get(adset["id"], 0),
-                        }
-                        for adset in campaign.get("adsets", {}).get("data", [])
-                    },
-                }
-
-        campaign_entry = CampaignsScheduled.query.filter_by(ad_account_id=ad_account_id).first()
-        if not campaign_entry:
-            campaign_entry = CampaignsScheduled(
-                ad_account_id=ad_account_id,
-                matched_campaign_data={},
-                last_time_checked=datetime.now(),
-                last_check_status="Ongoing",
-                last_check_message=f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaigns saved successfully."
-            )
-            db.session.add(campaign_entry)
+        cpp_date_start, cpp_date_end = schedule_date_range(schedules[0])
 
-        campaign_entry.matched_campaign_data = matched_campaigns
-        campaign_entry.last_time_checked = datetime.now()
-        campaign_entry.last_check_status = "Success"
-        campaign_entry.last_check_message = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaign data updated."
+        # Insights and the campaign listing are independent; fetch them side by side
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            insights_future = executor.submit(get_cpp_from_insights, ad_account_id, access_token, cpp_date_start, cpp_date_end)
 
-        flag_modified(campaign_entry, "matched_campaign_data")
-        db.session.commit()
+            # Every matching campaign plus any adsets beyond the first nested page; the name match runs on Graph's side
+            campaigns, campaigns_error = fetch_matching_campaigns(
+                lambda params: fetch_campaign_tree(ad_account_id, access_token, params=params),
+                schedule_codes,
+                lambda campaign_name, code: code in campaign_name.lower(),
+                normalized=False,
+            )
+            cpp_campaign_data, cpp_adset_data, insights_error = insights_future.result()
 
-        logging.info(f"Successfully fetched and saved campaigns for Ad Account {ad_account_id}")
-        append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaigns updated successfully.")
+        if insights_error:
+            # Missing CPPs would read as 0 and drive the rules on data we never fetched
+            error_msg = insights_error.get("message", "Unknown error")
+            append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Skipped schedule: could not read CPP insights ({error_msg}). No statuses were changed.")
+            return f"Error fetching insights for {ad_account_id}: {error_msg}"
 
-        # Case insensitive watch selection
-        watch = matched_schedule.get("watch", "").strip().lower()
+        if campaigns_error:
+            error_msg = campaigns_error.get("message", "Unknown error")
+            logging.error(f"Facebook API Error: {error_msg}")
+            append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_msg}")
+            return f"Error fetching campaign data for {ad_account_id}: {error_msg}"
 
-        if watch == "campaigns":
-            process_scheduled_campaigns.apply_async(args=[user_id, ad_account_id, access_token, matched_schedule])
-        elif watch == "adsets":
-            process_adsets.apply_async(args=[user_id, ad_account_id, access_token, matched_schedule, matched_campaigns])
-        else:
-            msg = f"Unknown watch type: {matched_schedule.get('watch')}"
-            logging.warning(msg)
-            append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+        for matched_schedule, schedule_code in zip(schedules, schedule_codes):
+            matched_campaigns = {}
+
+            for campaign in campaigns:
+                campaign_id = campaign["id"]
+                campaign_name = campaign["name"]
+                campaign_status = campaign["status"]
+                campaign_CPP = cpp_campaign_data.get(campaign_id, 0)
+
+                if schedule_code in campaign_name.lower():
+                    matched_campaigns[campaign_id] = {
+                        "campaign_name": campaign_name,
+                        "STATUS": campaign_status,
+                        "CPP": campaign_CPP,
+                        "on_off": matched_schedule["on_off"],
+                        "ADSETS": {
+                            adset["id"]: {
+                                "NAME": adset["name"],
+                                "STATUS": adset["status"],
+                                "CPP": cpp_adset_data.get(adset["id"], 0),
+                            }
+                            for adset in campaign.get("adsets", {}).get("data", [])
+                        },
+                    }
+
+            campaign_entry = CampaignsScheduled.query.filter_by(ad_account_id=ad_account_id).first()
+            if not campaign_entry:
+                campaign_entry = CampaignsScheduled(
+                    ad_account_id=ad_account_id,
+                    matched_campaign_data={},
+                    last_time_checked=datetime.now(),
+                    last_check_status="Ongoing",
+                    last_check_message=f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaigns saved successfully."
+                )
+                db.session.add(campaign_entry)
+
+            campaign_entry.matched_campaign_data = matched_campaigns
+            campaign_entry.last_time_checked = datetime.now()
+            campaign_entry.last_check_status = "Success"
+            campaign_entry.last_check_message = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaign data updated."
+
+            flag_modified(campaign_entry, "matched_campaign_data")
+            lock.commit(db.session)
+
+            logging.info(f"Successfully fetched and saved campaigns for Ad Account {ad_account_id}")
+            append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaigns updated successfully.")
+
+            # Case insensitive watch selection
+            watch = matched_schedule.get("watch", "").strip().lower()
+
+            # Each schedule gets its own matched campaigns; the row only keeps the latest
+            if watch == "campaigns":
+                process_scheduled_campaigns.apply_async(args=[user_id, ad_account_id, access_token, matched_schedule, matched_campaigns])
+            elif watch == "adsets":
+                process_adsets.apply_async(args=[user_id, ad_account_id, access_token, matched_schedule, matched_campaigns])
+            else:
+                msg = f"Unknown watch type: {matched_schedule.get('watch')}"
+                logging.warning(msg)
+                append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
 
         return f"Fetched campaign data for Ad Account {ad_account_id}"
 
+    except LockLostError:
+        # run_coalesced returns the schedules to the pending list
+        raise
     except Exception as e:
         logging.error(f"Error during campaign fetch: {e}")
         return f"Error: {str(e)}"
-
-    finally:
-        lock.release()
-        logging.info(f"Released lock for Ad Account {ad_account_id}")
@@ -6,7 +6,7 @@ from flask import jsonify
 import mysql.connector
 import os
 import pytz
-import requests
+from workers.graph_functions.graph_client import graph_request
 from celery import shared_task
 from controllers.add_video_images import add_ad_image, get_downloadable_drive_url
 from controllers.create_ads_controller import create_ad, create_ad_creative, create_ad_usepost, create_adset
@@ -239,7 +239,7 @@ def create_simple_campaign_task(self, ad_account_id, user_id, access_token, camp
             }
 
             video_upload_url = f"https://graph.facebook.com/v21.0/act_{ad_account_id}/advideos"
-            video_response = requests.post(video_upload_url, headers=headers, json=video_data)
+            video_response = graph_request("POST", video_upload_url, headers=headers, json=video_data)
 
             logging.info(f"[{datetime.now(manila_tz).strftime('%Y-%m-%d %H:%M:%S')}] Video uploaded successfully for {campaign_name}")
             append_redis_message_create_campaigns(user_id, f"[{datetime.now(manila_tz).strftime('%Y-%m-%d %H:%M:%S')}] 🎥✅ Video uploaded successfully for {campaign_name}")
@@ -299,7 +299,7 @@ def create_simple_campaign_task(self, ad_account_id, user_id, access_token, camp
 
         object_story_id = None
         for attempt in range(8):
-            object_story_response = requests.get(object_story_id_url, headers=headers)
+            object_story_response = graph_request("GET", object_story_id_url, headers=headers)
             response_json = object_story_response.json()
 
             logging.info(f"Attempt {attempt+1}: Object Story Response JSON: {response_json}")
@@ -329,7 +329,7 @@ def create_simple_campaign_task(self, ad_account_id, user_id, access_token, camp
             for word in interest_words:
                 try:
                     params = {"q": word, "type": "adinterest"}
-                    response = requests.get(FACEBOOK_GRAPH_API_URL, headers=headers, params=params)
+                    response = graph_request("GET", FACEBOOK_GRAPH_API_URL, headers=headers, params=params)
                     response_data = response.json()
 
                     if "data" in response_data and response_data["data"]:
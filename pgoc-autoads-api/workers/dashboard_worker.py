@@ -1,29 +1,25 @@
 import json
 import logging
 import pytz
-import requests
 from datetime import datetime
 from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
 from celery import shared_task
+from workers.graph_functions.graph_client import FACEBOOK_GRAPH_URL, graph_request
 
 # Constants
-FACEBOOK_GRAPH_URL = "https://graph.facebook.com/v22.0"
 manila_tz = pytz.timezone("Asia/Manila")
 
 # Logging - Set to WARNING to reduce noise
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.WARNING)
 
-# Session with connection pooling
-session = requests.Session()
-session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=3))
 
 def get_facebook_user_info(access_token):
     url = f"{FACEBOOK_GRAPH_URL}/me"
     params = {"access_token": access_token, "fields": "id,name"}
     try:
-        response = session.get(url, params=params, timeout=10)
+        response = graph_request("GET", url, params=params)
         if response.status_code == 200:
             return response.json()
         logger.error(f"User info error: {response.status_code}")
@@ -37,7 +33,7 @@ def get_ad_accounts(access_token):
     ad_accounts = []
     try:
         while url:
-            response = session.get(url, params=params if '?' not in url else {}, timeout=15)
+            response = graph_request("GET", url, params=params if '?' not in url else {})
             if response.status_code != 200:
                 logger.error(f"Ad accounts error: {response.status_code}")
                 break
@@ -98,7 +94,7 @@ def _update_facebook_object_status(object_id, access_token, status, object_type)
     }
 
     try:
-        response = session.post(url, data=params, timeout=10)
+        response = graph_request("POST", url, data=params, invalidates_reads=True)
         if response.status_code == 200:
             return {"success": True, f"{object_type}_id": object_id, "new_status": status}
         else:
@@ -145,10 +141,10 @@ def process_single_account_batch(account_data):
             {"method": "GET", "relative_url": f"act_{ad_account_id}/insights?fields=campaign_id,campaign_name,spend&level=campaign&date_preset=today&limit=1000"}
         ]
 
-        response = session.post(
+        response = graph_request(
+            "POST",
             FACEBOOK_GRAPH_URL,
             data={"access_token": access_token, "batch": json.dumps(batch)},
-            timeout=30
         )
 
         if response.status_code != 200:
@@ -2,7 +2,8 @@ import json
 import re
 import logging
 import pytz
-import requests
+import httpx
+from workers.graph_functions.graph_client import graph_request
 import time
 from datetime import datetime
 from collections import defaultdict
@@ -79,7 +80,7 @@ def find_campaign_id_by_components(ad_account_id: str, access_token: str, input_
     }
 
     try:
-        response = requests.get(url, params=params)
+        response = graph_request("GET", url, params=params)
         response.raise_for_status()
         data = response.json()
 
@@ -129,7 +130,7 @@ def find_campaign_id_by_components(ad_account_id: str, access_token: str, input_
         elif not best_match:
             logger.warning(f"[{get_current_time()}] FLEXIBLE MODE: No campaigns found in account {ad_account_id}")
         return ""
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"[{get_current_time()}] Error while fetching campaigns: {e}")
         return ""
 
@@ -144,12 +145,12 @@ def update_campaign_budget(campaign_id: str, access_token: str, new_daily_budget
     }
 
     try:
-        response = requests.post(url, data=payload)
+        response = graph_request("POST", url, data=payload, invalidates_reads=True)
         response.raise_for_status()
         logger.info(f"[{get_current_time()}] Updated budget for campaign {campaign_id} to {new_daily_budget}")
         return True
 
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"[{get_current_time()}] Failed to update budget for campaign {campaign_id}: {e}")
         return False
 
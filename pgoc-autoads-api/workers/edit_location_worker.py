@@ -1,6 +1,7 @@
 import json
 import logging
-import requests
+import httpx
+from workers.graph_functions.graph_client import graph_request
 import pytz
 from datetime import datetime
 from celery import shared_task
@@ -83,7 +84,7 @@ def find_campaign_id_by_components(ad_account_id: str, access_token: str, input_
     }
 
     try:
-        response = requests.get(url, params=params)
+        response = graph_request("GET", url, params=params)
         response.raise_for_status()
         data = response.json()
 
@@ -132,7 +133,7 @@ def find_campaign_id_by_components(ad_account_id: str, access_token: str, input_
         else:
             logger.warning(f"[{get_current_time()}] FLEXIBLE MODE: No campaigns found in account {ad_account_id}")
         return ""
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"[{get_current_time()}] Error while fetching campaigns: {e}")
         return ""
 
@@ -148,7 +149,7 @@ def find_ad_set_ids_by_campaign_id(campaign_id: str, access_token: str) -> list[
     }
 
     try:
-        response = requests.get(url, params=params)
+        response = graph_request("GET", url, params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -156,7 +157,7 @@ def find_ad_set_ids_by_campaign_id(campaign_id: str, access_token: str) -> list[
         logger.info(f"[{get_current_time()}] Found {len(ad_set_ids)} ad sets in campaign {campaign_id}")
         return ad_set_ids
 
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"[{get_current_time()}] Error fetching ad sets: {e}")
         return []
 
@@ -167,10 +168,10 @@ def update_ad_set_targeting(ad_set_id: str, access_token: str, targeting_payload
     url = f"{FACEBOOK_GRAPH_URL}/{ad_set_id}"
     payload = {"targeting": json.dumps(targeting_payload), "access_token": access_token}
     try:
-        response = requests.post(url, data=payload)
+        response = graph_request("POST", url, data=payload, invalidates_reads=True)
         response.raise_for_status()
         return True
-    except requests.RequestException:
+    except httpx.HTTPError:
         return False
 
 @shared_task
@@ -0,0 +1,128 @@
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlencode
+import httpx
+from workers.graph_functions.graph_client import FACEBOOK_GRAPH_URL, graph_request
+
+# Graph API accepts at most 50 operations per batch request
+GRAPH_BATCH_LIMIT = 50
+
+
+def chunked(items, size):
+    """Split a list into consecutive chunks of at most `size` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def parse_batch_item(item):
+    """Return (success, error_message) for one entry of a batch response."""
+    if item is None:
+        # Graph returns null for operations that did not complete in time
+        return False, "No response for batch operation (timed out)"
+
+    try:
+        body = json.loads(item.get("body") or "{}")
+    except ValueError:
+        body = {}
+
+    if item.get("code") == 200 and not (isinstance(body, dict) and "error" in body):
+        return True, None
+
+    error = body.get("error", {}) if isinstance(body, dict) else {}
+    return False, error.get("message", f"HTTP {item.get('code')}")
+
+
+def execute_batch_writes(writes, before_write=None):
+    """Coalesce field updates into Graph batch requests, grouped per access token.
+
+    `writes` is a list of dicts with `access_token`, `entity_id` and `fields`
+    (e.g. {"status": "PAUSED"} or {"daily_budget": 50000}). `before_write()`,
+    if given, runs before every batch request and may raise to stop the rest.
+    Returns a list of {"entity_id", "success", "error"} in the same order as `writes`.
+    """
+    results = [None] * len(writes)
+
+    indexes_by_token = defaultdict(list)
+    for index, write in enumerate(writes):
+        indexes_by_token[write["access_token"]].append(index)
+
+    for access_token, indexes in indexes_by_token.items():
+        for chunk in chunked(indexes, GRAPH_BATCH_LIMIT):
+            batch = [
+                {
+                    "method": "POST",
+                    "relative_url": str(writes[i]["entity_id"]),
+                    "body": urlencode(writes[i]["fields"]),
+                }
+                for i in chunk
+            ]
+
+            if before_write:
+                before_write()
+            try:
+                response = graph_request(
+                    "POST",
+                    FACEBOOK_GRAPH_URL,
+                    data={"access_token": access_token, "batch": json.dumps(batch), "include_headers": "false"},
+                    invalidates_reads=True,
+                )
+                items = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                logging.error(f"Batch write request failed: {e}")
+                items = {"error": {"message": str(e)}}
+
+            if not isinstance(items, list):
+                error_msg = items.get("error", {}).get("message", "Unknown batch error") if isinstance(items, dict) else "Unknown batch error"
+                logging.error(f"Batch write rejected: {error_msg}")
+                items = []
+            else:
+                error_msg = "Missing batch response entry"
+
+            for position, i in enumerate(chunk):
+                if position < len(items):
+                    success, item_error = parse_batch_item(items[position])
+                else:
+                    success, item_error = False, error_msg
+
+                results[i] = {"entity_id": writes[i]["entity_id"], "success": success, "error": item_error}
+
+    return results
+
+
+def batch_update_status(access_token, updates, before_write=None):
+    """Update many campaign/adset statuses with as few round-trips as possible.
+
+    `updates` is a list of (entity_id, new_status). Returns {entity_id: {"success", "error"}}.
+    """
+    writes = [
+        {"access_token": access_token, "entity_id": entity_id, "fields": {"status": new_status}}
+        for entity_id, new_status in updates
+    ]
+    return {result["entity_id"]: result for result in execute_batch_writes(writes, before_write)}
+
+
+def write_statuses(access_token, updates, report, before_write=None):
+    """Batch-write statuses and report each outcome to the caller's progress log.
+
+    `updates` is a list of (entity_id, new_status); `report(message)` gets one
+    timestamped line per write. `before_write` is passed to execute_batch_writes
+    (e.g. AccountLock.ensure_held). Returns {entity_id: success}.
+    """
+    if not updates:
+        return {}
+
+    results = batch_update_status(access_token, updates, before_write)
+    outcome = {}
+
+    for entity_id, new_status in updates:
+        result = results[entity_id]
+        if result["success"]:
+            logging.info(f"Successfully updated {entity_id} to {new_status}")
+            report(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Successfully updated {entity_id} to {new_status}")
+        else:
+            logging.error(f"Error updating {entity_id} to {new_status}: {result['error']}")
+            report(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error updating {entity_id} to {new_status}: {result['error']}")
+        outcome[entity_id] = result["success"]
+
+    return outcome
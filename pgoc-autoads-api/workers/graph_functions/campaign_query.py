@@ -0,0 +1,75 @@
+import json
+from workers.graph_functions.graph_client import FACEBOOK_GRAPH_URL
+from workers.graph_functions.singleflight import shared_fetch_facebook_data
+
+CAMPAIGN_PAGE_LIMIT = 500
+
+# Push a name filter down only when the word is long enough to actually narrow the list
+MIN_PUSHDOWN_LENGTH = 3
+# Graph ANDs filtering rules, so each pattern costs one query; past this, one full listing is cheaper
+MAX_PUSHDOWN_PATTERNS = 5
+
+
+def contain_rule(value, field="name"):
+    return {"field": field, "operator": "CONTAIN", "value": value}
+
+
+def name_filter_rules(pattern, normalized=True):
+    """Translate a local name match into Graph `filtering` rules, or [] when it cannot be pushed down.
+
+    Graph's CONTAIN is a case-insensitive substring match, so a plain substring
+    rule maps onto it directly: every true match also contains the pattern.
+    Normalized matchers ignore punctuation and spaces, which can split any
+    word of the pattern in a matching name ("AB-C123" matches "ABC-123"), so
+    no CONTAIN rule is safe for them.
+    """
+    pattern = (pattern or "").strip()
+    if normalized or len(pattern) < MIN_PUSHDOWN_LENGTH:
+        return []
+    return [contain_rule(pattern)]
+
+
+def filtering_params(rules):
+    return {"filtering": json.dumps(rules)} if rules else {}
+
+
+def fetch_campaign_list(ad_account_id, access_token, fields="id,name,status", params=None):
+    """Read every page of an account's campaigns. Returns (campaigns, error)."""
+    url = f"{FACEBOOK_GRAPH_URL}/act_{ad_account_id}/campaigns"
+    query = {"fields": fields, "limit": CAMPAIGN_PAGE_LIMIT, **(params or {})}
+
+    campaigns = []
+    while url:
+        page = shared_fetch_facebook_data(url, access_token, params=query)
+        if "error" in page:
+            return campaigns, page["error"]
+        campaigns.extend(page.get("data", []))
+        url = page.get("paging", {}).get("next")
+        query = None  # paging.next already carries the query string
+    return campaigns, None
+
+
+def fetch_matching_campaigns(fetch, patterns, matcher, normalized=True):
+    """Return (campaigns, error) for campaigns whose name matches any pattern, filtering server-side where safe.
+
+    `fetch(params)` returns (campaigns, error) for extra query params (e.g.
+    fetch_campaign_list or fetch_campaign_tree); `matcher(campaign_name, pattern)`
+    is the exact local rule and always has the final say. Patterns are pushed
+    down only when the filter cannot drop a true match (see name_filter_rules);
+    otherwise the account is listed once and matched locally.
+    """
+    patterns = [p for p in patterns if p]
+    rule_sets = [name_filter_rules(p, normalized) for p in patterns]
+
+    if not patterns or len(patterns) > MAX_PUSHDOWN_PATTERNS or not all(rule_sets):
+        campaigns, error = fetch({})
+        return [c for c in campaigns if any(matcher(c["name"], p) for p in patterns)], error
+
+    matched = {}
+    for pattern, rules in zip(patterns, rule_sets):
+        campaigns, error = fetch(filtering_params(rules))
+        if error:
+            return list(matched.values()), error
+        matched.update((c["id"], c) for c in campaigns if matcher(c["name"], pattern))
+
+    return list(matched.values()), None
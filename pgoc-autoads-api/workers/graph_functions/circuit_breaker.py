@@ -0,0 +1,168 @@
+import time
+import hashlib
+import logging
+import httpx
+import redis
+from workers.graph_functions.rate_limiter import extract_ad_account_scope
+# Graph state database (db 4), shared with the rate limiter
+from workers.graph_functions.rate_limiter import redis_throttle as redis_circuit
+
+CIRCUIT_KEY_PREFIX = "graph_circuit"
+
+# Open after this many auth/permission errors inside the failure window
+FAILURE_THRESHOLD = 3
+FAILURE_WINDOW_SECONDS = 600
+# How long an open circuit rejects calls before letting a single probe through (half-open)
+OPEN_SECONDS = 900
+# A probe that never reports back frees the half-open slot after this
+PROBE_SECONDS = 60
+
+# Expired/invalid token or session: the token itself is dead
+TOKEN_ERROR_CODES = {102, 190, 463, 467}
+# Permission errors (10, 200-299) and inaccessible objects: this token cannot use this account
+PERMISSION_ERROR_CODES = {10} | set(range(200, 300))
+INACCESSIBLE_OBJECT = (100, 33)
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """Raised instead of calling Graph while a token/account circuit is open."""
+
+
+def token_fingerprint(access_token):
+    """Never put raw access tokens into Redis keys."""
+    return hashlib.sha256((access_token or "").encode()).hexdigest()[:16]
+
+
+def circuit_scopes(access_token, url=None, ad_account_id=None):
+    """Return the breaker keys that guard a call: the token, plus token+account when known."""
+    fingerprint = token_fingerprint(access_token)
+    scopes = [f"{CIRCUIT_KEY_PREFIX}:token:{fingerprint}"]
+
+    account_scope = f"act_{str(ad_account_id).replace('act_', '')}" if ad_account_id else extract_ad_account_scope(url or "")
+    if account_scope:
+        scopes.append(f"{CIRCUIT_KEY_PREFIX}:{account_scope}:{fingerprint}")
+    return scopes
+
+
+def is_circuit_open(access_token, ad_account_id=None):
+    """Cheap check for dispatchers: True while any matching circuit is open (not yet half-open)."""
+    if not access_token:
+        return False
+    try:
+        opened = redis_circuit.mget([f"{scope}:open_until" for scope in circuit_scopes(access_token, ad_account_id=ad_account_id)])
+    except redis.RedisError as e:
+        logging.warning(f"Circuit state unavailable: {e}")
+        return False
+
+    now = time.time()
+    return any(value and float(value) > now for value in opened)
+
+
+def check_circuit(access_token, url):
+    """Raise CircuitOpenError if the call must be short-circuited.
+
+    Returns the scopes that are tripped but half-open, where this call is the
+    probe. The caller must hand them to record_circuit_result() or
+    release_probes() on every exit path.
+    """
+    if not access_token:
+        return []
+
+    scopes = circuit_scopes(access_token, url)
+    probing = []
+    try:
+        opened = redis_circuit.mget([f"{scope}:open_until" for scope in scopes])
+        now = time.time()
+
+        for scope, value in zip(scopes, opened):
+            if not value:
+                continue
+            if float(value) > now:
+                raise CircuitOpenError(f"Circuit open for {scope.split(':')[1]} until {time.strftime('%H:%M:%S', time.localtime(float(value)))}")
+            # Half-open: exactly one caller gets to probe
+            if not redis_circuit.set(f"{scope}:probe", "1", nx=True, ex=PROBE_SECONDS):
+                raise CircuitOpenError(f"Circuit half-open for {scope.split(':')[1]}, probe in progress")
+            probing.append(scope)
+
+        return probing
+
+    except CircuitOpenError:
+        # The token scope may already hold a probe slot when the account scope refuses the call
+        release_probes(probing)
+        raise
+
+    except redis.RedisError as e:
+        logging.warning(f"Circuit state unavailable, calling without breaker: {e}")
+        release_probes(probing)
+        return []
+
+
+def release_probes(probing):
+    """Free half-open probe slots without a verdict, so the next caller can test the circuit."""
+    if not probing:
+        return
+    try:
+        redis_circuit.delete(*(f"{scope}:probe" for scope in probing))
+    except redis.RedisError as e:
+        logging.warning(f"Could not release circuit probes: {e}")
+
+
+def trip(scope, reason):
+    redis_circuit.set(f"{scope}:open_until", time.time() + OPEN_SECONDS, ex=OPEN_SECONDS * 4)
+    redis_circuit.delete(f"{scope}:failures", f"{scope}:probe")
+    logging.error(f"Opened Graph circuit {scope.split(':')[1]} for {OPEN_SECONDS}s: {reason}")
+
+
+def close(scope):
+    redis_circuit.delete(f"{scope}:open_until", f"{scope}:failures", f"{scope}:probe")
+    logging.info(f"Closed Graph circuit {scope.split(':')[1]}")
+
+
+def failing_scope(access_token, url, error):
+    """Pick the breaker an error counts against, or None if it is not an auth/permission error."""
+    code = error.get("code")
+    scopes = circuit_scopes(access_token, url)
+
+    if code in TOKEN_ERROR_CODES:
+        return scopes[0]
+    if code in PERMISSION_ERROR_CODES or (code, error.get("error_subcode")) == INACCESSIBLE_OBJECT:
+        # Only meaningful when we know which account the token was refused for
+        return scopes[1] if len(scopes) > 1 else None
+    return None
+
+
+def record_circuit_result(access_token, url, response, probing):
+    """Count auth/permission failures and open, re-open or close circuits accordingly."""
+    if not access_token:
+        return
+
+    try:
+        if response.status_code < 400:
+            for scope in probing:
+                close(scope)
+            return
+
+        try:
+            error = response.json().get("error", {})
+        except (ValueError, AttributeError):
+            error = {}
+
+        scope = failing_scope(access_token, url, error)
+        if not scope:
+            # Unrelated failure: let the probe slot go so another caller can test the circuit
+            release_probes(probing)
+            return
+
+        reason = f"code {error.get('code')}: {error.get('message', 'Unknown error')}"
+        if scope in probing:
+            trip(scope, f"probe failed ({reason})")
+            return
+
+        failures = redis_circuit.incr(f"{scope}:failures")
+        if failures == 1:
+            redis_circuit.expire(f"{scope}:failures", FAILURE_WINDOW_SECONDS)
+        if failures >= FAILURE_THRESHOLD:
+            trip(scope, reason)
+
+    except redis.RedisError as e:
+        logging.warning(f"Could not record circuit result: {e}")
@@ -0,0 +1,222 @@
+import os
+import logging
+import threading
+import httpx
+import redis
+from flask import has_request_context
+from urllib.parse import urlparse, parse_qs
+from workers.graph_functions.rate_limiter import API_MAX_WAIT, wait_for_capacity, record_usage, redis_throttle
+from workers.graph_functions.circuit_breaker import (
+    CircuitOpenError,
+    check_circuit,
+    record_circuit_result,
+    release_probes,
+    token_fingerprint,
+)
+
+# Facebook API
+FACEBOOK_API_VERSION = "v22.0"
+FACEBOOK_GRAPH_HOST = "https://graph.facebook.com"
+
+# Point every Graph call at another host (e.g. the local simulator in benchmarks/)
+GRAPH_API_HOST = os.getenv("GRAPH_API_HOST", FACEBOOK_GRAPH_HOST).rstrip("/")
+FACEBOOK_GRAPH_URL = f"{GRAPH_API_HOST}/{FACEBOOK_API_VERSION}"
+
+# Uniform timeouts for every Graph call (connect fast, allow slow insights reads)
+GRAPH_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+
+# Keep-alive pool shared by all threads of a worker process
+GRAPH_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60.0)
+
+# Per-token counter mixed into singleflight keys; every write bumps it (see singleflight.py)
+READ_GENERATION_PREFIX = "graph_flight:gen"
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_graph_client():
+    """Return the process-wide HTTP/2 client, creating it after a fork if needed."""
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            # Celery prefork children must not reuse sockets opened by the parent
+            _client = httpx.Client(
+                transport=httpx.HTTPTransport(http2=True, retries=3, limits=GRAPH_LIMITS),
+                timeout=GRAPH_TIMEOUT,
+            )
+            _client_pid = pid
+    return _client
+
+
+def build_graph_url(path):
+    """Accept absolute URLs (e.g. paging.next) or paths relative to the Graph root."""
+    if path.startswith("http://") or path.startswith("https://"):
+        if GRAPH_API_HOST != FACEBOOK_GRAPH_HOST and path.startswith(FACEBOOK_GRAPH_HOST):
+            return GRAPH_API_HOST + path[len(FACEBOOK_GRAPH_HOST):]
+        return path
+    return f"{FACEBOOK_GRAPH_URL}/{path.lstrip('/')}"
+
+
+def generation_key(access_token):
+    return f"{READ_GENERATION_PREFIX}:{token_fingerprint(access_token)}"
+
+
+def invalidate_shared_reads(access_token):
+    """Make later reads for this token skip results shared before a write."""
+    try:
+        pipe = redis_throttle.pipeline()
+        pipe.incr(generation_key(access_token))
+        pipe.expire(generation_key(access_token), 86400)
+        pipe.execute()
+    except redis.RedisError as e:
+        logging.warning(f"Could not invalidate shared Graph reads: {e}")
+
+
+def request_access_token(url, headers, kwargs):
+    """Find the token a request authenticates with (header, params, form data or query string)."""
+    authorization = headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):]
+
+    for source in ("params", "data"):
+        values = kwargs.get(source)
+        if isinstance(values, dict) and values.get("access_token"):
+            return values["access_token"]
+
+    return parse_qs(urlparse(url).query).get("access_token", [None])[0]
+
+
+def graph_request(method, path, access_token=None, max_wait=None, invalidates_reads=False, **kwargs):
+    """Send a raw request through the pooled client and return the httpx.Response.
+
+    Raises httpx.HTTPError on transport failures, like requests did before,
+    CircuitOpenError (an httpx.HTTPError) while the token/account circuit is open,
+    and GraphThrottledError (an httpx.HTTPError) when pacing would take longer
+    than `max_wait`. Inside a Flask request `max_wait` defaults to API_MAX_WAIT.
+    Pass `invalidates_reads=True` for calls that change Graph objects, so
+    singleflight stops sharing reads taken before them.
+    """
+    if max_wait is None and has_request_context():
+        max_wait = API_MAX_WAIT
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if access_token and "Authorization" not in headers:
+        headers["Authorization"] = f"Bearer {access_token}"
+
+    url = build_graph_url(path)
+    token = request_access_token(url, headers, kwargs)
+
+    # Skip calls for tokens/accounts that keep failing auth, then pace against reported usage
+    probing = check_circuit(token, url)
+    response = None
+    try:
+        wait_for_capacity(url, max_wait)
+        response = get_graph_client().request(method, url, headers=headers, **kwargs)
+        record_usage(url, response, token_fingerprint(token) if token else None)
+    finally:
+        # A probe that never got an answer (throttled, transport error) must not hold the slot
+        if response is None:
+            release_probes(probing)
+        else:
+            record_circuit_result(token, url, response, probing)
+
+    if invalidates_reads:
+        # Listings shared before this write no longer reflect the new state
+        invalidate_shared_reads(token)
+
+    return response
+
+
+def parse_graph_response(response):
+    """Convert a Graph response into data or the {"error": {...}} shape used by the workers."""
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+
+    if isinstance(data, dict) and "error" in data:
+        return {"error": data["error"]}
+
+    if response.status_code >= 400:
+        return {"error": {"message": f"HTTP {response.status_code}: {response.text[:200]}", "type": "HTTPError"}}
+
+    if data is None:
+        return {"error": {"message": "Invalid JSON in Graph response", "type": "HTTPError"}}
+
+    return data
+
+
+def fetch_facebook_data(url, access_token, params=None):
+    """Fetch data from Facebook API and handle errors."""
+    try:
+        response = graph_request("GET", url, access_token, params=params)
+        data = parse_graph_response(response)
+
+        if "error" in data:
+            logging.error(f"Facebook API Error: {data['error']}")
+
+        return data
+
+    except CircuitOpenError as e:
+        logging.warning(f"Skipped Facebook API call: {e}")
+        return {"error": {"message": str(e), "type": "CircuitOpen"}}
+
+    except httpx.HTTPError as e:
+        logging.error(f"Error fetching data from Facebook API: {e}")
+        return {"error": {"message": str(e), "type": "RequestException"}}
+
+
+def post_facebook_data(url, access_token, data=None, json=None, invalidates_reads=True):
+    """POST to Facebook API and return the parsed body or an error dict.
+
+    Pass `invalidates_reads=False` for POSTs that only read (e.g. starting an insights report run).
+    """
+    try:
+        response = graph_request("POST", url, access_token, data=data, json=json, invalidates_reads=invalidates_reads)
+        result = parse_graph_response(response)
+
+        if "error" in result:
+            logging.error(f"Facebook API Error: {result['error']}")
+
+        return result
+
+    except CircuitOpenError as e:
+        logging.warning(f"Skipped Facebook API call: {e}")
+        return {"error": {"message": str(e), "type": "CircuitOpen"}}
+
+    except httpx.HTTPError as e:
+        logging.error(f"Error posting data to Facebook API: {e}")
+        return {"error": {"message": str(e), "type": "RequestException"}}
+
+
+def iter_facebook_pages(url, access_token, params=None):
+    """Yield every page of a paginated Graph edge, following paging.next.
+
+    Stops after yielding the first error page so callers can report it.
+    """
+    while url:
+        page = fetch_facebook_data(url, access_token, params=params)
+        yield page
+
+        if "error" in page:
+            return
+
+        url = page.get("paging", {}).get("next")
+        params = None  # paging.next already carries the query string
+
+
+def fetch_all_pages(url, access_token, params=None):
+    """Collect the data of every page. Returns (items, error) where error is None on success."""
+    items = []
+    for page in iter_facebook_pages(url, access_token, params=params):
+        if "error" in page:
+            return items, page["error"]
+        items.extend(page.get("data", []))
+    return items, None
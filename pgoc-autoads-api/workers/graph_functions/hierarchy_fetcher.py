@@ -0,0 +1,90 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from workers.graph_functions.graph_client import FACEBOOK_GRAPH_URL
+from workers.graph_functions.singleflight import shared_fetch_facebook_data
+
+# Page sizes requested for the campaign list and for nested edges (.limit() expansion)
+TOP_LEVEL_PAGE_LIMIT = 500
+NESTED_PAGE_LIMIT = 500
+
+# Parallel requests used to follow truncated nested cursors
+NESTED_FETCH_WORKERS = 8
+
+
+def build_tree_fields(campaign_fields, adset_fields, ad_fields=None):
+    """Build 'id,name,adsets.limit(N){id,name,ads.limit(N){...}}' for one-pass hierarchy reads."""
+    adset_spec = adset_fields
+    if ad_fields:
+        adset_spec = f"{adset_fields},ads.limit({NESTED_PAGE_LIMIT}){{{ad_fields}}}"
+    return f"{campaign_fields},adsets.limit({NESTED_PAGE_LIMIT}){{{adset_spec}}}"
+
+
+def follow_cursor(next_url, access_token):
+    """Read every remaining page of one nested edge. Returns (items, error)."""
+    items = []
+    while next_url:
+        page = shared_fetch_facebook_data(next_url, access_token)
+        if "error" in page:
+            return items, page["error"]
+        items.extend(page.get("data", []))
+        next_url = page.get("paging", {}).get("next")
+    return items, None
+
+
+def complete_nested_edge(nodes, edge, access_token):
+    """Fill in every truncated `edge` of `nodes` in place, fetching the remainders concurrently.
+
+    Afterwards each node has node[edge] == {"data": [...all items...]}. Returns the first error, if any.
+    """
+    truncated = []
+    for node in nodes:
+        nested = node.get(edge) or {}
+        next_url = nested.get("paging", {}).get("next")
+        node[edge] = {"data": nested.get("data", [])}
+        if next_url:
+            truncated.append((node, next_url))
+
+    if not truncated:
+        return None
+
+    logging.info(f"Following {len(truncated)} truncated '{edge}' edges")
+    with ThreadPoolExecutor(max_workers=min(NESTED_FETCH_WORKERS, len(truncated))) as executor:
+        results = list(executor.map(lambda item: follow_cursor(item[1], access_token), truncated))
+
+    for (node, _), (items, error) in zip(truncated, results):
+        if error:
+            return error
+        node[edge]["data"].extend(items)
+    return None
+
+
+def fetch_campaign_tree(ad_account_id, access_token, campaign_fields="id,name,status",
+                        adset_fields="id,name,status", ad_fields=None, params=None):
+    """Fetch the complete campaign -> adset (-> ad) tree of an ad account.
+
+    Pages through the campaign list, then follows any truncated nested adsets/ads
+    cursors in parallel so large campaigns never lose children.
+    Returns (campaigns, error) where error is None on success.
+    """
+    url = f"{FACEBOOK_GRAPH_URL}/act_{ad_account_id}/campaigns"
+    query = {
+        "fields": build_tree_fields(campaign_fields, adset_fields, ad_fields),
+        "limit": TOP_LEVEL_PAGE_LIMIT,
+        **(params or {}),
+    }
+
+    campaigns = []
+    while url:
+        page = shared_fetch_facebook_data(url, access_token, params=query)
+        if "error" in page:
+            return campaigns, page["error"]
+        campaigns.extend(page.get("data", []))
+        url = page.get("paging", {}).get("next")
+        query = None  # paging.next already carries the query string
+
+    error = complete_nested_edge(campaigns, "adsets", access_token)
+    if error or not ad_fields:
+        return campaigns, error
+
+    adsets = [adset for campaign in campaigns for adset in campaign["adsets"]["data"]]
+    return campaigns, complete_nested_edge(adsets, "ads", access_token)
@@ -0,0 +1,237 @@
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+import pytz
+import redis
+from workers.graph_functions.graph_client import FACEBOOK_GRAPH_URL, fetch_facebook_data
+from workers.graph_functions.insights_reports import iter_insights_pages
+# Graph state database (db 4), shared with the rate limiter and insights profiles
+from workers.graph_functions.rate_limiter import redis_throttle as redis_insights
+
+INSIGHTS_DAY_PREFIX = "insights_day"
+# Marks a cached day as complete, so days without any delivery are not fetched again
+FETCHED_FIELD = "_fetched"
+DATE_FORMAT = "%Y-%m-%d"
+
+# Today and this many days before it can still change (late attribution) and are always re-fetched
+INSIGHTS_SETTLE_DAYS = int(os.getenv("INSIGHTS_SETTLE_DAYS", 1))
+# Settled days never change; keep them long enough to cover the widest CPP window in use
+INSIGHTS_DAY_TTL = 45 * 86400
+
+# Graph reports days in the ad account's timezone; remembered per account, Manila when unknown
+ACCOUNT_TIMEZONE_PREFIX = "insights_tz"
+ACCOUNT_TIMEZONE_TTL = 7 * 86400
+DEFAULT_TIMEZONE = "Asia/Manila"
+
+
+def insights_day_key(ad_account_id, level, day):
+    return f"{INSIGHTS_DAY_PREFIX}:act_{str(ad_account_id).replace('act_', '')}:{level}:{day}"
+
+
+def insights_fields(level):
+    """Every field any CPP reader needs, so one cached row serves all of them."""
+    fields = ["campaign_id", "campaign_name", f"{level}_id", f"{level}_name", "spend", "actions", "impressions"]
+    return ",".join(dict.fromkeys(fields))
+
+
+def account_timezone(ad_account_id, access_token):
+    """The ad account's timezone, which Graph uses for `date_start` days."""
+    account_id = str(ad_account_id).replace("act_", "")
+    key = f"{ACCOUNT_TIMEZONE_PREFIX}:act_{account_id}"
+    try:
+        name = redis_insights.get(key)
+    except redis.RedisError as e:
+        logging.warning(f"Could not read the timezone of act_{account_id}: {e}")
+        name = None
+
+    if not name:
+        data = fetch_facebook_data(f"{FACEBOOK_GRAPH_URL}/act_{account_id}", access_token, params={"fields": "timezone_name"})
+        name = data.get("timezone_name")
+        if name:
+            try:
+                redis_insights.set(key, name, ex=ACCOUNT_TIMEZONE_TTL)
+            except redis.RedisError as e:
+                logging.warning(f"Could not cache the timezone of act_{account_id}: {e}")
+
+    try:
+        return pytz.timezone(name or DEFAULT_TIMEZONE)
+    except pytz.UnknownTimeZoneError:
+        logging.warning(f"Unknown timezone {name!r} for act_{account_id}; using {DEFAULT_TIMEZONE}")
+        return pytz.timezone(DEFAULT_TIMEZONE)
+
+
+def days_between(since, until):
+    first = datetime.strptime(since, DATE_FORMAT).date()
+    last = datetime.strptime(until, DATE_FORMAT).date()
+    return [(first + timedelta(days=offset)).strftime(DATE_FORMAT) for offset in range((last - first).days + 1)]
+
+
+def contiguous_runs(days):
+    """Group sorted day strings into (since, until) runs of consecutive days."""
+    runs = []
+    for day in days:
+        date = datetime.strptime(day, DATE_FORMAT).date()
+        if runs and datetime.strptime(runs[-1][1], DATE_FORMAT).date() + timedelta(days=1) == date:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def load_cached_days(ad_account_id, level, days):
+    """Return {day: {entity_id: row}} for the settled days already in the cache."""
+    try:
+        pipe = redis_insights.pipeline(transaction=False)
+        for day in days:
+            pipe.hgetall(insights_day_key(ad_account_id, level, day))
+        cached = pipe.execute()
+    except redis.RedisError as e:
+        logging.warning(f"Could not read cached {level} insights for act_{ad_account_id}: {e}")
+        return {}
+
+    rows_by_day = {}
+    for day, entries in zip(days, cached):
+        if FETCHED_FIELD not in entries:
+            continue
+        rows_by_day[day] = {
+            entity_id: json.loads(raw) for entity_id, raw in entries.items() if entity_id != FETCHED_FIELD
+        }
+    return rows_by_day
+
+
+def store_days(ad_account_id, level, rows_by_day):
+    try:
+        pipe = redis_insights.pipeline(transaction=False)
+        for day, rows in rows_by_day.items():
+            key = insights_day_key(ad_account_id, level, day)
+            pipe.delete(key)
+            pipe.hset(key, mapping={
+                FETCHED_FIELD: datetime.now().isoformat(),
+                **{entity_id: json.dumps(row) for entity_id, row in rows.items()},
+            })
+            pipe.expire(key, INSIGHTS_DAY_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        logging.warning(f"Could not cache {level} insights for act_{ad_account_id}: {e}")
+
+
+def fetch_days(ad_account_id, access_token, level, since, until):
+    """Fetch per-day rows for one run of days. Returns ({day: {entity_id: row}}, error)."""
+    params = {
+        "level": level,
+        "fields": insights_fields(level),
+        "time_range": json.dumps({"since": since, "until": until}),
+        "time_increment": 1,
+        "limit": 1000,
+    }
+    rows_by_day = {day: {} for day in days_between(since, until)}
+
+    # Large or slow accounts are read through an async report run
+    for page in iter_insights_pages(ad_account_id, access_token, params):
+        if "error" in page:
+            return None, page["error"]
+        for item in page.get("data", []):
+            entity_id = item.get(f"{level}_id")
+            day = item.get("date_start")
+            if entity_id and day in rows_by_day:
+                rows_by_day[day][entity_id] = {
+                    "campaign_id": item.get("campaign_id"),
+                    "campaign_name": item.get("campaign_name"),
+                    "name": item.get(f"{level}_name"),
+                    "spend": float(item.get("spend", 0)),
+                    "impressions": float(item.get("impressions", 0)),
+                    "actions": {action["action_type"]: float(action.get("value", 0)) for action in item.get("actions", [])},
+                }
+
+    return rows_by_day, None
+
+
+def combine_days(level, rows_by_day):
+    """Sum spend, impressions and each action type per entity, in the shape of a Graph insights row."""
+    totals = {}
+    for rows in rows_by_day.values():
+        for entity_id, row in rows.items():
+            total = totals.setdefault(entity_id, {
+                f"{level}_id": entity_id,
+                f"{level}_name": row.get("name"),
+                "campaign_id": row.get("campaign_id"),
+                "campaign_name": row.get("campaign_name"),
+                "spend": 0.0,
+                "impressions": 0.0,
+                "actions": {},
+            })
+            total["spend"] += row.get("spend", 0)
+            total["impressions"] += row.get("impressions", 0)
+            for action_type, value in row.get("actions", {}).items():
+                total["actions"][action_type] = total["actions"].get(action_type, 0) + value
+
+    for total in totals.values():
+        total["actions"] = [{"action_type": action_type, "value": value} for action_type, value in total["actions"].items()]
+    return list(totals.values())
+
+
+def get_range_insights(ad_account_id, access_token, level, since, until):
+    """Insights rows for `level` over since..until, summed per entity like a single Graph read.
+
+    Settled days come from the per-day cache; only today, the settle window
+    and settled days not cached yet are fetched (per day, in one call per run
+    of consecutive days). Returns (rows, error).
+    """
+    days = days_between(since, until)
+    if not days:
+        return [], None
+
+    # "Today" is the account's today; a server clock ahead of it would cache a live day as settled
+    account_now = datetime.now(account_timezone(ad_account_id, access_token))
+    settled_before = (account_now - timedelta(days=INSIGHTS_SETTLE_DAYS)).strftime(DATE_FORMAT)
+    settled_days = [day for day in days if day < settled_before]
+    rows_by_day = load_cached_days(ad_account_id, level, settled_days) if settled_days else {}
+
+    missing = [day for day in days if day not in rows_by_day]
+    if missing:
+        logging.info(
+            f"{level} insights for act_{ad_account_id} {since}..{until}: "
+            f"{len(days) - len(missing)} days cached, fetching {len(missing)}"
+        )
+
+    for run_since, run_until in contiguous_runs(missing):
+        fetched, error = fetch_days(ad_account_id, access_token, level, run_since, run_until)
+        if error:
+            return None, error
+        store_days(ad_account_id, level, {day: rows for day, rows in fetched.items() if day < settled_before})
+        rows_by_day.update(fetched)
+
+    return combine_days(level, rows_by_day), None
+
+
+def roll_up_campaigns(adset_rows):
+    """Campaign-level rows summed from adset-level rows, as if read with level=campaign."""
+    totals = {}
+    for row in adset_rows:
+        campaign_id = row.get("campaign_id")
+        if not campaign_id:
+            continue
+        total = totals.setdefault(campaign_id, {
+            "campaign_id": campaign_id,
+            "campaign_name": row.get("campaign_name"),
+            "spend": 0.0,
+            "impressions": 0.0,
+            "actions": {},
+        })
+        total["spend"] += float(row.get("spend", 0))
+        total["impressions"] += float(row.get("impressions", 0))
+        for action in row.get("actions", []):
+            total["actions"][action["action_type"]] = total["actions"].get(action["action_type"], 0) + float(action.get("value", 0))
+
+    for total in totals.values():
+        total["actions"] = [{"action_type": action_type, "value": value} for action_type, value in total["actions"].items()]
+    return list(totals.values())
+
+
+def get_campaign_and_adset_insights(ad_account_id, access_token, since, until):
+    """One adset-level read for both levels. Returns (campaign_rows, adset_rows, error)."""
+    adset_rows, error = get_range_insights(ad_account_id, access_token, "adset", since, until)
+    if error:
+        return None, None, error
+    return roll_up_campaigns(adset_rows), adset_rows, None
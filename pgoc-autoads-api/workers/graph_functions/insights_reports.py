@@ -0,0 +1,163 @@
+import json
+import time
+import logging
+import redis
+from workers.graph_functions.graph_client import FACEBOOK_GRAPH_URL, fetch_facebook_data, post_facebook_data, iter_facebook_pages
+from workers.graph_functions.singleflight import shared_fetch_facebook_data
+# Graph state database (db 4), shared with the rate limiter
+from workers.graph_functions.rate_limiter import redis_throttle as redis_insights
+
+INSIGHTS_PROFILE_PREFIX = "insights_profile"
+INSIGHTS_PROFILE_TTL = 7 * 86400
+
+# Switch to an async report run when the previous read returned this many rows...
+ASYNC_ROW_THRESHOLD = 2000
+# ...or when a synchronous read took this long (seconds)
+ASYNC_LATENCY_THRESHOLD = 10.0
+
+# Report run polling: exponential backoff between these bounds, give up after REPORT_TIMEOUT
+REPORT_POLL_INITIAL = 1.0
+REPORT_POLL_MAX = 15.0
+REPORT_TIMEOUT = 600
+REPORT_PAGE_LIMIT = 500
+
+# Graph errors that mean "this query is too heavy for the synchronous edge"
+HEAVY_QUERY_ERROR_CODES = {1, 2, 3}
+
+
+def profile_key(ad_account_id, level):
+    return f"{INSIGHTS_PROFILE_PREFIX}:act_{ad_account_id}:{level}"
+
+
+def load_profile(ad_account_id, level):
+    try:
+        raw = redis_insights.get(profile_key(ad_account_id, level))
+        return json.loads(raw) if raw else None
+    except (redis.RedisError, ValueError) as e:
+        logging.warning(f"Could not read insights profile for act_{ad_account_id}: {e}")
+        return None
+
+
+def save_profile(ad_account_id, level, mode, rows, seconds):
+    try:
+        redis_insights.set(
+            profile_key(ad_account_id, level),
+            json.dumps({"mode": mode, "rows": rows, "seconds": round(seconds, 2)}),
+            ex=INSIGHTS_PROFILE_TTL,
+        )
+    except redis.RedisError as e:
+        logging.warning(f"Could not save insights profile for act_{ad_account_id}: {e}")
+
+
+def should_use_async(profile):
+    """Decide the mode from what the previous read of this account/level looked like."""
+    if not profile:
+        return False
+    if profile.get("rows", 0) >= ASYNC_ROW_THRESHOLD:
+        return True
+    # Async runs include queueing time, so only synchronous latency is a signal
+    return profile.get("mode") == "sync" and profile.get("seconds", 0) >= ASYNC_LATENCY_THRESHOLD
+
+
+def is_heavy_query_error(error):
+    return error.get("code") in HEAVY_QUERY_ERROR_CODES or error.get("type") == "RequestException"
+
+
+def iter_sync_pages(ad_account_id, access_token, params):
+    url = f"{FACEBOOK_GRAPH_URL}/act_{ad_account_id}/insights"
+    while url:
+        page = shared_fetch_facebook_data(url, access_token, params=params)
+        yield page
+        if "error" in page:
+            return
+        url = page.get("paging", {}).get("next")
+        params = None  # paging.next already carries the query string
+
+
+def start_report_run(ad_account_id, access_token, params):
+    """POST an async insights job. Returns (report_run_id, error)."""
+    result = post_facebook_data(
+        f"{FACEBOOK_GRAPH_URL}/act_{ad_account_id}/insights", access_token, data=params, invalidates_reads=False
+    )
+    if "error" in result:
+        return None, result["error"]
+    return result.get("report_run_id"), None
+
+
+def wait_for_report(report_run_id, access_token):
+    """Poll a report run with exponential backoff. Returns None when completed, else an error dict."""
+    delay = REPORT_POLL_INITIAL
+    deadline = time.time() + REPORT_TIMEOUT
+
+    while time.time() < deadline:
+        status = fetch_facebook_data(
+            f"{FACEBOOK_GRAPH_URL}/{report_run_id}", access_token,
+            params={"fields": "async_status,async_percent_completion"},
+        )
+        if "error" in status:
+            return status["error"]
+
+        async_status = status.get("async_status")
+        if async_status == "Job Completed":
+            return None
+        if async_status in ("Job Failed", "Job Skipped"):
+            return {"message": f"Insights report {report_run_id} ended with status '{async_status}'", "type": "AsyncReportError"}
+
+        logging.info(f"Insights report {report_run_id}: {async_status} ({status.get('async_percent_completion', 0)}%)")
+        time.sleep(delay)
+        delay = min(delay * 2, REPORT_POLL_MAX)
+
+    return {"message": f"Insights report {report_run_id} did not finish within {REPORT_TIMEOUT}s", "type": "AsyncReportError"}
+
+
+def iter_async_pages(ad_account_id, access_token, params):
+    report_run_id, error = start_report_run(ad_account_id, access_token, params)
+    if error is None and not report_run_id:
+        error = {"message": "Graph did not return a report_run_id", "type": "AsyncReportError"}
+    if error is None:
+        error = wait_for_report(report_run_id, access_token)
+    if error:
+        yield {"error": error}
+        return
+
+    yield from iter_facebook_pages(
+        f"{FACEBOOK_GRAPH_URL}/{report_run_id}/insights", access_token, params={"limit": REPORT_PAGE_LIMIT}
+    )
+
+
+def iter_insights_pages(ad_account_id, access_token, params):
+    """Yield insights pages for an ad account, choosing the synchronous edge or an async report run.
+
+    Accounts whose last read was large or slow go straight to a report run; a
+    synchronous read that fails as too heavy is retried as a report run. Like
+    iter_facebook_pages, stops after yielding the first error page.
+    """
+    level = params.get("level", "account")
+    mode = "async" if should_use_async(load_profile(ad_account_id, level)) else "sync"
+    started = time.time()
+    rows = 0
+    fell_back = False
+
+    if mode == "sync":
+        for page in iter_sync_pages(ad_account_id, access_token, params):
+            if "error" in page and rows == 0 and is_heavy_query_error(page["error"]):
+                logging.warning(f"Synchronous {level} insights too heavy for act_{ad_account_id}, switching to async report")
+                mode = "async"
+                fell_back = True
+                break
+
+            rows += len(page.get("data", []))
+            yield page
+            if "error" in page:
+                return
+
+    if mode == "async":
+        started = time.time()
+        for page in iter_async_pages(ad_account_id, access_token, params):
+            rows += len(page.get("data", []))
+            yield page
+            if "error" in page:
+                return
+
+    # After a fallback, make the next run skip the failing synchronous attempt
+    save_profile(ad_account_id, level, mode, max(rows, ASYNC_ROW_THRESHOLD) if fell_back else rows, time.time() - started)
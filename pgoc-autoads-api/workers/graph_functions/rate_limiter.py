@@ -0,0 +1,225 @@
+import os
+import re
+import json
+import time
+import logging
+import httpx
+import redis
+
+# Shared across every Celery worker process
+redis_throttle = redis.StrictRedis(
+    host="redisAds",
+    port=6379,
+    db=4,
+    decode_responses=True
+)
+
+THROTTLE_KEY_PREFIX = "graph_throttle"
+APP_SCOPE = "app"
+
+# Below this usage (%) requests run at full speed
+PACE_START_PCT = 50
+# At or above this usage (%) we stop calling until access is regained
+BLOCK_PCT = 90
+# Longest per-request delay applied while pacing between PACE_START_PCT and BLOCK_PCT
+MAX_PACE_DELAY = 5.0
+# Fallback pause when Graph throttles us without telling us for how long
+DEFAULT_BLOCK_SECONDS = 60
+# Never hold a worker slot longer than this for a single request
+MAX_BLOCKING_WAIT = 120
+# Longest pause an API request thread may take; beyond it the call fails fast instead
+API_MAX_WAIT = float(os.getenv("GRAPH_API_MAX_WAIT", 2.0))
+
+# Graph error codes that mean "rate limited"
+THROTTLE_ERROR_CODES = {4, 17, 32, 613, 80000, 80003, 80004, 80014}
+
+AD_ACCOUNT_REGEX = re.compile(r"act_(\d+)")
+
+
+class GraphThrottledError(httpx.HTTPError):
+    """Raised instead of sleeping when the throttle wait is longer than the caller allows."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def extract_ad_account_scope(url):
+    """Return the 'act_<id>' scope of a Graph URL, or None for non-account edges."""
+    match = AD_ACCOUNT_REGEX.search(url)
+    return f"act_{match.group(1)}" if match else None
+
+
+def throttle_key(scope):
+    return f"{THROTTLE_KEY_PREFIX}:{scope}"
+
+
+def token_scope(fingerprint):
+    """Scope for one access token's usage (x-app-usage is per app and user for user tokens)."""
+    return f"token:{fingerprint}"
+
+
+def parse_json_header(value):
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+
+def usage_number(value):
+    """A usage header field as a float; 0.0 for anything missing or malformed."""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def usage_from_headers(headers):
+    """Read the usage headers and return (app_pct, account_pct, regain_seconds).
+
+    A percentage is None when Graph did not report it, so missing headers never
+    clear a pause recorded by another worker.
+    """
+    app_pct = None
+    account_pct = None
+    regain_seconds = 0.0
+
+    app_usage = parse_json_header(headers.get("x-app-usage"))
+    if isinstance(app_usage, dict):
+        app_pct = max(usage_number(app_usage.get(k)) for k in ("call_count", "total_cputime", "total_time"))
+
+    account_usage = parse_json_header(headers.get("x-ad-account-usage"))
+    if isinstance(account_usage, dict):
+        account_pct = max(account_pct or 0.0, usage_number(account_usage.get("acc_id_util_pct")))
+        regain_seconds = max(regain_seconds, usage_number(account_usage.get("reset_time_duration")))
+
+    business_usage = parse_json_header(headers.get("x-business-use-case-usage"))
+    if isinstance(business_usage, dict):
+        for entries in business_usage.values():
+            for entry in entries if isinstance(entries, list) else []:
+                if not isinstance(entry, dict):
+                    continue
+                account_pct = max(
+                    account_pct or 0.0,
+                    *(usage_number(entry.get(k)) for k in ("call_count", "total_cputime", "total_time")),
+                )
+                # Reported in minutes
+                regain_seconds = max(regain_seconds, usage_number(entry.get("estimated_time_to_regain_access")) * 60)
+
+    return app_pct, account_pct, regain_seconds
+
+
+def pacing_state(usage_pct, regain_seconds, now):
+    """Translate a usage percentage into {"delay", "pause_until", "usage"} for the throttle key."""
+    if usage_pct >= BLOCK_PCT:
+        return {"delay": MAX_PACE_DELAY, "pause_until": now + (regain_seconds or DEFAULT_BLOCK_SECONDS), "usage": usage_pct}
+
+    if usage_pct >= PACE_START_PCT:
+        # Quadratic ramp: gentle at first, steep close to the cap
+        ratio = (usage_pct - PACE_START_PCT) / (BLOCK_PCT - PACE_START_PCT)
+        return {"delay": round(MAX_PACE_DELAY * ratio * ratio, 3), "pause_until": 0, "usage": usage_pct}
+
+    return None
+
+
+def store_state(scope, state, now):
+    """Persist pacing state for a scope, or clear it when usage is low again."""
+    key = throttle_key(scope)
+    if state is None:
+        redis_throttle.delete(key)
+        return
+
+    ttl = max(int(state["pause_until"] - now), 0) + 300
+    redis_throttle.set(key, json.dumps(state), ex=ttl)
+
+
+def wait_for_capacity(url, max_wait=None):
+    """Sleep as long as the shared app/account throttle state asks before calling Graph.
+
+    Workers pass no `max_wait` and sleep up to MAX_BLOCKING_WAIT. API request
+    threads pass a short `max_wait` and get GraphThrottledError when the wait
+    would be longer, so a paused account never parks a request for minutes.
+    """
+    scopes = [APP_SCOPE]
+    account_scope = extract_ad_account_scope(url)
+    if account_scope:
+        scopes.append(account_scope)
+
+    try:
+        states = redis_throttle.mget([throttle_key(scope) for scope in scopes])
+    except redis.RedisError as e:
+        logging.warning(f"Graph throttle state unavailable, calling without pacing: {e}")
+        return 0
+
+    now = time.time()
+    wait = 0.0
+    for raw_state in states:
+        state = parse_json_header(raw_state)
+        if not state:
+            continue
+        wait = max(wait, state.get("pause_until", 0) - now, state.get("delay", 0))
+
+    if max_wait is not None and wait > max_wait:
+        raise GraphThrottledError(f"Graph is throttling {', '.join(scopes)}; retry in {wait:.0f}s", retry_after=wait)
+
+    wait = min(wait, MAX_BLOCKING_WAIT)
+    if wait > 0:
+        logging.info(f"Pacing Graph call for {', '.join(scopes)}: sleeping {wait:.2f}s")
+        time.sleep(wait)
+    return wait
+
+
+def headroom(scope):
+    """Share of a scope's call budget left before we block: 1.0 below the pacing
+    threshold, falling to 0.0 at BLOCK_PCT or while a pause is in effect."""
+    try:
+        state = parse_json_header(redis_throttle.get(throttle_key(scope)))
+    except redis.RedisError as e:
+        logging.warning(f"Graph throttle state unavailable, assuming full headroom: {e}")
+        return 1.0
+
+    if not state:
+        return 1.0
+    if state.get("pause_until", 0) > time.time():
+        return 0.0
+    usage_pct = state.get("usage", PACE_START_PCT)
+    return min(max((BLOCK_PCT - usage_pct) / (BLOCK_PCT - PACE_START_PCT), 0.0), 1.0)
+
+
+def record_usage(url, response, token_fingerprint=None):
+    """Update the shared throttle state from a Graph response's headers and error code.
+
+    With `token_fingerprint`, the app usage is also kept under that token's
+    scope, which the schedule dispatcher budgets against.
+    """
+    try:
+        app_pct, account_pct, regain_seconds = usage_from_headers(response.headers)
+
+        if response.status_code >= 400:
+            try:
+                error_code = response.json().get("error", {}).get("code")
+            except (ValueError, AttributeError):
+                error_code = None
+
+            if error_code in THROTTLE_ERROR_CODES:
+                logging.warning(f"Graph throttled request (code {error_code}) for {url.split('?')[0]}")
+                # Code 4 is the app-wide limit; the rest apply to the account when we know it
+                if error_code == 4 or not extract_ad_account_scope(url):
+                    app_pct = 100
+                else:
+                    account_pct = 100
+
+        now = time.time()
+        if app_pct is not None:
+            store_state(APP_SCOPE, pacing_state(app_pct, regain_seconds, now), now)
+            if token_fingerprint:
+                store_state(token_scope(token_fingerprint), pacing_state(app_pct, regain_seconds, now), now)
+
+        account_scope = extract_ad_account_scope(url)
+        if account_scope and account_pct is not None:
+            store_state(account_scope, pacing_state(account_pct, regain_seconds, now), now)
+
+    except redis.RedisError as e:
+        logging.warning(f"Could not record Graph usage: {e}")
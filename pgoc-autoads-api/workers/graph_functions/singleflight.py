@@ -0,0 +1,87 @@
+import json
+import time
+import hashlib
+import logging
+import redis
+from workers.graph_functions.graph_client import build_graph_url, fetch_facebook_data, generation_key
+from workers.graph_functions.circuit_breaker import token_fingerprint
+# Shares the Graph state database (db 4) with the rate limiter
+from workers.graph_functions.rate_limiter import redis_throttle as redis_flight
+
+FLIGHT_KEY_PREFIX = "graph_flight"
+
+# Leader lock lifetime; a crashed leader frees the flight after this
+FLIGHT_LOCK_SECONDS = 60
+# How long followers wait for the leader before fetching on their own
+FLIGHT_WAIT_SECONDS = 60
+FLIGHT_POLL_INTERVAL = 0.1
+# Results are kept just long enough for callers that arrive during the same burst
+SHARED_RESULT_TTL = 5
+SHARED_ERROR_TTL = 1
+
+
+def flight_key(url, access_token, params, generation):
+    request_id = json.dumps(
+        [build_graph_url(url), sorted((params or {}).items()), token_fingerprint(access_token), generation],
+        default=str,
+    )
+    return f"{FLIGHT_KEY_PREFIX}:{hashlib.sha256(request_id.encode()).hexdigest()}"
+
+
+def shared_fetch_facebook_data(url, access_token, params=None):
+    """fetch_facebook_data with Redis-backed singleflight.
+
+    The first caller for an identical read (URL, params, token) performs the
+    request; concurrent callers wait for and reuse its result instead of
+    spending quota on the same call. Only use for reads that may be a few
+    seconds old (listings, insights), never for verify-after-write reads.
+    Every non-GET graph_request for the token starts a new generation, so
+    results shared before a write are not handed out after it.
+    """
+    try:
+        generation = redis_flight.get(generation_key(access_token)) or "0"
+        key = flight_key(url, access_token, params, generation)
+        result_key = f"{key}:result"
+        lock = redis_flight.lock(f"{key}:lock", timeout=FLIGHT_LOCK_SECONDS)
+
+        deadline = time.time() + FLIGHT_WAIT_SECONDS
+        while True:
+            cached = redis_flight.get(result_key)
+            if cached is not None:
+                return json.loads(cached)
+
+            if lock.acquire(blocking=False):
+                break
+
+            if time.time() >= deadline:
+                logging.warning(f"Timed out waiting for shared Graph read of {url.split('?')[0]}; fetching directly")
+                return fetch_facebook_data(url, access_token, params=params)
+
+            time.sleep(FLIGHT_POLL_INTERVAL)
+
+    except redis.RedisError as e:
+        logging.warning(f"Singleflight unavailable, fetching directly: {e}")
+        return fetch_facebook_data(url, access_token, params=params)
+
+    data = None
+    try:
+        # A leader may have finished between our last look and taking the lock
+        cached = redis_flight.get(result_key)
+        if cached is not None:
+            return json.loads(cached)
+
+        data = fetch_facebook_data(url, access_token, params=params)
+        ttl = SHARED_ERROR_TTL if "error" in data else SHARED_RESULT_TTL
+        redis_flight.set(result_key, json.dumps(data), ex=ttl)
+        return data
+
+    except redis.RedisError as e:
+        logging.warning(f"Could not share Graph read result: {e}")
+        return data if data is not None else fetch_facebook_data(url, access_token, params=params)
+
+    finally:
+        try:
+            lock.release()
+        except redis.RedisError:
+            # Lock already expired; the result (if stored) is still usable
+            pass
@@ -0,0 +1,76 @@
+import time
+import logging
+import threading
+from workers.graph_functions.graph_client import FACEBOOK_GRAPH_URL, fetch_facebook_data
+from workers.graph_functions.batch_writer import chunked
+
+# Graph accepts at most 50 object ids per ?ids= read
+GRAPH_IDS_LIMIT = 50
+
+# Wait before the first read-back, tuned per process by how often writes were already visible
+MIN_SETTLE_SECONDS = 0.25
+MAX_SETTLE_SECONDS = 4.0
+INITIAL_SETTLE_SECONDS = 1.0
+
+_settle_seconds = INITIAL_SETTLE_SECONDS
+_settle_lock = threading.Lock()
+
+
+def settle_delay():
+    return _settle_seconds
+
+
+def record_settle(all_visible):
+    """Shrink the delay while writes are visible on the first read, grow it when they are not."""
+    global _settle_seconds
+    with _settle_lock:
+        factor = 0.8 if all_visible else 1.5
+        _settle_seconds = min(MAX_SETTLE_SECONDS, max(MIN_SETTLE_SECONDS, _settle_seconds * factor))
+
+
+def read_statuses(access_token, entity_ids, field="status"):
+    """Read `field` for many entities with ?ids= calls of up to 50 ids.
+
+    Returns {entity_id: value}; entities that could not be read map to None.
+    """
+    values = {entity_id: None for entity_id in entity_ids}
+    for chunk in chunked(list(values), GRAPH_IDS_LIMIT):
+        data = fetch_facebook_data(FACEBOOK_GRAPH_URL, access_token, params={"ids": ",".join(chunk), "fields": field})
+        if "error" in data:
+            logging.error(f"Could not read back {len(chunk)} entities: {data['error'].get('message', 'Unknown error')}")
+            continue
+        for entity_id in chunk:
+            entity = data.get(entity_id)
+            if isinstance(entity, dict):
+                values[entity_id] = entity.get(field)
+    return values
+
+
+def verify_statuses(access_token, expected, rereads=1):
+    """Check that a run's writes are visible: one delay, one batched read, re-reads for mismatches only.
+
+    `expected` maps entity_id to the status just written. Mismatches are read
+    again up to `rereads` times with a growing delay, since Graph can lag
+    briefly behind a successful write. Returns {entity_id: observed status or None}.
+    """
+    if not expected:
+        return {}
+
+    observed = {}
+    pending = dict(expected)
+    delay = settle_delay()
+
+    for attempt in range(rereads + 1):
+        time.sleep(delay)
+        observed.update(read_statuses(access_token, list(pending)))
+        pending = {entity_id: status for entity_id, status in pending.items() if observed[entity_id] != status}
+
+        if attempt == 0:
+            record_settle(not pending)
+        if not pending:
+            break
+        delay = min(delay * 2, MAX_SETTLE_SECONDS)
+
+    if pending:
+        logging.warning(f"{len(pending)} of {len(expected)} written statuses not visible yet: {sorted(pending)}")
+    return observed
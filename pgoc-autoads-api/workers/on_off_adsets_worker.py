@@ -1,16 +1,23 @@
 import json
 import logging
 import re
-import time
 import pytz
 import redis
-import requests
 from celery import shared_task
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from flask import request, jsonify
 from sqlalchemy.orm.attributes import flag_modified
 from workers.on_off_functions.on_off_adsets import append_redis_message_adsets
 from workers.update_status import process_adsets
+from workers.graph_functions.graph_client import FACEBOOK_GRAPH_URL
+from workers.graph_functions.singleflight import shared_fetch_facebook_data
+from workers.graph_functions.hierarchy_fetcher import fetch_campaign_tree
+from workers.graph_functions.campaign_query import fetch_matching_campaigns
+from workers.graph_functions.insights_cache import get_campaign_and_adset_insights
+from workers.graph_functions.circuit_breaker import is_circuit_open
+from workers.schedule_functions.pending_queue import queue_pending_schedule, run_coalesced
+from workers.schedule_functions.account_lock import AccountLock, LockLostError, ADSETS_FETCH
 
 # Set up Redis clients
 redis_client_as = redis.Redis(
@@ -23,13 +30,12 @@ redis_client_as = redis.Redis(
 # Timezone
 manila_tz = pytz.timezone("Asia/Manila")
 
-# Facebook API
-FACEBOOK_API_VERSION = "v22.0"
-FACEBOOK_GRAPH_URL = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}"
-
 # Compile regex once for performance
 NON_ALPHANUMERIC_REGEX = re.compile(r'[^a-zA-Z0-9]+')
 
+# Per-entity CPP lines sent to the message log before only the summary is reported
+DETAIL_MESSAGE_LIMIT = 2000
+
 
 def normalize_text(text):
     """Replace all non-alphanumeric characters with spaces and split into words."""
@@ -46,125 +52,92 @@ def contains_regular(text):
     return "so2" in normalize_text(text)
 
 
-def fetch_facebook_data(url, access_token):
-    """Fetch data from Facebook API and handle errors."""
-    try:
-        # Increased timeout for more reliable connections
-        response = requests.get(url, headers={"Authorization": f"Bearer {access_token}"}, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        if "error" in data:
-            logging.error(f"Facebook API Error: {data['error']}")
-            return {"error": data["error"]}
-
-        return data
-
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching data from Facebook API: {e}")
-        return {"error": {"message": str(e), "type": "RequestException"}}
-
-
-def get_cpp_from_insights(ad_account_id, access_token, level, cpp_date_start, cpp_date_end, user_id=None):
+def get_cpp_from_insights(ad_account_id, access_token, cpp_date_start, cpp_date_end, user_id=None):
     """
     Fetch CPP values from Facebook insights API within a specific date range.
-    Returns a dictionary mapping campaign_id or adset_id to CPP values.
+    Returns (campaign CPPs, adset CPPs, error), both maps from one adset-level read.
+    On error both maps are empty and must not be used to decide statuses.
     """
-    cpp_data = {}
-    
-    url = (f"{FACEBOOK_GRAPH_URL}/act_{ad_account_id}/insights"
-           f"?level={level}"
-           f"&fields=campaign_name,campaign_id,{level}_id,{level}_name,spend,actions,impressions"
-           f"&time_range[since]={cpp_date_start}"
-           f"&time_range[until]={cpp_date_end}"
-           f"&limit=1000")
-
     if user_id:
         append_redis_message_adsets(
             user_id,
-            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Fetching {level} insights from {cpp_date_start} to {cpp_date_end}"
-        )
-        append_redis_message_adsets(
-            user_id,
-            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] API URL: {url}"
+            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Fetching adset insights from {cpp_date_start} to {cpp_date_end}"
         )
 
-    debug_insights = {}
-    total_requests = 0
-    
-    while url:
-        total_requests += 1
-        response_data = fetch_facebook_data(url, access_token)
-        
-        if "error" in response_data:
-            error_msg = f"Error fetching {level} insights (request #{total_requests}): {response_data['error'].get('message', 'Unknown error')}"
-            logging.error(error_msg)
-            if user_id:
-                append_redis_message_adsets(user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_msg}")
-            break
+    # Campaign totals are rolled up from the adset rows instead of a second level=campaign read
+    campaign_items, adset_items, error = get_campaign_and_adset_insights(ad_account_id, access_token, cpp_date_start, cpp_date_end)
 
-        data_items = response_data.get("data", [])
+    if error:
+        error_msg = f"Error fetching insights: {error.get('message', 'Unknown error')}"
+        logging.error(error_msg)
         if user_id:
-            append_redis_message_adsets(
-                user_id,
-                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Processing {len(data_items)} {level}s from request #{total_requests}"
-            )
+            append_redis_message_adsets(user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_msg}")
+        return {}, {}, error
 
-        for item in data_items:
-            entity_id = item.get(f"{level}_id")
-            entity_name = item.get(f"{level}_name", "Unknown")
-            spend = float(item.get("spend", 0))
-            impressions = float(item.get("impressions", 0))
-
-            debug_insights[entity_id] = {
-                "name": entity_name,
-                "spend": spend,
-                "impressions": impressions,
-                "actions": {}
-            }
+    return cpp_from_rows("campaign", campaign_items, user_id), cpp_from_rows("adset", adset_items, user_id), None
 
-            actions = item.get("actions", [])
 
-            checkout_actions = [
-                "omni_initiated_checkout",
-                "initiate_checkout",
-                "offsite_conversion.fb_pixel_initiate_checkout",
-                "checkout_initiated",
-                "onsite_conversion.initiate_checkout",
-                "onsite_web_initiate_checkout"
-            ]
+def cpp_from_rows(level, data_items, user_id=None):
+    """Map campaign_id or adset_id to CPP for insights rows of `level`, reporting a summary to the user."""
+    cpp_data = {}
+    debug_insights = {}
 
-            checkout_values = []
+    if user_id:
+        append_redis_message_adsets(
+            user_id,
+            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Processing {len(data_items)} {level}s"
+        )
 
-            for action in actions:
-                action_type = action.get("action_type")
-                action_value = float(action.get("value", 0))
-                debug_insights[entity_id]["actions"][action_type] = action_value
+    for index, item in enumerate(data_items):
+        entity_id = item.get(f"{level}_id")
+        entity_name = item.get(f"{level}_name", "Unknown")
+        spend = float(item.get("spend", 0))
+        impressions = float(item.get("impressions", 0))
+
+        debug_insights[entity_id] = {
+            "name": entity_name,
+            "spend": spend,
+            "impressions": impressions,
+            "actions": {}
+        }
+
+        actions = item.get("actions", [])
+
+        checkout_actions = [
+            "omni_initiated_checkout",
+            "initiate_checkout",
+            "offsite_conversion.fb_pixel_initiate_checkout",
+            "checkout_initiated",
+            "onsite_conversion.initiate_checkout",
+            "onsite_web_initiate_checkout"
+        ]
 
-                if action_type in checkout_actions:
-                    checkout_values.append(action_value)
+        checkout_values = []
 
-            # Avoid double-counting by taking max, not sum
-            initiate_checkout_value = max(checkout_values) if checkout_values else 0
+        for action in actions:
+            action_type = action.get("action_type")
+            action_value = float(action.get("value", 0))
+            debug_insights[entity_id]["actions"][action_type] = action_value
 
-            if initiate_checkout_value > 0:
-                cpp = spend / initiate_checkout_value
-            else:
-                cpp = float('inf')  # No valid checkouts
+            if action_type in checkout_actions:
+                checkout_values.append(action_value)
 
-            cpp_data[entity_id] = cpp
+        # Avoid double-counting by taking max, not sum
+        initiate_checkout_value = max(checkout_values) if checkout_values else 0
 
-            if user_id and total_requests <= 2:
-                cpp_display = f"${cpp:.2f}" if cpp != float('inf') else "No checkouts"
-                append_redis_message_adsets(
-                    user_id,
-                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {entity_name}: Spend=${spend:.2f}, Checkouts={initiate_checkout_value}, CPP={cpp_display}"
-                )
+        if initiate_checkout_value > 0:
+            cpp = spend / initiate_checkout_value
+        else:
+            cpp = float('inf')  # No valid checkouts
 
-        url = response_data.get("paging", {}).get("next")
+        cpp_data[entity_id] = cpp
 
-        if url:
-            time.sleep(0.5)
+        if user_id and index < DETAIL_MESSAGE_LIMIT:
+            cpp_display = f"${cpp:.2f}" if cpp != float('inf') else "No checkouts"
+            append_redis_message_adsets(
+                user_id,
+                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {entity_name}: Spend=${spend:.2f}, Checkouts={initiate_checkout_value}, CPP={cpp_display}"
+            )
 
     if user_id:
         cpp_summary = {}
@@ -220,11 +193,20 @@ def is_campaign_code_match(campaign_name, campaign_code):
     return normalized_code in normalized_name
 
 
+def schedule_date_range(schedule):
+    today = datetime.now().strftime("%Y-%m-%d")
+    return schedule.get("date_start", today), schedule.get("date_end", today)
+
+
+def adsets_compatibility_key(schedule):
+    """Schedules over the same CPP date range can share one insights and campaign fetch."""
+    return schedule_date_range(schedule)
+
+
 @shared_task
 def fetch_adsets(user_id, ad_account_id, access_token, matched_schedule):
     """Fetch campaigns for an ad account, including CPP data, and store structured data."""
-    lock_key = f"lock:fetch_campaign:{ad_account_id}"
-    lock = redis_client_as.lock(lock_key, timeout=300)
+    lock = AccountLock(ADSETS_FETCH, ad_account_id)
     pending_schedules_key = f"pending_schedules:{ad_account_id}"
 
     logging.info(f"Starting fetch_adsets for ad_account_id: {ad_account_id}")
@@ -242,20 +224,44 @@ def fetch_adsets(user_id, ad_account_id, access_token, matched_schedule):
 
     # Remove 'act_' prefix if present
     clean_ad_account_id = str(ad_account_id).replace('act_', '')
+
+    if is_circuit_open(access_token, clean_ad_account_id):
+        error_msg = f"Skipping {clean_ad_account_id}: access token or ad account keeps failing authorization."
+        append_redis_message_adsets(user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_msg}")
+        return error_msg
     
     if not lock.acquire(blocking=False):
         logging.info(f"Fetch campaign already running for {clean_ad_account_id}. Adding to queue...")
-        redis_client_as.rpush(pending_schedules_key, json.dumps(matched_schedule))
+        queue_pending_schedule(redis_client_as, pending_schedules_key, user_id, access_token, matched_schedule)
         return f"Fetch already in progress for {clean_ad_account_id}, queued process_scheduled_campaigns"
 
-    try:
-        campaign_data = {}
+    # The lock holder also runs whatever gets queued for this account meanwhile
+    return run_coalesced(
+        redis_client_as, lock, pending_schedules_key, user_id, access_token, matched_schedule,
+        adsets_compatibility_key,
+        lambda group_user_id, group_access_token, schedules: fetch_adsets_group(
+            group_user_id, clean_ad_account_id, group_access_token, schedules, lock
+        ),
+    )
+
+
+def fetch_adsets_group(user_id, clean_ad_account_id, access_token, schedules, lock):
+    """Fetch insights and the campaign tree once for compatible schedules, then process each schedule's adsets."""
+    if is_circuit_open(access_token, clean_ad_account_id):
+        error_msg = f"Skipping {clean_ad_account_id}: access token or ad account keeps failing authorization."
+        append_redis_message_adsets(user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_msg}")
+        return error_msg
 
+    try:
         # Get date range from user input, with fallback to today's date
-        cpp_date_start = matched_schedule.get("date_start", datetime.now().strftime("%Y-%m-%d"))
-        cpp_date_end = matched_schedule.get("date_end", datetime.now().strftime("%Y-%m-%d"))
-        
-        campaign_code = matched_schedule.get("campaign_code")
+        cpp_date_start, cpp_date_end = schedule_date_range(schedules[0])
+        campaign_codes = [schedule.get("campaign_code") for schedule in schedules]
+
+        if len(schedules) > 1:
+            append_redis_message_adsets(
+                user_id,
+                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Running {len(schedules)} queued schedules ({', '.join(map(str, campaign_codes))}) against one fetch"
+            )
 
         # Log the date range being used
         append_redis_message_adsets(
@@ -265,7 +271,7 @@ def fetch_adsets(user_id, ad_account_id, access_token, matched_schedule):
         
         # First, verify the ad account is accessible
         verify_url = f"{FACEBOOK_GRAPH_URL}/act_{clean_ad_account_id}?fields=id,name,account_status"
-        verify_response = fetch_facebook_data(verify_url, access_token)
+        verify_response = shared_fetch_facebook_data(verify_url, access_token)
         
         if "error" in verify_response:
             error_msg = f"Error accessing ad account {clean_ad_account_id}: {verify_response['error'].get('message', 'Unknown error')}"
@@ -279,121 +285,51 @@ def fetch_adsets(user_id, ad_account_id, access_token, matched_schedule):
             f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Successfully accessed ad account {clean_ad_account_id}"
         )
         
-        # Fetch CPP data for campaigns & adsets
-        cpp_campaign_data = get_cpp_from_insights(
-            clean_ad_account_id, access_token, "campaign", cpp_date_start, cpp_date_end, user_id
-        )
-        cpp_adset_data = get_cpp_from_insights(
-            clean_ad_account_id, access_token, "adset", cpp_date_start, cpp_date_end, user_id
-        )
+        # Insights and the campaign tree are independent; fetch them side by side
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            insights_future = executor.submit(
+                get_cpp_from_insights, clean_ad_account_id, access_token, cpp_date_start, cpp_date_end, user_id
+            )
 
-        # Fetch Campaign & Adset data with optimized query
-        campaign_url = (
-            f"{FACEBOOK_GRAPH_URL}/act_{clean_ad_account_id}/campaigns"
-            f"?fields=id,name,status,adsets{{id,name,status}}"
-            f"&limit=1000"  # Reduced batch size
-        )
-        
-        all_campaigns = []
-        while campaign_url:
-            campaigns_data = fetch_facebook_data(campaign_url, access_token)
-            
-            if "error" in campaigns_data:
-                error_msg = campaigns_data["error"].get("message", "Unknown error")
-                logging.error(f"Facebook API Error: {error_msg}")
-                append_redis_message_adsets(
-                    user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_msg}"
-                )
-                return f"Error fetching campaign data for {clean_ad_account_id}: {error_msg}"
-            
-            # Add campaigns from this batch
-            all_campaigns.extend(campaigns_data.get("data", []))
-            
-            # Get next page URL if it exists
-            campaign_url = campaigns_data.get("paging", {}).get("next")
-            
-            # Add a small delay between requests to avoid rate limits
-            if campaign_url:
-                time.sleep(0.5)  # 500ms delay between requests
-        
-        # Filter campaigns by campaign code using our new matching function
-        matching_campaigns = [
-            campaign for campaign in all_campaigns 
-            if is_campaign_code_match(campaign["name"], campaign_code)
-        ]
-        
-        # Log the number of campaigns found
-        total_campaigns = len(matching_campaigns)
-        append_redis_message_adsets(
-            user_id,
-            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Found {total_campaigns} campaigns matching campaign code '{campaign_code}' for ad account {clean_ad_account_id}"
-        )
+            # Fetch the complete Campaign & Adset tree of matching campaigns, following nested adset cursors
+            matching_campaigns, campaigns_error = fetch_matching_campaigns(
+                lambda params: fetch_campaign_tree(clean_ad_account_id, access_token, params=params),
+                campaign_codes,
+                is_campaign_code_match,
+            )
+            cpp_campaign_data, cpp_adset_data, insights_error = insights_future.result()
 
-        if total_campaigns == 0:
+        if insights_error:
+            # Missing CPPs read as "No checkouts", which would pause every matched adset
+            error_msg = f"Skipped schedule: could not read CPP insights ({insights_error.get('message', 'Unknown error')}). No statuses were changed."
             append_redis_message_adsets(
-                user_id,
-                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] No campaigns found matching campaign code '{campaign_code}' in ad account {clean_ad_account_id}"
+                user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_msg}"
             )
-            return f"No matching campaigns found for campaign code '{campaign_code}' in ad account {clean_ad_account_id}"
-
-        # Process campaigns
-        for campaign in matching_campaigns:
-            campaign_id = campaign["id"]
-            campaign_name = campaign["name"]
-            campaign_status = campaign["status"]
-            campaign_CPP = cpp_campaign_data.get(campaign_id, float('inf'))
-            
-            # Format campaign CPP for display
-            campaign_CPP_display = f"${campaign_CPP:.2f}" if campaign_CPP != float('inf') else "No checkouts"
-
-            # Add the campaign to the data structure
-            campaign_data[campaign_id] = {
-                "campaign_name": campaign_name,
-                "STATUS": campaign_status,
-                "CPP": campaign_CPP,
-                "CPP_display": campaign_CPP_display,
-                "ADSETS": {},
-            }
+            return f"Error fetching insights for {clean_ad_account_id}: {insights_error.get('message', 'Unknown error')}"
 
-            # Display each campaign's CPP
+        if campaigns_error:
+            error_msg = campaigns_error.get("message", "Unknown error")
+            logging.error(f"Facebook API Error: {error_msg}")
             append_redis_message_adsets(
-                user_id, 
-                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaign: {campaign_name}, CPP: {campaign_CPP_display}"
+                user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_msg}"
             )
+            return f"Error fetching campaign data for {clean_ad_account_id}: {error_msg}"
+
+        # Status writes happen in process_adsets; don't hand them a snapshot from a superseded holder
+        lock.ensure_held()
+        results = [
+            process_schedule_adsets(
+                user_id, clean_ad_account_id, access_token, matched_schedule,
+                [campaign for campaign in matching_campaigns if is_campaign_code_match(campaign["name"], matched_schedule.get("campaign_code"))],
+                cpp_campaign_data, cpp_adset_data,
+            )
+            for matched_schedule in schedules
+        ]
+        return results[0] if len(results) == 1 else "; ".join(results)
 
-            for adset in campaign.get("adsets", {}).get("data", []):
-                adset_id = adset["id"]
-                adset_name = adset["name"]
-                adset_status = adset["status"]
-                adset_CPP = cpp_adset_data.get(adset_id, float('inf'))
-                
-                # Format adset CPP for display
-                adset_CPP_display = f"${adset_CPP:.2f}" if adset_CPP != float('inf') else "No checkouts"
-                
-                campaign_data[campaign_id]["ADSETS"][adset_id] = {
-                    "NAME": adset_name,
-                    "STATUS": adset_status,
-                    "CPP": adset_CPP,
-                    "CPP_display": adset_CPP_display
-                }
-                
-                # Display each adset's CPP
-                append_redis_message_adsets(
-                    user_id, 
-                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] └── Adset: {adset_name}, CPP: {adset_CPP_display}"
-                )
-
-        logging.info(
-            f"Successfully fetched campaigns for Ad Account {clean_ad_account_id}. Data: {campaign_data}"
-        )
-
-        # Pass only the relevant campaigns (filtered by campaign_code) to the next Celery task
-        process_adsets.apply_async(
-            args=[user_id, clean_ad_account_id, access_token, matched_schedule, campaign_data]
-        )
-
-        return f"Fetched campaign data for Ad Account {clean_ad_account_id}"
-
+    except LockLostError:
+        # run_coalesced returns the schedules to the pending list
+        raise
     except Exception as e:
         logging.error(f"Error during campaign fetch: {e}")
         append_redis_message_adsets(
@@ -401,6 +337,80 @@ def fetch_adsets(user_id, ad_account_id, access_token, matched_schedule):
         )
         return f"Error: {str(e)}"
 
-    finally:
-        lock.release()
-        logging.info(f"Released lock for Ad Account {clean_ad_account_id}")
\ No newline at end of file
+
+def process_schedule_adsets(user_id, clean_ad_account_id, access_token, matched_schedule, matching_campaigns, cpp_campaign_data, cpp_adset_data):
+    """Build one schedule's campaign data from the shared snapshot and hand it to process_adsets."""
+    campaign_data = {}
+    campaign_code = matched_schedule.get("campaign_code")
+
+    # Log the number of campaigns found
+    total_campaigns = len(matching_campaigns)
+    append_redis_message_adsets(
+        user_id,
+        f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Found {total_campaigns} campaigns matching campaign code '{campaign_code}' for ad account {clean_ad_account_id}"
+    )
+
+    if total_campaigns == 0:
+        append_redis_message_adsets(
+            user_id,
+            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] No campaigns found matching campaign code '{campaign_code}' in ad account {clean_ad_account_id}"
+        )
+        return f"No matching campaigns found for campaign code '{campaign_code}' in ad account {clean_ad_account_id}"
+
+    # Process campaigns
+    for campaign in matching_campaigns:
+        campaign_id = campaign["id"]
+        campaign_name = campaign["name"]
+        campaign_status = campaign["status"]
+        campaign_CPP = cpp_campaign_data.get(campaign_id, float('inf'))
+        
+        # Format campaign CPP for display
+        campaign_CPP_display = f"${campaign_CPP:.2f}" if campaign_CPP != float('inf') else "No checkouts"
+
+        # Add the campaign to the data structure
+        campaign_data[campaign_id] = {
+            "campaign_name": campaign_name,
+            "STATUS": campaign_status,
+            "CPP": campaign_CPP,
+            "CPP_display": campaign_CPP_display,
+            "ADSETS": {},
+        }
+
+        # Display each campaign's CPP
+        append_redis_message_adsets(
+            user_id, 
+            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaign: {campaign_name}, CPP: {campaign_CPP_display}"
+        )
+
+        for adset in campaign.get("adsets", {}).get("data", []):
+            adset_id = adset["id"]
+            adset_name = adset["name"]
+            adset_status = adset["status"]
+            adset_CPP = cpp_adset_data.get(adset_id, float('inf'))
+            
+            # Format adset CPP for display
+            adset_CPP_display = f"${adset_CPP:.2f}" if adset_CPP != float('inf') else "No checkouts"
+            
+            campaign_data[campaign_id]["ADSETS"][adset_id] = {
+                "NAME": adset_name,
+                "STATUS": adset_status,
+                "CPP": adset_CPP,
+                "CPP_display": adset_CPP_display
+            }
+            
+            # Display each adset's CPP
+            append_redis_message_adsets(
+                user_id, 
+                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] └── Adset: {adset_name}, CPP: {adset_CPP_display}"
+            )
+
+    logging.info(
+        f"Successfully fetched campaigns for Ad Account {clean_ad_account_id}. Data: {campaign_data}"
+    )
+
+    # Pass only the relevant campaigns (filtered by campaign_code) to the next Celery task
+    process_adsets.apply_async(
+        args=[user_id, clean_ad_account_id, access_token, matched_schedule, campaign_data]
+    )
+
+    return f"Fetched campaign data for Ad Account {clean_ad_account_id}"
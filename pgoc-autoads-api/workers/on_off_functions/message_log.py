@@ -0,0 +1,184 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+import redis
+from celery.signals import task_postrun
+
+# Payload shapes the SSE clients expect under "data"
+FULL_HISTORY = "history"  # {"message": [every message so far]}
+LATEST = "latest"  # {"message": [latest message]}
+LATEST_TEXT = "latest_text"  # {"message": "latest message"}
+
+MessageLog = namedtuple("MessageLog", "db shape")
+
+# One progress log family per Redis database, keyed like "{user_id}-key" or "{user_id}-{ad_account_id}-key"
+SCHEDULE_LOG = MessageLog(10, FULL_HISTORY)  # append_redis_message, /messageevents
+CAMPAIGN_ONLY_LOG = MessageLog(11, FULL_HISTORY)  # append_redis_message2, /messageevents-only
+PAGE_NAME_LOG = MessageLog(12, LATEST)  # append_redis_message_pages, /messageevents-pagename
+CAMPAIGN_NAME_LOG = MessageLog(13, LATEST)  # append_redis_message_campaigns, /messageevents-off
+CREATE_CAMPAIGN_LOG = MessageLog(14, LATEST_TEXT)  # append_redis_message_create_campaigns, /messageevents-campaign-creations
+ADSETS_LOG = MessageLog(15, LATEST)  # append_redis_message_adsets, /messageevents-adsets
+AD_SPENT_LOG = MessageLog(9, LATEST)  # append_redis_message_adspent, /messageevents-adspentreport
+EDIT_BUDGET_LOG = MessageLog(8, LATEST)  # append_redis_message_editbudget, /messageevents-editbudget
+EDIT_LOCATION_LOG = MessageLog(7, LATEST)  # append_redis_message_editlocation, /messageevents-editlocation
+
+# Streams are trimmed to roughly this many entries; busy accounts log thousands of lines a day
+MESSAGE_LOG_MAXLEN = 5000
+STREAM_SUFFIX = "stream"
+
+# Buffered messages are written at least this often, at the end of every task, or once this many are waiting
+FLUSH_INTERVAL_SECONDS = 0.25
+FLUSH_MAX_BUFFERED = 200
+
+_clients = {}
+
+# {MessageLog: {key: [message, ...]}} waiting for the next flush
+_buffer = {}
+_buffered = 0
+_buffer_lock = threading.Lock()
+# Held across the swap and the write, so batches reach the streams in the order they were buffered
+_flush_lock = threading.Lock()
+_flusher_pid = None
+
+
+def message_log_client(log):
+    """Return the process-wide client for a log family's database."""
+    client = _clients.get(log.db)
+    if client is None:
+        client = _clients[log.db] = redis.Redis(host="redisAds", port=6379, db=log.db, decode_responses=True)
+    return client
+
+
+def stream_key(key):
+    return f"{key}:{STREAM_SUFFIX}"
+
+
+def midnight_tomorrow():
+    now = datetime.now()
+    return int((now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+
+def append_log_message(log, key, message):
+    """Queue one message for a progress log; the log expires at 12 AM the next day.
+
+    Messages are buffered per key and written by flush_log_messages() in one
+    pipelined round-trip per database, so hot loops never wait on Redis.
+    """
+    global _buffered
+    with _buffer_lock:
+        _buffer.setdefault(log, {}).setdefault(key, []).append(str(message))
+        _buffered += 1
+        full = _buffered >= FLUSH_MAX_BUFFERED
+
+    ensure_flusher()
+    if full:
+        flush_log_messages()
+
+
+def flush_log_messages():
+    """Write every buffered message: XADDs plus one EXPIREAT per key, pipelined per database."""
+    global _buffer, _buffered
+    with _flush_lock:
+        with _buffer_lock:
+            pending, _buffer, _buffered = _buffer, {}, 0
+
+        expire_at = midnight_tomorrow()
+        for log, messages_by_key in pending.items():
+            try:
+                pipe = message_log_client(log).pipeline(transaction=False)
+                for key, messages in messages_by_key.items():
+                    for message in messages:
+                        pipe.xadd(stream_key(key), {"message": message}, maxlen=MESSAGE_LOG_MAXLEN, approximate=True)
+                    pipe.expireat(stream_key(key), expire_at)
+                pipe.execute()
+            except redis.RedisError as e:
+                logging.error(f"Error writing {sum(map(len, messages_by_key.values()))} messages to db {log.db}: {e}")
+
+
+def run_flusher():
+    while True:
+        time.sleep(FLUSH_INTERVAL_SECONDS)
+        if _buffered:
+            flush_log_messages()
+
+
+def ensure_flusher():
+    """Start the background flusher once per process (again after a fork)."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _buffer_lock:
+        if _flusher_pid != os.getpid():
+            threading.Thread(target=run_flusher, name="message log flusher", daemon=True).start()
+            _flusher_pid = os.getpid()
+
+
+@task_postrun.connect
+def flush_after_task(**kwargs):
+    """A finished task's last messages go out now, not on the next interval."""
+    flush_log_messages()
+
+
+atexit.register(flush_log_messages)
+
+
+def seed_log_message(log, key, message, ttl=None):
+    """Start a log with `message` unless it already has entries. `ttl` (seconds) overrides the midnight expiry."""
+    # Buffered messages count as entries
+    flush_log_messages()
+    client = message_log_client(log)
+    if client.exists(stream_key(key)):
+        return False
+
+    pipe = client.pipeline(transaction=False)
+    pipe.xadd(stream_key(key), {"message": str(message)}, maxlen=MESSAGE_LOG_MAXLEN, approximate=True)
+    if ttl:
+        pipe.expire(stream_key(key), ttl)
+    else:
+        pipe.expireat(stream_key(key), midnight_tomorrow())
+    pipe.execute()
+    return True
+
+
+def delete_log(log, key):
+    global _buffered
+    # Messages still buffered, or in a flush under way, would recreate the log right after the delete
+    with _flush_lock:
+        with _buffer_lock:
+            _buffered -= len(_buffer.get(log, {}).pop(key, []))
+        message_log_client(log).delete(stream_key(key))
+
+
+def entry_messages(entries):
+    return [(entry_id, fields.get("message", "")) for entry_id, fields in entries]
+
+
+def read_log(log, key, after=None, count=None):
+    """Messages after entry id `after` (all when None), oldest first. Returns [(entry_id, message), ...]."""
+    start = f"({after}" if after else "-"
+    return entry_messages(message_log_client(log).xrange(stream_key(key), min=start, max="+", count=count))
+
+
+def read_latest(log, key, count=1):
+    """The newest `count` messages, oldest first."""
+    return entry_messages(reversed(message_log_client(log).xrevrange(stream_key(key), count=count)))
+
+
+def read_initial(log, key):
+    """What a newly connected reader needs for the log's shape: the whole log, or just its latest entry."""
+    if log.shape == FULL_HISTORY:
+        return read_log(log, key)
+    return read_latest(log, key)
+
+
+def log_payload(log, messages):
+    """Build the {"message": ...} payload of the log's shape from messages in log order."""
+    if log.shape == FULL_HISTORY:
+        return {"message": list(messages)}
+    if log.shape == LATEST_TEXT:
+        return {"message": messages[-1] if messages else ""}
+    return {"message": list(messages[-1:])}
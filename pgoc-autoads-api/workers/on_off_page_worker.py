@@ -1,14 +1,16 @@
 import json
 import logging
 import re
-import time
 import pytz
 import redis
-import requests
 from celery import shared_task
 from datetime import datetime
 from flask import request, jsonify
 from workers.on_off_functions.on_off_page_message import append_redis_message_pages
+from workers.graph_functions.campaign_query import fetch_campaign_list, fetch_matching_campaigns
+from workers.graph_functions.batch_writer import write_statuses
+from workers.graph_functions.circuit_breaker import token_fingerprint
+from workers.schedule_functions.account_lock import AccountLock, PAGE_NAME_ON_OFF
 
 # Set up Redis clients
 redis_client_pn = redis.StrictRedis(
@@ -20,26 +22,6 @@ redis_client_pn = redis.StrictRedis(
 
 manila_tz = pytz.timezone("Asia/Manila")
 
-FACEBOOK_API_VERSION = "v22.0"
-FACEBOOK_GRAPH_URL = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}"
-
-def fetch_facebook_data(url, access_token):
-    """Helper function to fetch data from Facebook API and handle errors."""
-    try:
-        response = requests.get(url, headers={"Authorization": f"Bearer {access_token}"})
-        response.raise_for_status()
-        data = response.json()
-
-        if "error" in data:
-            logging.error(f"Facebook API Error: {data['error']}")
-            return {"error": data["error"]}
-
-        return data
-
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching data from Facebook API: {e}")
-        return {"error": {"message": str(e), "type": "RequestException"}}
-
 def normalize_text(text):
     """Normalize text by removing special characters, leading/trailing hyphens and spaces."""
     # First strip leading/trailing spaces and hyphens
@@ -54,26 +36,6 @@ def is_page_name_in_campaign(campaign_name, page_name):
     normalized_page = normalize_text(page_name)
     return normalized_page in normalized_campaign
 
-def update_facebook_status(user_id, ad_account_id, entity_id, new_status, access_token):
-    """Update the status of a Facebook campaign or ad set using the Graph API."""
-    url = f"{FACEBOOK_GRAPH_URL}/{entity_id}"
-    payload = {"status": new_status}
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        logging.info(f"Successfully updated {entity_id} to {new_status}")
-        append_redis_message_pages(user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Successfully updated {entity_id} to {new_status}")
-        return True
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error updating {entity_id} to {new_status}: {e}")
-        append_redis_message_pages(user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error updating {entity_id} to {new_status}: {e}")
-        return False
-
 @shared_task
 def fetch_campaign_off(user_id, ad_account_id, access_token, matched_schedule):
     """Efficiently fetch campaigns from Facebook API and update only scheduled ones."""
@@ -81,10 +43,8 @@ def fetch_campaign_off(user_id, ad_account_id, access_token, matched_schedule):
     operation = "ON" if matched_schedule.get("on_off") == "ON" else "OFF"
     
     for page_name in matched_schedule.get("page_name", []):
-        lock_key = f"lock:fetch_campaign_only:{ad_account_id}:{access_token}:{normalize_text(page_name)}"
-        
-        # Lock for the specific ad_account_id, access_token, and page_name combination
-        lock = redis_client_pn.lock(lock_key, timeout=300)
+        # Lock for the specific ad_account_id, access_token, and page_name combination (never the raw token in a key)
+        lock = AccountLock(PAGE_NAME_ON_OFF, ad_account_id, token_fingerprint(access_token), normalize_text(page_name))
         
         if not lock.acquire(blocking=False):
             logging.info(f"Lock already held for {ad_account_id} with access token and page {page_name}. Skipping...")
@@ -106,46 +66,34 @@ def fetch_campaign_off(user_id, ad_account_id, access_token, matched_schedule):
                 f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Fetching Campaign Data for page: {page_name} in account {ad_account_id} ({operation})"
             )
 
-            # Fetch all campaigns without filtering at API level
-            campaign_url = (
-                f"{FACEBOOK_GRAPH_URL}/act_{ad_account_id}/campaigns"
-                f"?fields=id,name,status"
-                f"&limit=1000"  # Reduced batch size for better performance
+            # Filter by page name at API level where safe; is_page_name_in_campaign still decides
+            matched_campaigns, campaigns_error = fetch_matching_campaigns(
+                lambda params: fetch_campaign_list(ad_account_id, access_token, params=params),
+                [page_name],
+                is_page_name_in_campaign,
             )
-            
+
+            if campaigns_error:
+                raise Exception(campaigns_error.get("message", "Unknown API error"))
+
             campaigns_to_update = []
             matched_page_names = set()
 
-            while campaign_url:
-                response_data = fetch_facebook_data(campaign_url, access_token)
-
-                if "error" in response_data:
-                    raise Exception(response_data["error"].get("message", "Unknown API error"))
-
-                for campaign in response_data.get("data", []):
-                    campaign_id = campaign["id"]
-                    campaign_name = campaign["name"]
-                    campaign_status = campaign["status"]
-
-                    # Use the new matching function to check if page name exists in campaign name
-                    if is_page_name_in_campaign(campaign_name, page_name):
-                        # Track matched page name
-                        matched_page_names.add(normalize_text(page_name))
-
-                        if campaign_status != target_status:
-                            campaigns_to_update.append((campaign_id, campaign_name))
-                        else:
-                            append_redis_message_pages(
-                                user_id,
-                                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠ Campaign {campaign_name} ({campaign_id}) for page: {page_name} IS ALREADY {target_status}."
-                            )
-
-                # Get next page URL if it exists
-                campaign_url = response_data.get("paging", {}).get("next")
-                
-                # Add a small delay between requests to avoid rate limits
-                if campaign_url:
-                    time.sleep(0.5)  # 500ms delay between requests
+            for campaign in matched_campaigns:
+                campaign_id = campaign["id"]
+                campaign_name = campaign["name"]
+                campaign_status = campaign["status"]
+
+                # Track matched page name
+                matched_page_names.add(normalize_text(page_name))
+
+                if campaign_status != target_status:
+                    campaigns_to_update.append((campaign_id, campaign_name))
+                else:
+                    append_redis_message_pages(
+                        user_id,
+                        f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠ Campaign {campaign_name} ({campaign_id}) for page: {page_name} IS ALREADY {target_status}."
+                    )
 
             # Log unmatched page names
             if not matched_page_names:
@@ -160,8 +108,15 @@ def fetch_campaign_off(user_id, ad_account_id, access_token, matched_schedule):
                     f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] No campaigns needed updates for page: {page_name}"
                 )
 
+            write_results = write_statuses(
+                access_token,
+                [(campaign_id, target_status) for campaign_id, _ in campaigns_to_update],
+                lambda message: append_redis_message_pages(user_id, message),
+                before_write=lock.ensure_held,
+            )
+
             for campaign_id, campaign_name in campaigns_to_update:
-                success = update_facebook_status(user_id, ad_account_id, campaign_id, target_status, access_token)
+                success = write_results.get(campaign_id, False)
 
                 status_message = (
                     f"✅ Updated {campaign_name} ({campaign_id}) to {target_status} for page: {page_name}"
@@ -181,8 +136,7 @@ def fetch_campaign_off(user_id, ad_account_id, access_token, matched_schedule):
             append_redis_message_pages(user_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {error_message}")
 
         finally:
-            if lock.locked():
-                lock.release()
+            lock.release()
             logging.info(f"🔓 Released lock for {ad_account_id} - page {page_name}")
     
     # Return a summary message after processing all pages
@@ -1,4 +1,3 @@
-import json
 import logging
 import re
 import pytz
@@ -8,10 +7,20 @@ from datetime import datetime
 from models.models import db, CampaignOffOnly
 from workers.campaign_fetcher import fetch_campaign
 from workers.on_off_functions.only_add_message import append_redis_message2
-from app import create_app
 from sqlalchemy.orm.attributes import flag_modified
-import requests
-from sqlalchemy.orm import scoped_session, sessionmaker
+from workers.graph_functions.campaign_query import fetch_campaign_list, fetch_matching_campaigns
+from workers.graph_functions.batch_writer import write_statuses
+from workers.graph_functions.verify_writes import verify_statuses
+from workers.graph_functions.circuit_breaker import is_circuit_open
+from workers.schedule_functions.pending_queue import queue_pending_schedule, run_coalesced
+from workers.schedule_functions.account_lock import AccountLock, LockLostError, CAMPAIGN_ONLY
+from workers.schedule_functions.schedule_index import CAMPAIGN_OFF_ONLY
+from workers.schedule_functions.schedule_dispatch import (
+    tick_lock, pending_minutes, load_due_campaigns, match_due_schedules,
+    claim_schedule_run, release_schedule_run, advance_watermark,
+)
+from workers.worker_session import worker_session
+from workers.schedule_dispatcher import enqueue_scheduled_task, release_ready_tasks
 
 
 # Set up Redis clients
@@ -31,103 +40,88 @@ redis_websocket = redis.Redis(
 
 manila_tz = pytz.timezone("Asia/Manila")
 
-def fetch_facebook_data(url, access_token):
-    """Helper function to fetch data from Facebook API and handle errors."""
-    try:
-        response = requests.get(url, headers={"Authorization": f"Bearer {access_token}"})
-        response.raise_for_status()
-        data = response.json()
+@shared_task
+def check_campaign_off_only():
+    """Trigger fetch_campaign_only for every CampaignOffOnly schedule due since the last processed minute, exactly once."""
+    now = datetime.now(manila_tz)
+    current_time = now.strftime("%Y-%m-%d %H:%M:%S")
 
-        if "error" in data:
-            logging.error(f"Facebook API Error: {data['error']}")
-            return {"error": data["error"]}  
+    lock = tick_lock(CAMPAIGN_OFF_ONLY)
+    if not lock.acquire(blocking=False):
+        return f"{current_time} - Previous check still running; the next run catches up this minute"
+
+    # Runs inside the worker's app context (FlaskTask); no per-tick app creation
+    SessionLocal = worker_session()
+    session = SessionLocal()
 
-        return data  
+    try:
+        minutes = pending_minutes(CAMPAIGN_OFF_ONLY, now)
+        campaigns, due = load_due_campaigns(CAMPAIGN_OFF_ONLY, CampaignOffOnly, session, minutes)
+        checked_ad_account_ids = []
+        retry_from = None
+
+        for campaign in campaigns:
+            user_id = campaign.user_id
+            ad_account_id = campaign.ad_account_id
+            access_token = campaign.access_token
+            schedule_data = campaign.schedule_data
+
+            if not user_id or not ad_account_id or not access_token:
+                logging.warning(f"[{current_time}] Skipping {ad_account_id}: Missing required fields.")
+                append_redis_message2(user_id, ad_account_id, f"[{current_time}] Skipping: Missing required fields.")
+                continue
+
+            if not isinstance(schedule_data, dict):
+                logging.warning(f"[{current_time}] Invalid schedule_data format for {ad_account_id}.")
+                append_redis_message2(user_id, ad_account_id, f"[{current_time}] Invalid schedule_data format.")
+                continue
+
+            matched_schedules = match_due_schedules(schedule_data, due.get(str(ad_account_id), []))
+
+            if matched_schedules and is_circuit_open(access_token, ad_account_id):
+                logging.warning(f"[{current_time}] Skipping {ad_account_id}: circuit open for its access token/ad account.")
+                append_redis_message2(user_id, ad_account_id, f"[{current_time}] Skipping: access token or ad account keeps failing authorization. Will retry later.")
+                continue
+
+            for schedule_key, schedule, minute in matched_schedules:
+                if not claim_schedule_run(CAMPAIGN_OFF_ONLY, ad_account_id, schedule_key, minute):
+                    continue  # Already fired for this date and minute
+
+                try:
+                    logging.info(f"[{current_time}] SCHEDULE DATA: {schedule}")
+                    expected_lag = enqueue_scheduled_task(
+                        fetch_campaign_only.name, user_id, ad_account_id, access_token, schedule,
+                        manila_tz.localize(minute).timestamp(),
+                    )
 
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching data from Facebook API: {e}")
-        return {"error": {"message": str(e), "type": "RequestException"}}
+                    late = f" (due {minute.strftime('%H:%M')})" if minute != minutes[-1] else ""
+                    logging.info(f"[{current_time}] Queued fetch_campaign for {ad_account_id}: {schedule}{late}, expected lag ~{int(expected_lag)}s")
+                    append_redis_message2(user_id, ad_account_id, f"[{current_time}] Queued fetch_campaign: {schedule}{late}, expected to start within ~{int(expected_lag)}s")
 
-@shared_task
-def check_campaign_off_only():
-    """Check campaigns in CampaignOffOnly and trigger fetch_campaign based on schedule data."""
-
-    app = create_app()
-    with app.app_context():
-        SessionLocal = scoped_session(sessionmaker(bind=db.engine))
-        session = SessionLocal()
-
-        now = datetime.now(manila_tz).strftime("%H:%M")
-        current_time = datetime.now(manila_tz).strftime("%Y-%m-%d %H:%M:%S")
-
-        try:
-            campaigns = session.query(CampaignOffOnly).all()
-            checked_ad_account_ids = []
-
-            for campaign in campaigns:
-                user_id = campaign.user_id
-                ad_account_id = campaign.ad_account_id
-                access_token = campaign.access_token
-                schedule_data = campaign.schedule_data
-
-                if not user_id or not ad_account_id or not access_token:
-                    logging.warning(f"[{current_time}] Skipping {ad_account_id}: Missing required fields.")
-                    append_redis_message2(user_id, ad_account_id, f"[{current_time}] Skipping: Missing required fields.")
-                    continue
-
-                if not isinstance(schedule_data, dict):
-                    logging.warning(f"[{current_time}] Invalid schedule_data format for {ad_account_id}.")
-                    append_redis_message2(user_id, ad_account_id, f"[{current_time}] Invalid schedule_data format.")
-                    continue
-
-                matched_schedules = [s for s in schedule_data.values() if s.get("time", "")[:5] == datetime.now().strftime("%H:%M") and s.get("status") != "Paused"]
-
-                if matched_schedules:
-                    try:
-                        for schedule in matched_schedules:
-                            logging.info(f"[{current_time}] SCHEDULE DATA: {schedule}")
-                            fetch_campaign_only.apply_async(args=[user_id, ad_account_id, access_token, schedule])
-                            logging.info(f"[{current_time}] Triggered fetch_campaign for {ad_account_id}: {schedule}")
-                            append_redis_message2(user_id, ad_account_id, f"[{current_time}] Triggered fetch_campaign: {schedule}")
-                        
+                    if ad_account_id not in checked_ad_account_ids:
                         checked_ad_account_ids.append(ad_account_id)
-                    except Exception as e:
-                        logging.error(f"[{current_time}] Error triggering fetch_campaign for {ad_account_id}: {e}")
-                        append_redis_message2(user_id, ad_account_id, f"[{current_time}] Error: {e}")
-
-            return f"{current_time} - Checked OFF Campaigns for Ad-Account-IDs: {checked_ad_account_ids}"
+                except Exception as e:
+                    release_schedule_run(CAMPAIGN_OFF_ONLY, ad_account_id, schedule_key, minute)
+                    retry_from = min(retry_from or minute, minute)
+                    logging.error(f"[{current_time}] Error triggering fetch_campaign for {ad_account_id}: {e}")
+                    append_redis_message2(user_id, ad_account_id, f"[{current_time}] Error: {e}")
 
-        except Exception as e:
-            logging.error(f"Error fetching campaigns: {e}")
-            return f"Error fetching campaigns: {e}"
+        advance_watermark(CAMPAIGN_OFF_ONLY, minutes, retry_from)
 
-        finally:
-            session.close()
-            SessionLocal.remove()
+        # Spread the burst: the dispatcher releases what the concurrency budgets allow
+        release_ready_tasks()
+        return f"{current_time} - Checked OFF Campaigns for Ad-Account-IDs: {checked_ad_account_ids}"
 
-FACEBOOK_API_VERSION = "v22.0"
-FACEBOOK_GRAPH_URL = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}"
+    except Exception as e:
+        logging.error(f"Error fetching campaigns: {e}")
+        return f"Error fetching campaigns: {e}"
 
-def update_facebook_status(user_id, ad_account_id, entity_id, new_status, access_token):
-    """Update the status of a Facebook campaign or ad set using the Graph API."""
-    url = f"{FACEBOOK_GRAPH_URL}/{entity_id}"
-    payload = {"status": new_status}
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    finally:
+        session.close()
+        SessionLocal.remove()
+        if lock.locked():
+            lock.release()
 
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        logging.info(f"Successfully updated {entity_id} to {new_status}")
-        append_redis_message2(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Successfully updated {entity_id} to {new_status}")
-        return True
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error updating {entity_id} to {new_status}: {e}")
-        append_redis_message2(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error updating {entity_id} to {new_status}: {e}")
-        return False
-    
 def normalize_text(text):
     """Replace all non-alphanumeric characters with spaces and normalize capitalization."""
     return " ".join(re.sub(r"[^a-zA-Z0-9]+", "", text).lower().split())
@@ -136,8 +130,7 @@ def normalize_text(text):
 def fetch_campaign_only(user_id, ad_account_id, access_token, matched_schedule):
     """Fetch campaigns, update only those in schedule, and store in CampaignOffOnly."""
 
-    lock_key = f"lock:fetch_campaign_only:{ad_account_id}"
-    lock = redis_client.lock(lock_key, timeout=300)
+    lock = AccountLock(CAMPAIGN_ONLY, ad_account_id)
     pending_schedules_key = f"pending_schedules_only:{ad_account_id}"
 
     append_redis_message2(
@@ -146,37 +139,75 @@ def fetch_campaign_only(user_id, ad_account_id, access_token, matched_schedule):
         f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Fetching Campaign Data for {ad_account_id}, schedule {matched_schedule}",
     )
 
+    if is_circuit_open(access_token, ad_account_id):
+        message = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Skipping {ad_account_id}: access token or ad account keeps failing authorization."
+        append_redis_message2(user_id, ad_account_id, message)
+        return message
+
     if not lock.acquire(blocking=False):
-        redis_client.rpush(pending_schedules_key, json.dumps(matched_schedule))
+        queue_pending_schedule(redis_client, pending_schedules_key, user_id, access_token, matched_schedule)
         return f"Fetch already in progress for {ad_account_id}, queued process_scheduled_campaigns_only"
 
+    # The lock holder also runs whatever gets queued for this account meanwhile
+    return run_coalesced(
+        redis_client, lock, pending_schedules_key, user_id, access_token, matched_schedule,
+        only_compatibility_key,
+        lambda group_user_id, group_access_token, schedules: fetch_campaign_only_group(
+            group_user_id, ad_account_id, group_access_token, schedules, lock
+        ),
+    )
+
+def only_compatibility_key(schedule):
+    """Any two ON/OFF-by-name schedules can share one campaign listing."""
+    return None
+
+def fetch_campaign_only_group(user_id, ad_account_id, access_token, schedules, lock):
+    """Fetch the named campaigns once for queued schedules, then apply each schedule to that snapshot."""
+    if is_circuit_open(access_token, ad_account_id):
+        message = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Skipping {ad_account_id}: access token or ad account keeps failing authorization."
+        append_redis_message2(user_id, ad_account_id, message)
+        return message
+
     try:
-        scheduled_campaign_names = {normalize_text(name) for name in matched_schedule.get("campaign_name", [])}
-        on_off_value = matched_schedule.get("on_off", "").upper()  # Ensure it is a string
-        target_status = "ACTIVE" if on_off_value == "ON" else "PAUSED"
+        campaign_names = list(dict.fromkeys(name for schedule in schedules for name in schedule.get("campaign_name", [])))
+        if len(schedules) > 1:
+            append_redis_message2(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Running {len(schedules)} queued schedules against one campaign fetch")
+
+        # Name filters are pushed down to Graph; the normalized comparison stays local for exactness
+        snapshot, campaigns_error = fetch_matching_campaigns(
+            lambda params: fetch_campaign_list(ad_account_id, access_token, params=params),
+            campaign_names,
+            lambda campaign_name, name: normalize_text(campaign_name) == normalize_text(name),
+        )
+        if campaigns_error:
+            raise Exception(campaigns_error.get("message", "Unknown API error"))
 
+        results = [apply_only_schedule(user_id, ad_account_id, access_token, schedule, snapshot, lock) for schedule in schedules]
+        return results[0] if len(results) == 1 else "; ".join(results)
 
-        url = f"{FACEBOOK_GRAPH_URL}/act_{ad_account_id}/campaigns?fields=id,name,status"
-        campaigns_data = {}
+    except LockLostError:
+        # run_coalesced returns the schedules to the pending list
+        raise
+    except Exception as e:
+        return record_only_failure(user_id, ad_account_id, e)
 
-        while url:
-            response_data = fetch_facebook_data(url, access_token)
-            if "error" in response_data:
-                raise Exception(response_data["error"].get("message", "Unknown API error"))
+def apply_only_schedule(user_id, ad_account_id, access_token, matched_schedule, snapshot, lock):
+    """Turn one schedule's campaigns ON/OFF using the shared snapshot and store the outcome."""
+    try:
+        scheduled_campaign_names = {normalize_text(name) for name in matched_schedule.get("campaign_name", [])}
+        on_off_value = matched_schedule.get("on_off", "").upper()  # Ensure it is a string
+        target_status = "ACTIVE" if on_off_value == "ON" else "PAUSED"
 
-            campaign_batch = {
-                campaign["id"]: {
-                    "NAME": campaign["name"],
-                    "CURRENT_STATUS": campaign["status"],
-                    "TARGET_STATUS": target_status,
-                    "UPDATED": False,
-                }
-                for campaign in response_data.get("data", [])
-                if normalize_text(campaign["name"]) in scheduled_campaign_names
+        campaigns_data = {
+            campaign["id"]: {
+                "NAME": campaign["name"],
+                "CURRENT_STATUS": campaign["status"],
+                "TARGET_STATUS": target_status,
+                "UPDATED": False,
             }
-
-            campaigns_data.update(campaign_batch)
-            url = response_data.get("paging", {}).get("next")
+            for campaign in snapshot
+            if normalize_text(campaign["name"]) in scheduled_campaign_names
+        }
 
         with db.session.begin():
             campaign_entry = CampaignOffOnly.query.filter_by(ad_account_id=ad_account_id).first()
@@ -197,12 +228,29 @@ def fetch_campaign_only(user_id, ad_account_id, access_token, matched_schedule):
                     last_check_message="Campaigns fetched but not updated yet.",
                 )
                 db.session.add(campaign_entry)
-            db.session.commit()
+            lock.commit(db.session)
 
         append_redis_message2(
             user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Filtered campaigns saved."
         )
 
+        # Send every required status change in batched round-trips
+        write_results = write_statuses(
+            access_token,
+            [
+                (campaign_id, target_status)
+                for campaign_id, campaign_info in campaigns_data.items()
+                if campaign_info["CURRENT_STATUS"] != target_status
+            ],
+            lambda message: append_redis_message2(user_id, ad_account_id, message),
+            before_write=lock.ensure_held,
+        )
+
+        # Read every successful write back in one batched call
+        observed = verify_statuses(
+            access_token, {campaign_id: target_status for campaign_id, success in write_results.items() if success}
+        )
+
         updated_campaigns = {}
         for campaign_id, campaign_info in campaigns_data.items():
             campaign_name = campaign_info["NAME"]
@@ -213,12 +261,10 @@ def fetch_campaign_only(user_id, ad_account_id, access_token, matched_schedule):
                 success = "REMAINS"
                 new_status = current_status  # ✅ Ensure new_status is set
             else:
-                success = update_facebook_status(user_id, ad_account_id, campaign_id, target_status, access_token)
+                success = write_results.get(campaign_id, False)
 
                 if success:
-                    new_status = fetch_facebook_data(f"{FACEBOOK_GRAPH_URL}/{campaign_id}?fields=status", access_token).get(
-                        "status", target_status
-                    )
+                    new_status = observed.get(campaign_id) or target_status
                 else:
                     new_status = current_status
 
@@ -238,6 +284,11 @@ def fetch_campaign_only(user_id, ad_account_id, access_token, matched_schedule):
                 "STATUS_MESSAGE": status_message,
             }
 
+        # Later schedules in the same batch see the statuses this one left behind
+        for campaign in snapshot:
+            if campaign["id"] in updated_campaigns:
+                campaign["status"] = updated_campaigns[campaign["id"]]["CURRENT_STATUS"]
+
         with db.session.begin():
             campaign_entry = CampaignOffOnly.query.filter_by(ad_account_id=ad_account_id).first()
             if campaign_entry:
@@ -246,37 +297,37 @@ def fetch_campaign_only(user_id, ad_account_id, access_token, matched_schedule):
                 campaign_entry.last_check_status = "Success"
                 campaign_entry.last_check_message = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaigns updated."
                 flag_modified(campaign_entry, "campaigns_data")
-                db.session.commit()
+                lock.commit(db.session)
 
         append_redis_message2(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaign updates saved.")
         return f"Fetched and updated selected campaigns for {ad_account_id}."
 
+    except LockLostError:
+        raise
     except Exception as e:
-        error_message = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error fetching campaigns for {ad_account_id}: {e}"
-        logging.error(error_message)
-        append_redis_message2(user_id, ad_account_id, f"ERROR: {error_message}")
-
-        with db.session.begin():
-            campaign_entry = CampaignOffOnly.query.filter_by(ad_account_id=ad_account_id).first()
-            if campaign_entry:
-                campaign_entry.last_time_checked = datetime.now()
-                campaign_entry.last_check_status = "Failed"
-                campaign_entry.last_check_message = error_message
-                db.session.commit()
-            else:
-                new_entry = CampaignOffOnly(
-                    ad_account_id=ad_account_id,
-                    campaigns_data={},
-                    last_time_checked=datetime.now(),
-                    last_check_status="Failed",
-                    last_check_message=error_message,
-                )
-                db.session.add(new_entry)
-                db.session.commit()
-
-        return error_message
+        return record_only_failure(user_id, ad_account_id, e)
+
+def record_only_failure(user_id, ad_account_id, error):
+    error_message = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error fetching campaigns for {ad_account_id}: {error}"
+    logging.error(error_message)
+    append_redis_message2(user_id, ad_account_id, f"ERROR: {error_message}")
+
+    with db.session.begin():
+        campaign_entry = CampaignOffOnly.query.filter_by(ad_account_id=ad_account_id).first()
+        if campaign_entry:
+            campaign_entry.last_time_checked = datetime.now()
+            campaign_entry.last_check_status = "Failed"
+            campaign_entry.last_check_message = error_message
+            db.session.commit()
+        else:
+            new_entry = CampaignOffOnly(
+                ad_account_id=ad_account_id,
+                campaigns_data={},
+                last_time_checked=datetime.now(),
+                last_check_status="Failed",
+                last_check_message=error_message,
+            )
+            db.session.add(new_entry)
+            db.session.commit()
 
-    finally:
-        if lock.locked():
-            lock.release()
-        logging.info(f"🔓 Released lock for {ad_account_id}")
+    return error_message
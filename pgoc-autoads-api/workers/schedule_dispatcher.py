@@ -0,0 +1,247 @@
+import os
+import json
+import math
+import time
+import uuid
+import logging
+import redis
+from celery import shared_task, current_app
+from celery.signals import task_postrun
+from models.models import CampaignsScheduled, CampaignOffOnly
+from workers.graph_functions.circuit_breaker import token_fingerprint
+from workers.graph_functions.rate_limiter import APP_SCOPE, headroom, token_scope
+from workers.schedule_functions.schedule_index import redis_schedule as redis_dispatch
+from workers.schedule_functions.pending_queue import resolve_access_token
+
+DISPATCH_QUEUE_KEY = "dispatch_queue"
+DISPATCH_INFLIGHT_KEY = "dispatch_inflight"
+DISPATCH_LEASE_PREFIX = "dispatch_lease"
+DISPATCH_AVG_SECONDS_KEY = "dispatch_stats:avg_seconds"
+# Task ids handed out by the dispatcher, so task_postrun can ignore every other task
+DISPATCH_TASK_ID_PREFIX = "dispatch-"
+
+# Scheduled tasks allowed to run at once, across all workers and per access token.
+# The per-token budget shrinks with that token's remaining Graph headroom (see rate_limiter).
+GLOBAL_DISPATCH_BUDGET = int(os.getenv("SCHEDULE_DISPATCH_CONCURRENCY", 8))
+PER_TOKEN_DISPATCH_BUDGET = int(os.getenv("SCHEDULE_DISPATCH_PER_TOKEN", 3))
+
+# A dispatched task that never reports back frees its slot after this
+LEASE_SECONDS = 900
+# Starting estimate of one scheduled task's run time, refined as tasks finish
+DEFAULT_TASK_SECONDS = 30.0
+AVG_SMOOTHING = 0.2
+# Queue entries read per page; a release pass pages on until the budget is used or the queue ends
+RELEASE_SCAN_LIMIT = 200
+
+
+def inflight_token_key(fingerprint):
+    return f"{DISPATCH_INFLIGHT_KEY}:{fingerprint}"
+
+
+def average_task_seconds():
+    try:
+        return float(redis_dispatch.get(DISPATCH_AVG_SECONDS_KEY) or DEFAULT_TASK_SECONDS)
+    except (redis.RedisError, ValueError):
+        return DEFAULT_TASK_SECONDS
+
+
+def expected_lag_seconds(position):
+    """Rough wait before the action at 0-based queue `position` starts."""
+    return math.ceil((position + 1) / GLOBAL_DISPATCH_BUDGET) * average_task_seconds()
+
+
+def enqueue_scheduled_task(task_name, user_id, ad_account_id, access_token, schedule, due_at):
+    """Queue `task_name(user_id, ad_account_id, access_token, schedule)` for the dispatcher
+    instead of sending it straight to the workers.
+
+    The entry keeps the token's fingerprint, never the token; it is resolved
+    again when the task is released. `due_at` is the epoch second the action
+    was due; the most overdue actions are released first. Returns the
+    expected seconds until it starts.
+    """
+    entry = json.dumps({
+        "id": uuid.uuid4().hex,
+        "task": task_name,
+        "user_id": user_id,
+        "ad_account_id": ad_account_id,
+        "schedule": schedule,
+        "token": token_fingerprint(access_token),
+        "due_at": due_at,
+    }, default=str)
+    redis_dispatch.zadd(DISPATCH_QUEUE_KEY, {entry: due_at})
+    position = redis_dispatch.zcount(DISPATCH_QUEUE_KEY, "-inf", due_at) - 1
+    return expected_lag_seconds(position)
+
+
+def active_leases(key, now):
+    redis_dispatch.zremrangebyscore(key, "-inf", now)
+    return redis_dispatch.zcard(key)
+
+
+def scheduled_access_token(fingerprint, user_id, ad_account_id):
+    """The token behind a queued entry: the account's schedule rows first, then the user's saved tokens."""
+    known_tokens = []
+    for model in (CampaignsScheduled, CampaignOffOnly):
+        try:
+            account_id = model.ad_account_id.type.python_type(ad_account_id)
+        except (TypeError, ValueError):
+            continue
+        known_tokens += [row.access_token for row in model.query.filter(model.ad_account_id == account_id).all()]
+    return resolve_access_token(fingerprint, user_id, known_tokens)
+
+
+def task_args(item):
+    """Celery args for a queued entry, or None when its token can no longer be found."""
+    if "args" in item:
+        return item["args"]  # Entries queued before tokens were fingerprinted
+    access_token = scheduled_access_token(item["token"], item["user_id"], item["ad_account_id"])
+    if access_token is None:
+        return None
+    return [item["user_id"], item["ad_account_id"], access_token, item["schedule"]]
+
+
+def per_token_budget(fingerprint):
+    """PER_TOKEN_DISPATCH_BUDGET scaled by the token's Graph headroom (or the app's, if lower).
+
+    0 while Graph has the token or the app paused.
+    """
+    remaining = min(headroom(token_scope(fingerprint)), headroom(APP_SCOPE))
+    if remaining <= 0:
+        return 0
+    return max(1, round(PER_TOKEN_DISPATCH_BUDGET * remaining))
+
+
+def release_ready_tasks(blocking=True):
+    """Send queued tasks to the workers while the global and per-token budgets allow.
+
+    Entries whose token is at its budget stay queued without blocking the ones
+    behind them, however far down the queue those are. With `blocking=False`
+    the pass is skipped when another one holds the dispatcher lock.
+    Returns (released, waiting, expected drain seconds).
+    """
+    lock = redis_dispatch.lock("lock:schedule_dispatcher", timeout=60)
+    if not lock.acquire(blocking=blocking, blocking_timeout=5):
+        return 0, None, None
+
+    try:
+        now = time.time()
+        running = active_leases(DISPATCH_INFLIGHT_KEY, now)
+        token_budget = {}
+        token_running = {}
+        released = 0
+        # Entries skipped so far; released ones leave the queue, so only these move the page window
+        offset = 0
+        send_failed = False
+
+        while running < GLOBAL_DISPATCH_BUDGET and not send_failed:
+            page = redis_dispatch.zrange(DISPATCH_QUEUE_KEY, offset, offset + RELEASE_SCAN_LIMIT - 1)
+            if not page:
+                break
+
+            for entry in page:
+                if running >= GLOBAL_DISPATCH_BUDGET:
+                    break
+
+                item = json.loads(entry)
+                fingerprint = item["token"]
+                if fingerprint not in token_running:
+                    token_running[fingerprint] = active_leases(inflight_token_key(fingerprint), now)
+                    token_budget[fingerprint] = per_token_budget(fingerprint)
+                if token_running[fingerprint] >= token_budget[fingerprint]:
+                    offset += 1
+                    continue
+
+                args = task_args(item)
+                if args is None:
+                    logging.error(f"Dropping queued {item['task']} for {item.get('ad_account_id')}: its access token is no longer stored")
+                    redis_dispatch.zrem(DISPATCH_QUEUE_KEY, entry)
+                    continue
+
+                task_id = f"{DISPATCH_TASK_ID_PREFIX}{uuid.uuid4().hex}"
+                pipe = redis_dispatch.pipeline(transaction=True)
+                pipe.zrem(DISPATCH_QUEUE_KEY, entry)
+                pipe.zadd(DISPATCH_INFLIGHT_KEY, {task_id: now + LEASE_SECONDS})
+                pipe.zadd(inflight_token_key(fingerprint), {task_id: now + LEASE_SECONDS})
+                pipe.expire(inflight_token_key(fingerprint), LEASE_SECONDS)
+                pipe.set(f"{DISPATCH_LEASE_PREFIX}:{task_id}", json.dumps({"token": fingerprint, "started": now}), ex=LEASE_SECONDS)
+                pipe.execute()
+
+                try:
+                    current_app.send_task(item["task"], args=args, task_id=task_id)
+                except Exception as e:
+                    # Put it back and free the slot; the next pass retries it
+                    logging.error(f"Could not send {item['task']}: {e}")
+                    free_lease(task_id)
+                    redis_dispatch.zadd(DISPATCH_QUEUE_KEY, {entry: item["due_at"]})
+                    send_failed = True
+                    break
+
+                running += 1
+                token_running[fingerprint] += 1
+                released += 1
+                logging.info(f"Dispatched {item['task']} {int(now - item['due_at'])}s after it was due")
+
+        waiting = redis_dispatch.zcard(DISPATCH_QUEUE_KEY)
+        drain_seconds = expected_lag_seconds(waiting - 1) if waiting else 0
+        if waiting:
+            logging.info(
+                f"Schedule dispatcher: {running}/{GLOBAL_DISPATCH_BUDGET} running, {waiting} waiting, "
+                f"expected to drain in ~{int(drain_seconds)}s"
+            )
+        return released, waiting, drain_seconds
+
+    finally:
+        if lock.locked():
+            lock.release()
+
+
+def free_lease(task_id):
+    """Release a dispatched task's slot. Returns the lease info, or None if it was not ours."""
+    raw = redis_dispatch.get(f"{DISPATCH_LEASE_PREFIX}:{task_id}")
+    if not raw:
+        return None
+
+    lease = json.loads(raw)
+    pipe = redis_dispatch.pipeline(transaction=True)
+    pipe.zrem(DISPATCH_INFLIGHT_KEY, task_id)
+    pipe.zrem(inflight_token_key(lease["token"]), task_id)
+    pipe.delete(f"{DISPATCH_LEASE_PREFIX}:{task_id}")
+    pipe.execute()
+    return lease
+
+
+@task_postrun.connect
+def release_finished_task(sender=None, task_id=None, state=None, **kwargs):
+    """Free the finished task's slot, fold its duration into the estimate and fill the slot.
+
+    Runs after every Celery task, so anything the dispatcher did not release
+    returns before touching Redis, and the refill never waits on the lock: a
+    pass already running, or the beat safety net, picks up the free slot.
+    """
+    if not task_id or not task_id.startswith(DISPATCH_TASK_ID_PREFIX):
+        return
+    if state == "RETRY":
+        return  # The retry runs under the same task id and keeps the slot
+    try:
+        lease = free_lease(task_id)
+        if not lease:
+            return
+
+        seconds = time.time() - lease["started"]
+        average = average_task_seconds()
+        redis_dispatch.set(DISPATCH_AVG_SECONDS_KEY, average + AVG_SMOOTHING * (seconds - average))
+        # Releasing resolves tokens from the DB; postrun runs outside the task's app context
+        with sender.flask_app.app_context():
+            release_ready_tasks(blocking=False)
+
+    except (redis.RedisError, ValueError) as e:
+        logging.warning(f"Could not release dispatch slot for {task_id}: {e}")
+
+
+@shared_task
+def dispatch_scheduled_tasks():
+    """Beat safety net: release queued tasks if no finishing task did."""
+    released, waiting, drain_seconds = release_ready_tasks()
+    if waiting is None:
+        return "Dispatcher busy"
+    return f"Released {released} scheduled tasks, {waiting} waiting (expected lag ~{int(drain_seconds)}s)"
@@ -0,0 +1,162 @@
+import uuid
+import logging
+import threading
+import redis
+from sqlalchemy import text
+
+# Scheduler database (db 2); every per-account worker lock lives here under one key scheme
+redis_locks = redis.StrictRedis(
+    host="redisAds",
+    port=6379,
+    db=2,
+    decode_responses=True
+)
+
+ACCOUNT_LOCK_PREFIX = "account_lock"
+
+# Short lease, renewed by a watchdog while the task runs; a dead worker frees it within this
+LOCK_TTL_SECONDS = 60
+# Fence counters outlive any holder by far; a reset after this cannot match a live holder's fence
+FENCE_TTL_SECONDS = 7 * 86400
+
+# Namespaces: one per kind of work, so unrelated tasks never block each other
+CAMPAIGN_FETCH = "campaign_fetch"  # campaign_fetcher.fetch_campaign
+ADSETS_FETCH = "adsets_fetch"  # on_off_adsets_worker.fetch_adsets
+CAMPAIGN_ONLY = "campaign_only"  # only_campaign_fetcher.fetch_campaign_only
+CAMPAIGN_NAME_ON_OFF = "campaign_name_on_off"  # on_off_campaign_name_worker.fetch_campaign_off
+PAGE_NAME_ON_OFF = "page_name_on_off"  # on_off_page_worker.fetch_campaign_off
+
+# Take the lease and the next fence in one step; the value is "{fence}:{token}"
+ACQUIRE_SCRIPT = redis_locks.register_script("""
+if not redis.call('set', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return false
+end
+local fence = redis.call('incr', KEYS[2])
+redis.call('expire', KEYS[2], ARGV[3])
+redis.call('set', KEYS[1], fence .. ':' .. ARGV[1], 'EX', ARGV[2])
+return fence
+""")
+
+RENEW_SCRIPT = redis_locks.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+""")
+
+RELEASE_SCRIPT = redis_locks.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+""")
+
+
+class LockLostError(Exception):
+    """Raised before a write when this task is known to no longer hold its lock."""
+
+
+def account_lock_key(namespace, ad_account_id, *parts):
+    return ":".join([ACCOUNT_LOCK_PREFIX, namespace, f"act_{str(ad_account_id).replace('act_', '')}", *map(str, parts)])
+
+
+def fence_key(lock_name):
+    return f"{lock_name}:fence"
+
+
+class AccountLock:
+    """Non-blocking Redis lease lock with a renewal watchdog and fencing tokens.
+
+    Every successful acquire takes the next value of a per-lock counter (the
+    fence), stored in the lock value. ensure_held() is called right before DB
+    or Graph writes and raises LockLostError once a newer holder has taken a
+    fence, whether or not our lease has expired. commit() does the same check
+    inside the DB transaction under a per-lock advisory lock, so a stale holder
+    can never commit after a newer holder's commit. Graph cannot check fences
+    itself; there the check runs immediately before each write request.
+    release() only deletes the lock if it is still ours.
+    """
+
+    def __init__(self, namespace, ad_account_id, *parts, ttl=LOCK_TTL_SECONDS):
+        self.name = account_lock_key(namespace, ad_account_id, *parts)
+        self.ttl = ttl
+        self.value = None
+        self.fence = None
+        self.lost = threading.Event()
+        self.stopped = threading.Event()
+        self.watchdog = None
+
+    def acquire(self, blocking=False):
+        """Try once to take the lock (always non-blocking). Returns True on success."""
+        token = uuid.uuid4().hex
+        fence = ACQUIRE_SCRIPT(keys=[self.name, fence_key(self.name)], args=[token, self.ttl, FENCE_TTL_SECONDS])
+        if fence is None:
+            return False
+
+        self.fence = str(fence)
+        self.value = f"{fence}:{token}"
+        # Fresh events per lease: a previous lease's watchdog, mid-renewal, only ever touches its own
+        self.lost = threading.Event()
+        self.stopped = threading.Event()
+        self.watchdog = threading.Thread(
+            target=self.renew_until_released,
+            args=(self.value, self.stopped, self.lost),
+            name=f"watchdog {self.name}",
+            daemon=True,
+        )
+        self.watchdog.start()
+        return True
+
+    def renew_until_released(self, value, stopped, lost):
+        while not stopped.wait(self.ttl / 3):
+            try:
+                renewed = RENEW_SCRIPT(keys=[self.name], args=[value, self.ttl * 1000])
+            except redis.RedisError as e:
+                logging.warning(f"Could not renew {self.name}: {e}")
+                continue
+            if not renewed:
+                lost.set()
+                logging.error(f"Lost {self.name} while still running")
+                return
+
+    def owned(self):
+        if self.value is None or self.lost.is_set():
+            return False
+        return redis_locks.get(self.name) == self.value
+
+    def fence_current(self):
+        """True while no newer holder has taken a fence for this lock."""
+        return self.fence is not None and redis_locks.get(fence_key(self.name)) == self.fence
+
+    def ensure_held(self):
+        """Raise LockLostError once a newer holder has been fenced in."""
+        if not self.fence_current():
+            raise LockLostError(f"Lock {self.name} was taken over (fence {self.fence}); refusing to write")
+
+    def commit(self, session):
+        """Commit `session` only if our fence is still current.
+
+        The transaction-scoped advisory lock serializes fenced commits for this
+        lock name, so a newer holder's commit cannot slip in between the fence
+        check and ours; on a stale fence the transaction is rolled back.
+        """
+        session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": self.name})
+        try:
+            self.ensure_held()
+        except LockLostError:
+            session.rollback()
+            raise
+        session.commit()
+
+    def release(self):
+        """Stop renewing and delete the lock if it is still ours. Never raises."""
+        self.stopped.set()
+        value, self.value = self.value, None
+        self.fence = None
+        if value is None:
+            return
+        try:
+            if not RELEASE_SCRIPT(keys=[self.name], args=[value]):
+                logging.warning(f"{self.name} had already expired or changed hands")
+        except redis.RedisError as e:
+            logging.error(f"Could not release {self.name}: {e}")
@@ -0,0 +1,130 @@
+from collections import Counter, namedtuple
+import numpy as np
+
+# CPP conventions shared with the insights readers: inf = spend without checkouts, 0 = no spend
+NO_CHECKOUTS = float("inf")
+
+# Decision reasons
+NO_SALES = "no_sales"
+NO_SPEND = "no_spend"
+AT_OR_ABOVE = "at_or_above_threshold"
+BELOW = "below_threshold"
+
+ADSET_LEVEL = "adset"
+CAMPAIGN_LEVEL = "campaign"
+
+Decision = namedtuple("Decision", "entity_id name campaign_id current_status target_status reason cpp")
+
+
+def adset_rows(campaigns_data, campaign_code, matcher):
+    """(id, name, campaign_id, status, cpp) for every adset of the campaigns matching `campaign_code`."""
+    return [
+        (adset_id, adset_info.get("NAME", "Unknown"), campaign_id, adset_info.get("STATUS", ""), adset_info.get("CPP", 0))
+        for campaign_id, campaign_info in campaigns_data.items()
+        if matcher(campaign_info.get("campaign_name", ""), campaign_code)
+        for adset_id, adset_info in campaign_info.get("ADSETS", {}).items()
+    ]
+
+
+def campaign_rows(campaign_data):
+    """(id, name, id, status, cpp) for every campaign, in the same shape as adset_rows."""
+    return [
+        (campaign_id, info.get("campaign_name", ""), campaign_id, info.get("STATUS", ""), info.get("CPP", 0))
+        for campaign_id, info in campaign_data.items()
+    ]
+
+
+def target_arrays(level, cpp, cpp_metric, on_off):
+    """(target, reason) string arrays for every row at once; an empty target means leave it alone.
+
+    `cpp_metric` and `on_off` are per-row arrays, so rows of different
+    schedules and accounts share one pass. Conditions are listed in the same
+    precedence the per-item rules used.
+    """
+    turn_on = on_off == "ON"
+    turn_off = on_off == "OFF"
+    above = cpp >= cpp_metric
+
+    if level == ADSET_LEVEL:
+        no_sales = np.isposinf(cpp)
+        no_spend = cpp == 0
+        target = np.select(
+            [no_sales, no_spend, above & (turn_on | turn_off), ~above & turn_on],
+            ["PAUSED", "", "PAUSED", "ACTIVE"],
+            default="",
+        )
+        reason = np.select([no_sales, no_spend, above], [NO_SALES, NO_SPEND, AT_OR_ABOVE], default=BELOW)
+    else:
+        target = np.select([turn_on & ~above, turn_off & above], ["ACTIVE", "PAUSED"], default="")
+        reason = np.where(above, AT_OR_ABOVE, BELOW)
+
+    return target, reason
+
+
+def evaluate_batches(level, batches):
+    """Decide every row of every (rows, cpp_metric, on_off) batch in one array pass.
+
+    Batches may come from different schedules and ad accounts. Returns one
+    Decision list per batch, in batch order; nothing is written here.
+    """
+    sizes = [len(rows) for rows, _, _ in batches]
+    rows = [row for batch_rows, _, _ in batches for row in batch_rows]
+    if not rows:
+        return [[] for _ in batches]
+
+    cpp = np.array([NO_CHECKOUTS if row[4] is None else float(row[4]) for row in rows])
+    cpp_metric = np.repeat(np.array([float(metric) for _, metric, _ in batches]), sizes)
+    on_off = np.repeat(np.array([on_off or "" for _, _, on_off in batches]), sizes)
+    target, reason = target_arrays(level, cpp, cpp_metric, on_off)
+
+    decisions = [
+        Decision(entity_id, name, campaign_id, status, row_target or None, row_reason, row_cpp)
+        for (entity_id, name, campaign_id, status, row_cpp), row_target, row_reason
+        in zip(rows, target.tolist(), reason.tolist())
+    ]
+    bounds = np.cumsum([0] + sizes).tolist()
+    return [decisions[first:last] for first, last in zip(bounds, bounds[1:])]
+
+
+def evaluate_adsets(campaigns_data, campaign_code, cpp_metric, on_off, matcher):
+    return evaluate_batches(ADSET_LEVEL, [(adset_rows(campaigns_data, campaign_code, matcher), cpp_metric, on_off)])[0]
+
+
+def evaluate_campaigns(campaign_data, cpp_metric, on_off):
+    return evaluate_batches(CAMPAIGN_LEVEL, [(campaign_rows(campaign_data), cpp_metric, on_off)])[0]
+
+
+def needs_write(decision):
+    return bool(decision.target_status) and decision.target_status != decision.current_status
+
+
+def pending_writes(decisions):
+    """The compact list for the writer stage: decisions that actually change a status."""
+    return [decision for decision in decisions if needs_write(decision)]
+
+
+def summarize(decisions, entity="adsets"):
+    """One line describing a whole evaluation, instead of a message per entity."""
+    writes = pending_writes(decisions)
+    by_target = Counter(decision.target_status for decision in writes)
+    unchanged = [decision for decision in decisions if not needs_write(decision)]
+    reasons = ", ".join(
+        f"{count} {reason.replace('_', ' ')}"
+        for reason, count in Counter(decision.reason for decision in unchanged).items()
+    )
+    return (
+        f"Evaluated {len(decisions)} {entity}: {by_target.get('PAUSED', 0)} to turn OFF, "
+        f"{by_target.get('ACTIVE', 0)} to turn ON, {len(unchanged)} unchanged"
+        + (f" ({reasons})" if reasons else "")
+    )
+
+
+def describe(decision, cpp_metric):
+    """Human-readable reason for one decision, for the per-write status messages."""
+    if decision.reason == NO_SALES:
+        return "No sales/checkouts - turning OFF"
+    if decision.reason == NO_SPEND:
+        return "No spend data (CPP = 0)"
+    comparison = ">=" if decision.reason == AT_OR_ABOVE else "<"
+    action = {"PAUSED": "turning OFF", "ACTIVE": "turning ON"}.get(decision.target_status, "no change")
+    return f"CPP ${decision.cpp:.2f} {comparison} threshold ${cpp_metric} - {action}"
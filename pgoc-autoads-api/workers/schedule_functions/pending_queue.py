@@ -0,0 +1,144 @@
+import json
+import logging
+from models.models import AccessToken
+from workers.graph_functions.circuit_breaker import token_fingerprint
+from workers.schedule_functions.account_lock import LockLostError
+
+# Queued schedules older than this are dropped rather than replayed long after they were due
+PENDING_TTL_SECONDS = 3600
+
+
+def queue_pending_schedule(redis_client, pending_key, user_id, access_token, schedule):
+    """Queue a schedule for the task currently holding the account's lock."""
+    requeue_schedules(redis_client, pending_key, [(user_id, access_token, [schedule])])
+
+
+def requeue_schedules(redis_client, pending_key, groups):
+    """RPUSH every schedule of [(user_id, access_token, [schedule, ...]), ...] onto the pending list.
+
+    Entries carry the token's fingerprint, never the token itself; the
+    holder resolves it again when draining (see resolve_access_token).
+    """
+    entries = [
+        json.dumps({"user_id": user_id, "token": token_fingerprint(access_token), "schedule": schedule})
+        for user_id, access_token, schedules in groups
+        for schedule in schedules
+    ]
+    if not entries:
+        return
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.rpush(pending_key, *entries)
+    pipe.expire(pending_key, PENDING_TTL_SECONDS)
+    pipe.execute()
+
+
+def drain_pending_schedules(redis_client, pending_key):
+    """Atomically take every queued entry off the list."""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.lrange(pending_key, 0, -1)
+    pipe.delete(pending_key)
+    raw_entries, _ = pipe.execute()
+
+    entries = []
+    for raw in raw_entries:
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            logging.error(f"Dropping unreadable entry from {pending_key}: {raw}")
+            continue
+        # Entries queued before user/token were stored hold just the schedule
+        entries.append(entry if "schedule" in entry else {"schedule": entry})
+    return entries
+
+
+def resolve_access_token(fingerprint, user_id, known_tokens=()):
+    """The token behind `fingerprint`: one of `known_tokens`, else one of the user's saved tokens. None if not found."""
+    for access_token in known_tokens:
+        if access_token and token_fingerprint(access_token) == fingerprint:
+            return access_token
+    try:
+        saved = AccessToken.query.filter_by(user_id=user_id).all() + AccessToken.get_client_accessible_tokens(user_id)
+    except Exception as e:
+        logging.error(f"Could not look up saved access tokens for user {user_id}: {e}")
+        return None
+    for row in saved:
+        if token_fingerprint(row.access_token) == fingerprint:
+            return row.access_token
+    return None
+
+
+def coalesce_pending(entries, compatibility_key, default_user_id, default_access_token):
+    """Group queued schedules that one fetch can serve.
+
+    Schedules are compatible when they share user, access token and
+    `compatibility_key(schedule)`. Returns [(user_id, access_token, [schedule, ...]), ...]
+    in queue order. Entries whose token cannot be resolved are dropped with an error.
+    """
+    groups = {}
+    resolved = {}
+    for entry in entries:
+        user_id = entry.get("user_id") or default_user_id
+        fingerprint = entry.get("token")
+        if fingerprint is None:
+            # Entries queued before tokens were fingerprinted
+            access_token = entry.get("access_token") or default_access_token
+        else:
+            if (fingerprint, user_id) not in resolved:
+                resolved[(fingerprint, user_id)] = resolve_access_token(fingerprint, user_id, [default_access_token])
+            access_token = resolved[(fingerprint, user_id)]
+        schedule = entry["schedule"]
+        if not access_token:
+            logging.error(f"Dropping queued schedule for user {user_id}: access token {fingerprint} is no longer known")
+            continue
+        group = groups.setdefault((user_id, access_token, compatibility_key(schedule)), (user_id, access_token, []))
+        if schedule not in group[2]:
+            group[2].append(schedule)
+    return list(groups.values())
+
+
+def run_coalesced(redis_client, lock, pending_key, user_id, access_token, schedule, compatibility_key, process_group):
+    """Process `schedule`, then everything queued for the account while it ran, under one lock.
+
+    Must be called with `lock` (an AccountLock) held; always releases it. Each drain merges
+    compatible schedules so `process_group(user_id, access_token, schedules)`
+    fetches once and applies every schedule's rule to that snapshot.
+
+    Once the lock is lost (the watchdog flags it, or process_group raises
+    LockLostError) nothing more is drained or processed: the unprocessed
+    groups, including the one that was refused, go back on the pending list
+    for the current holder. Returns the result of the first group.
+    """
+    groups = [(user_id, access_token, [schedule])]
+    results = []
+
+    while True:
+        try:
+            while groups:
+                if not lock.owned():
+                    raise LockLostError(f"Lock {lock.name} lost before processing {pending_key}")
+                group_user_id, group_access_token, schedules = groups[0]
+                if len(schedules) > 1:
+                    logging.info(f"Coalesced {len(schedules)} queued schedules from {pending_key} into one fetch")
+                # A refused group stays at the front of `groups` and is returned to the list below
+                results.append(process_group(group_user_id, group_access_token, schedules))
+                groups.pop(0)
+
+                if not groups:
+                    if not lock.owned():
+                        raise LockLostError(f"Lock {lock.name} lost before draining {pending_key}")
+                    groups = coalesce_pending(
+                        drain_pending_schedules(redis_client, pending_key), compatibility_key, user_id, access_token
+                    )
+        except LockLostError as e:
+            logging.error(f"{e}; returning {sum(len(group[2]) for group in groups)} schedules to {pending_key}")
+            requeue_schedules(redis_client, pending_key, groups)
+            results.append(f"Lock lost; schedules returned to {pending_key}")
+        finally:
+            lock.release()
+
+        # Something queued between the last drain and the release: take the lock back unless another task has it
+        if not redis_client.llen(pending_key) or not lock.acquire(blocking=False):
+            return results[0] if results else None
+        groups = coalesce_pending(
+            drain_pending_schedules(redis_client, pending_key), compatibility_key, user_id, access_token
+        )
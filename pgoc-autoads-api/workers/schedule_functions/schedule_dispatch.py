@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime, timedelta
+import redis
+from workers.schedule_functions.schedule_index import redis_schedule, due_schedule_keys
+
+WATERMARK_PREFIX = "schedule_watermark"
+FIRED_PREFIX = "schedule_fired"
+MINUTE_FORMAT = "%Y-%m-%d %H:%M"
+
+# After an outage, fire what was missed within this window and drop anything older
+MAX_CATCH_UP_MINUTES = 60
+# Idempotency keys only need to outlive the catch-up window
+FIRED_KEY_TTL = 2 * 86400
+# A tick that dies while holding the lock frees it after this
+TICK_LOCK_SECONDS = 300
+
+
+def watermark_key(kind):
+    return f"{WATERMARK_PREFIX}:{kind}"
+
+
+def fired_key(kind, ad_account_id, schedule_key, minute):
+    return f"{FIRED_PREFIX}:{kind}:{ad_account_id}:{schedule_key}:{minute.strftime(MINUTE_FORMAT)}"
+
+
+def tick_lock(kind):
+    """Keeps overlapping ticks of one dispatcher from scanning the same minutes concurrently."""
+    return redis_schedule.lock(f"lock:schedule_tick:{kind}", timeout=TICK_LOCK_SECONDS)
+
+
+def pending_minutes(kind, now):
+    """Return every minute after the last processed one, up to and including `now`.
+
+    Minutes are naive Manila datetimes. Without a watermark (first run) only the
+    current minute is due; beyond MAX_CATCH_UP_MINUTES the backlog is dropped.
+    """
+    current = now.replace(tzinfo=None, second=0, microsecond=0)
+    last_processed = redis_schedule.get(watermark_key(kind))
+    if not last_processed:
+        return [current]
+
+    first = datetime.strptime(last_processed, MINUTE_FORMAT) + timedelta(minutes=1)
+    if first > current:
+        return []
+
+    oldest_allowed = current - timedelta(minutes=MAX_CATCH_UP_MINUTES - 1)
+    if first < oldest_allowed:
+        logging.warning(
+            f"{kind} scheduler is {int((current - first).total_seconds() // 60) + 1} minutes behind; "
+            f"skipping schedules due before {oldest_allowed.strftime(MINUTE_FORMAT)}"
+        )
+        first = oldest_allowed
+
+    return [first + timedelta(minutes=offset) for offset in range(int((current - first).total_seconds() // 60) + 1)]
+
+
+def advance_watermark(kind, minutes, retry_from=None):
+    """Mark `minutes` as processed, stopping just before `retry_from` if a dispatch failed.
+
+    Schedules already fired in the retried range are skipped by their idempotency keys.
+    """
+    if not minutes:
+        return
+    processed_through = retry_from - timedelta(minutes=1) if retry_from else minutes[-1]
+    redis_schedule.set(watermark_key(kind), processed_through.strftime(MINUTE_FORMAT))
+
+
+def load_due_campaigns(kind, model, session, minutes):
+    """Load the rows with a schedule due in any of `minutes`.
+
+    Returns (campaigns, due) where due maps str(ad_account_id) to
+    [(schedule_key, minute), ...] taken from the minute index.
+    """
+    due = {}
+    for minute in minutes:
+        keys_by_account = due_schedule_keys(
+            kind, minute.strftime("%H:%M"),
+            lambda: session.query(model.ad_account_id, model.schedule_data).all(),
+        )
+        for ad_account_id, schedule_keys in keys_by_account.items():
+            due.setdefault(ad_account_id, []).extend((schedule_key, minute) for schedule_key in schedule_keys)
+
+    if not due:
+        return [], due
+
+    account_type = model.ad_account_id.type.python_type
+    campaigns = session.query(model).filter(
+        model.ad_account_id.in_([account_type(ad_account_id) for ad_account_id in due])
+    ).all()
+    return campaigns, due
+
+
+def match_due_schedules(schedule_data, due_entries):
+    """Re-check indexed entries against the row, which stays the source of truth.
+
+    Returns [(schedule_key, schedule, minute), ...].
+    """
+    matched = []
+    for schedule_key, minute in due_entries:
+        schedule = schedule_data.get(schedule_key)
+        if (
+            isinstance(schedule, dict)
+            and str(schedule.get("time", ""))[:5] == minute.strftime("%H:%M")
+            and schedule.get("status") != "Paused"
+        ):
+            matched.append((schedule_key, schedule, minute))
+    return matched
+
+
+def claim_schedule_run(kind, ad_account_id, schedule_key, minute):
+    """Return True exactly once per (account, schedule, date-minute)."""
+    return bool(redis_schedule.set(fired_key(kind, ad_account_id, schedule_key, minute), "1", nx=True, ex=FIRED_KEY_TTL))
+
+
+def release_schedule_run(kind, ad_account_id, schedule_key, minute):
+    """Undo a claim whose dispatch failed, so the next tick can retry it."""
+    try:
+        redis_schedule.delete(fired_key(kind, ad_account_id, schedule_key, minute))
+    except redis.RedisError as e:
+        logging.error(f"Could not release {kind} schedule claim for {ad_account_id} {schedule_key}: {e}")
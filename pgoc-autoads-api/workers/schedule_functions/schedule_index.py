@@ -0,0 +1,107 @@
+import logging
+import redis
+
+# Scheduler database (db 2), shared with the scheduler locks and pending queues
+redis_schedule = redis.StrictRedis(
+    host="redisAds",
+    port=6379,
+    db=2,
+    decode_responses=True
+)
+
+SCHEDULE_INDEX_PREFIX = "schedule_index"
+
+# Index kinds, one per schedule table
+SCHEDULED_CAMPAIGNS = "scheduled"  # CampaignsScheduled
+CAMPAIGN_OFF_ONLY = "off_only"  # CampaignOffOnly
+
+
+def minute_key(kind, minute):
+    """Set of 'ad_account_id|schedule_key' members due at minute 'HH:MM'."""
+    return f"{SCHEDULE_INDEX_PREFIX}:{kind}:minute:{minute}"
+
+
+def account_key(kind, ad_account_id):
+    """Set of 'HH:MM|schedule_key' members an account currently has in the index."""
+    return f"{SCHEDULE_INDEX_PREFIX}:{kind}:account:{ad_account_id}"
+
+
+def built_key(kind):
+    return f"{SCHEDULE_INDEX_PREFIX}:{kind}:built"
+
+
+def schedule_minutes(schedule_data):
+    """Yield (minute, schedule_key) for every schedule entry that can fire."""
+    if not isinstance(schedule_data, dict):
+        return
+    for schedule_key, schedule in schedule_data.items():
+        if not isinstance(schedule, dict) or schedule.get("status") == "Paused":
+            continue
+        minute = str(schedule.get("time", ""))[:5]
+        if minute:
+            yield minute, schedule_key
+
+
+def queue_account_update(pipe, kind, ad_account_id, old_members, schedule_data):
+    for member in old_members:
+        minute, schedule_key = member.split("|", 1)
+        pipe.srem(minute_key(kind, minute), f"{ad_account_id}|{schedule_key}")
+    pipe.delete(account_key(kind, ad_account_id))
+
+    for minute, schedule_key in schedule_minutes(schedule_data):
+        pipe.sadd(minute_key(kind, minute), f"{ad_account_id}|{schedule_key}")
+        pipe.sadd(account_key(kind, ad_account_id), f"{minute}|{schedule_key}")
+
+
+def index_account_schedules(kind, ad_account_id, schedule_data):
+    """Replace an account's entries in the minute index with its current schedule_data.
+
+    Call after every committed change to schedule_data (pass None once the row
+    is deleted). Re-indexing the whole account keeps renumbered time keys right.
+    """
+    try:
+        old_members = redis_schedule.smembers(account_key(kind, ad_account_id))
+        pipe = redis_schedule.pipeline(transaction=True)
+        queue_account_update(pipe, kind, ad_account_id, old_members, schedule_data)
+        pipe.execute()
+    except redis.RedisError as e:
+        # Force a full rebuild on the next tick rather than leave the index stale
+        logging.error(f"Could not update {kind} schedule index for {ad_account_id}: {e}")
+        try:
+            redis_schedule.delete(built_key(kind))
+        except redis.RedisError:
+            pass
+
+
+def remove_account_schedules(kind, ad_account_id):
+    index_account_schedules(kind, ad_account_id, None)
+
+
+def rebuild_schedule_index(kind, rows):
+    """Rebuild the whole index from (ad_account_id, schedule_data) rows."""
+    stale_keys = list(redis_schedule.scan_iter(f"{SCHEDULE_INDEX_PREFIX}:{kind}:*"))
+    pipe = redis_schedule.pipeline(transaction=True)
+    if stale_keys:
+        pipe.delete(*stale_keys)
+    for ad_account_id, schedule_data in rows:
+        queue_account_update(pipe, kind, ad_account_id, [], schedule_data)
+    pipe.set(built_key(kind), "1")
+    pipe.execute()
+    logging.info(f"Rebuilt {kind} schedule index")
+
+
+def due_schedule_keys(kind, minute, load_rows):
+    """Return {ad_account_id: [schedule_key, ...]} for schedules due at 'HH:MM'.
+
+    `load_rows()` returns every (ad_account_id, schedule_data) row and is only
+    called when the index is missing (first tick, Redis flush, failed update).
+    Account ids come back as strings.
+    """
+    if not redis_schedule.exists(built_key(kind)):
+        rebuild_schedule_index(kind, load_rows())
+
+    due = {}
+    for member in redis_schedule.smembers(minute_key(kind, minute)):
+        ad_account_id, schedule_key = member.split("|", 1)
+        due.setdefault(ad_account_id, []).append(schedule_key)
+    return due
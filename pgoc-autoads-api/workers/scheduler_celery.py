@@ -3,10 +3,17 @@ import redis
 import pytz
 from celery import shared_task
 from datetime import datetime
-from models.models import db, CampaignsScheduled
+from models.models import CampaignsScheduled
 from workers.campaign_fetcher import fetch_campaign
 from workers.on_off_functions.account_message import append_redis_message
-from sqlalchemy.orm import scoped_session, sessionmaker
+from workers.graph_functions.circuit_breaker import is_circuit_open
+from workers.schedule_functions.schedule_index import SCHEDULED_CAMPAIGNS
+from workers.schedule_functions.schedule_dispatch import (
+    tick_lock, pending_minutes, load_due_campaigns, match_due_schedules,
+    claim_schedule_run, release_schedule_run, advance_watermark,
+)
+from workers.worker_session import worker_session
+from workers.schedule_dispatcher import enqueue_scheduled_task, release_ready_tasks
 
 # Set up Redis clients
 redis_client = redis.StrictRedis(
@@ -27,18 +34,23 @@ manila_tz = pytz.timezone("Asia/Manila")
 
 @shared_task
 def check_scheduled_adaccounts():
-    """Check scheduled campaigns and trigger fetch_campaign with the correct schedule data."""
-    now = datetime.now(manila_tz).strftime("%H:%M")
-    current_time = datetime.now(manila_tz).strftime("%Y-%m-%d %H:%M:%S")
+    """Trigger fetch_campaign for every schedule due since the last processed minute, exactly once."""
+    now = datetime.now(manila_tz)
+    current_time = now.strftime("%Y-%m-%d %H:%M:%S")
+
+    lock = tick_lock(SCHEDULED_CAMPAIGNS)
+    if not lock.acquire(blocking=False):
+        return f"{current_time} - Previous check still running; the next run catches up this minute"
 
-    # Create an independent session
-    SessionLocal = scoped_session(sessionmaker(bind=db.engine))
+    # Independent session from the process-wide factory
+    SessionLocal = worker_session()
     session = SessionLocal()
 
     try:
-        # Fetch all campaigns with schedules
-        campaigns = session.query(CampaignsScheduled).all()
+        minutes = pending_minutes(SCHEDULED_CAMPAIGNS, now)
+        campaigns, due = load_due_campaigns(SCHEDULED_CAMPAIGNS, CampaignsScheduled, session, minutes)
         checked_ad_account_ids = []
+        retry_from = None
 
         for campaign in campaigns:
             user_id = campaign.user_id
@@ -57,24 +69,43 @@ def check_scheduled_adaccounts():
                 append_redis_message(user_id, ad_account_id, error_message)
                 continue
 
-            matched_schedules = [s for s in campaign.schedule_data.values() if s.get("time", "")[:5] == datetime.now().strftime("%H:%M") and s.get("status") != "Paused"]
+            matched_schedules = match_due_schedules(campaign.schedule_data, due.get(str(ad_account_id), []))
+
+            if matched_schedules and is_circuit_open(access_token, ad_account_id):
+                error_message = f"[{current_time}] Skipping {ad_account_id}: access token or ad account keeps failing authorization. Will retry later."
+                logging.warning(error_message)
+                append_redis_message(user_id, ad_account_id, error_message)
+                continue
+
+            for schedule_key, schedule, minute in matched_schedules:
+                if not claim_schedule_run(SCHEDULED_CAMPAIGNS, ad_account_id, schedule_key, minute):
+                    continue  # Already fired for this date and minute
 
-            if matched_schedules:
                 try:
-                    for schedule in matched_schedules:
-                        fetch_campaign.apply_async(args=[user_id, ad_account_id, access_token, schedule])
+                    expected_lag = enqueue_scheduled_task(
+                        fetch_campaign.name, user_id, ad_account_id, access_token, schedule,
+                        manila_tz.localize(minute).timestamp(),
+                    )
 
-                        success_message = f"[{current_time}] Triggered fetch_campaign for ad_account_id: {ad_account_id} with schedule: {schedule}"
-                        logging.info(success_message)
-                        append_redis_message(user_id, ad_account_id, success_message)
+                    late = f" (due {minute.strftime('%H:%M')})" if minute != minutes[-1] else ""
+                    success_message = f"[{current_time}] Queued fetch_campaign for ad_account_id: {ad_account_id} with schedule: {schedule}{late}, expected to start within ~{int(expected_lag)}s"
+                    logging.info(success_message)
+                    append_redis_message(user_id, ad_account_id, success_message)
 
-                    checked_ad_account_ids.append(ad_account_id)
+                    if ad_account_id not in checked_ad_account_ids:
+                        checked_ad_account_ids.append(ad_account_id)
 
                 except Exception as e:
+                    release_schedule_run(SCHEDULED_CAMPAIGNS, ad_account_id, schedule_key, minute)
+                    retry_from = min(retry_from or minute, minute)
                     error_message = f"[{current_time}] Error triggering fetch_campaign for {ad_account_id}: {str(e)}"
                     logging.error(error_message)
                     append_redis_message(user_id, ad_account_id, error_message)
 
+        advance_watermark(SCHEDULED_CAMPAIGNS, minutes, retry_from)
+
+        # Spread the burst: the dispatcher releases what the concurrency budgets allow
+        release_ready_tasks()
         return f"{current_time} - Checked Ad-Account-IDs: {checked_ad_account_ids}"
 
     except Exception as e:
@@ -84,3 +115,5 @@ def check_scheduled_adaccounts():
     finally:
         session.close()
         SessionLocal.remove()  # Cleanup session to prevent leaks
+        if lock.locked():
+            lock.release()
@@ -1,5 +1,4 @@
 import logging
-import requests
 import time
 from celery import shared_task
 from models.models import db, CampaignsScheduled
@@ -10,74 +9,62 @@ import re
 
 from workers.on_off_functions.account_message import append_redis_message
 from workers.on_off_functions.on_off_adsets import append_redis_message_adsets
+from workers.graph_functions.batch_writer import write_statuses
+from workers.graph_functions.verify_writes import verify_statuses
+from workers.schedule_functions.cpp_rules import evaluate_adsets, evaluate_campaigns, pending_writes, summarize, describe
 
 # Manila timezone
 manila_tz = timezone("Asia/Manila")
 
-# Facebook API constants
-FACEBOOK_API_VERSION = "v22.0"
-FACEBOOK_GRAPH_URL = f"https://graph.facebook.com/{FACEBOOK_API_VERSION}"
-
-def fetch_entity_status(entity_id, access_token):
-    """Fetch the current status of an entity from Facebook."""
-    url = f"{FACEBOOK_GRAPH_URL}/{entity_id}?fields=status"
-    try:
-        response = requests.get(
-            url, 
-            headers={"Authorization": f"Bearer {access_token}"}, 
-            timeout=10  # Increased timeout
-        )
-        response.raise_for_status()
-        data = response.json()
-        return data.get("status")
-    except Exception as e:
-        logging.error(f"Error fetching status for {entity_id}: {e}")
-        return None
-
 def update_facebook_status(user_id, ad_account_id, entity_id, new_status, access_token):
     """Update the status of a Facebook campaign or ad set using the Graph API."""
-    url = f"{FACEBOOK_GRAPH_URL}/{entity_id}"
-    payload = {"status": new_status}
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        logging.info(f"Successfully updated {entity_id} to {new_status}")
-        append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Successfully updated {entity_id} to {new_status}")
-        return True
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error updating {entity_id} to {new_status}: {e}")
-        append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error updating {entity_id} to {new_status}: {e}")
-        return False
+    return write_statuses(
+        access_token,
+        [(entity_id, new_status)],
+        lambda message: append_redis_message(user_id, ad_account_id, message),
+    )[entity_id]
+
+def update_facebook_statuses_with_retry(user_id, ad_account_id, updates, access_token, max_retries=2):
+    """Batch-update entity statuses with retry logic and verification.
+
+    `updates` is a list of (entity_id, entity_name, new_status). Writes are read
+    back together; only entities that failed or did not verify are rewritten.
+    Returns {entity_id: success}.
+    """
+    outcome = {entity_id: False for entity_id, _, _ in updates}
+    remaining = list(updates)
 
-def update_facebook_status_with_retry(user_id, ad_account_id, entity_id, entity_name, new_status, access_token, max_retries=2):
-    """Update Facebook entity status with retry logic and verification."""
     for attempt in range(max_retries + 1):  # +1 for the initial attempt
         if attempt > 0:
             # Log that we're retrying
-            append_redis_message_adsets(
-                user_id,
-                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Retry #{attempt} updating {entity_name} ({entity_id}) to {new_status}"
-            )
-        
-        # Attempt the update
-        success = update_facebook_status(user_id, ad_account_id, entity_id, new_status, access_token)
-        
-        if success:
-            # Verify the status change
-            time.sleep(1)  # Short delay to allow Facebook to process the change
-            current_status = fetch_entity_status(entity_id, access_token)
-            
+            for entity_id, entity_name, new_status in remaining:
+                append_redis_message_adsets(
+                    user_id,
+                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Retry #{attempt} updating {entity_name} ({entity_id}) to {new_status}"
+                )
+
+        # Attempt all pending updates in as few batch requests as possible
+        write_results = write_statuses(
+            access_token,
+            [(entity_id, new_status) for entity_id, _, new_status in remaining],
+            lambda message: append_redis_message(user_id, ad_account_id, message),
+        )
+
+        written = [update for update in remaining if write_results.get(update[0])]
+        failed = [update for update in remaining if not write_results.get(update[0])]
+
+        # Verify every successful write with one batched read-back
+        observed = verify_statuses(access_token, {entity_id: new_status for entity_id, _, new_status in written})
+
+        for entity_id, entity_name, new_status in written:
+            current_status = observed.get(entity_id)
+
             if current_status == new_status:
+                outcome[entity_id] = True
                 append_redis_message_adsets(
                     user_id,
                     f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Verified {entity_name} is now {new_status}"
                 )
-                return True
             else:
                 logging.warning(
                     f"Status mismatch for {entity_id}: Expected {new_status}, got {current_status}"
@@ -86,19 +73,31 @@ def update_facebook_status_with_retry(user_id, ad_account_id, entity_id, entity_
                     user_id,
                     f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Warning: {entity_name} status mismatch - Expected {new_status}, got {current_status}"
                 )
-        
+                failed.append((entity_id, entity_name, new_status))
+
+        remaining = failed
+        if not remaining:
+            break
+
         # If we're not on the last attempt, wait before retrying
         if attempt < max_retries:
             # Exponential backoff (2^attempt seconds)
             wait_time = 2 ** attempt
             time.sleep(wait_time)
-    
-    # If we get here, all retries failed
-    append_redis_message_adsets(
-        user_id,
-        f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Failed to update {entity_name} to {new_status} after {max_retries + 1} attempts"
-    )
-    return False
+
+    # Anything left failed every attempt
+    for entity_id, entity_name, new_status in remaining:
+        append_redis_message_adsets(
+            user_id,
+            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Failed to update {entity_name} to {new_status} after {max_retries + 1} attempts"
+        )
+    return outcome
+
+def update_facebook_status_with_retry(user_id, ad_account_id, entity_id, entity_name, new_status, access_token, max_retries=2):
+    """Update Facebook entity status with retry logic and verification."""
+    return update_facebook_statuses_with_retry(
+        user_id, ad_account_id, [(entity_id, entity_name, new_status)], access_token, max_retries
+    )[entity_id]
 
 # def extract_campaign_code(campaign_name):
 #     # Assuming campaign_code is part of the campaign_name (e.g., "Campaign XYZ-12345")
@@ -128,7 +127,12 @@ def is_campaign_code_match(campaign_name, campaign_code):
     return normalized_code in normalized_name
 
 @shared_task
-def process_scheduled_campaigns(user_id, ad_account_id, access_token, schedule_data):
+def process_scheduled_campaigns(user_id, ad_account_id, access_token, schedule_data, campaigns_data=None):
+    """Apply a schedule's CPP rule to its matched campaigns.
+
+    `campaigns_data` is the schedule's own match from the fetch; without it the
+    row's matched_campaign_data is used.
+    """
     try:
         logging.info(f"Processing schedule: {schedule_data}")
 
@@ -143,7 +147,7 @@ def process_scheduled_campaigns(user_id, ad_account_id, access_token, schedule_d
             return f"No campaign data found for Ad Account {ad_account_id}"
 
         # Use the pre-matched campaigns
-        campaign_data = campaign_entry.matched_campaign_data or {}
+        campaign_data = campaigns_data if campaigns_data is not None else (campaign_entry.matched_campaign_data or {})
 
         if not campaign_data:
             logging.warning(f"No matched campaign data found for Ad Account {ad_account_id}")
@@ -152,28 +156,23 @@ def process_scheduled_campaigns(user_id, ad_account_id, access_token, schedule_d
 
         update_success = False
         if watch == "Campaigns":
-            for campaign_id, campaign_info in campaign_data.items():
-                current_status = campaign_info.get("STATUS", "")
-                campaign_cpp = campaign_info.get("CPP", 0)
-                campaign_name = campaign_info.get("campaign_name", "")
-
-                # Decide whether to turn ON or OFF
-                if on_off == "ON" and campaign_cpp < cpp_metric:
-                    new_status = "ACTIVE"
-                elif on_off == "OFF" and campaign_cpp >= cpp_metric:
-                    new_status = "PAUSED"
-                else:
-                    logging.info(f"Campaign {campaign_id} remains {current_status}")
-                    append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Campaign {campaign_name} ID: {campaign_id} remains {current_status}")
-                    continue
-
-                if current_status != new_status:
-                    success = update_facebook_status(user_id, ad_account_id, campaign_id, new_status, access_token)
-                    if success:
-                        campaign_info["STATUS"] = new_status
-                        update_success = True
-                        logging.info(f"Updated Campaign {campaign_id} -> {new_status}")
-                        append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Updated Campaign {campaign_name} ID: {campaign_id} -> {new_status}")
+            # Evaluate every campaign first, then diff against current statuses; only changes reach the writer
+            decisions = evaluate_campaigns(campaign_data, cpp_metric, on_off)
+            pending_updates = pending_writes(decisions)
+            append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {summarize(decisions, 'campaigns')}")
+
+            # Send every status change in batched round-trips
+            results = write_statuses(
+                access_token,
+                [(decision.entity_id, decision.target_status) for decision in pending_updates],
+                lambda message: append_redis_message(user_id, ad_account_id, message),
+            )
+            for decision in pending_updates:
+                if results.get(decision.entity_id):
+                    campaign_data[decision.entity_id]["STATUS"] = decision.target_status
+                    update_success = True
+                    logging.info(f"Updated Campaign {decision.entity_id} -> {decision.target_status}")
+                    append_redis_message(user_id, ad_account_id, f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Updated Campaign {decision.name} ID: {decision.entity_id} -> {decision.target_status}")
 
         if update_success:
             campaign_entry.matched_campaign_data = campaign_data
@@ -213,110 +212,43 @@ def process_adsets(user_id, ad_account_id, access_token, schedule_data, campaign
             f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Processing adsets with CPP threshold: ${cpp_metric}, Mode: {on_off}"
         )
 
-        total_processed = 0
+        # Evaluate every adset of the matching campaigns, then diff against current statuses; only changes reach the writer
+        decisions = evaluate_adsets(campaigns_data, campaign_code, cpp_metric, on_off, is_campaign_code_match)
+        pending_updates = pending_writes(decisions)
+        total_processed = len(decisions)
         total_updated = 0
 
-        for campaign_id, campaign_info in campaigns_data.items():
-            campaign_name = campaign_info.get("campaign_name", "")
-            
-            # Check if this campaign matches the campaign code
-            if not is_campaign_code_match(campaign_name, campaign_code):
-                continue
-
+        append_redis_message_adsets(
+            user_id,
+            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {summarize(decisions)}"
+        )
+        for decision in pending_updates:
             append_redis_message_adsets(
                 user_id,
-                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Processing campaign: {campaign_name}"
+                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {decision.name}: Current={decision.current_status}, Target={decision.target_status} ({describe(decision, cpp_metric)})"
             )
 
-            adsets = campaign_info.get("ADSETS", {})
-            
-            for adset_id, adset_info in adsets.items():
-                adset_cpp = adset_info.get("CPP", 0)
-                current_status = adset_info.get("STATUS", "")
-                adset_name = adset_info.get("NAME", "Unknown")
-                
-                total_processed += 1
-
-                # Handle adsets with no sales (CPP = infinity) - turn them OFF
-                if adset_cpp == float('inf') or adset_cpp is None:
-                    if current_status != "PAUSED":
-                        target_status = "PAUSED"
-                        reason = "No sales/checkouts - turning OFF"
-                        append_redis_message_adsets(
-                            user_id,
-                            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {adset_name}: No sales detected - will turn OFF"
-                        )
-                    else:
-                        append_redis_message_adsets(
-                            user_id,
-                            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ➤ {adset_name} already OFF (no sales)"
-                        )
-                        continue
-                # Skip adsets with CPP = 0 (no spend)
-                elif adset_cpp == 0:
-                    append_redis_message_adsets(
-                        user_id,
-                        f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Skipping {adset_name} - No spend data (CPP = 0)"
-                    )
-                    continue
-                else:
-                    # Determine target status based on CPP and mode for adsets with valid CPP
-                    if on_off == "OFF":
-                        # OFF mode: Turn OFF adsets with CPP >= threshold
-                        if adset_cpp >= cpp_metric:
-                            target_status = "PAUSED"
-                            reason = f"CPP ${adset_cpp:.2f} >= threshold ${cpp_metric} - turning OFF"
-                        else:
-                            # CPP is below threshold, do not turn ON, just leave as is
-                            append_redis_message_adsets(
-                                user_id,
-                                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {adset_name}: CPP ${adset_cpp:.2f} < threshold ${cpp_metric} - will remain {current_status}"
-                            )
-                            continue
-                            
-                    elif on_off == "ON":
-                        # ON mode: Turn ON adsets with CPP < threshold, turn OFF those with CPP >= threshold
-                        if adset_cpp < cpp_metric:
-                            target_status = "ACTIVE"
-                            reason = f"CPP ${adset_cpp:.2f} < threshold ${cpp_metric} - turning ON"
-                        else:
-                            target_status = "PAUSED"
-                            reason = f"CPP ${adset_cpp:.2f} >= threshold ${cpp_metric} - turning OFF"
-
-                # Log the decision
+        # Apply every pending change through batched writes
+        results = update_facebook_statuses_with_retry(
+            user_id,
+            ad_account_id,
+            [(decision.entity_id, decision.name, decision.target_status) for decision in pending_updates],
+            access_token,
+        )
+
+        for decision in pending_updates:
+            if results.get(decision.entity_id):
+                campaigns_data[decision.campaign_id]["ADSETS"][decision.entity_id]["STATUS"] = decision.target_status
+                total_updated += 1
                 append_redis_message_adsets(
                     user_id,
-                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {adset_name}: Current={current_status}, Target={target_status} ({reason})"
+                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✓ Successfully updated {decision.name} to {decision.target_status}"
+                )
+            else:
+                append_redis_message_adsets(
+                    user_id,
+                    f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✗ Failed to update {decision.name} to {decision.target_status}"
                 )
-
-                # Update if status needs to change
-                if current_status != target_status:
-                    append_redis_message_adsets(
-                        user_id,
-                        f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Updating {adset_name} from {current_status} to {target_status}"
-                    )
-                    
-                    success = update_facebook_status_with_retry(
-                        user_id, ad_account_id, adset_id, adset_name, target_status, access_token
-                    )
-                    
-                    if success:
-                        adset_info["STATUS"] = target_status
-                        total_updated += 1
-                        append_redis_message_adsets(
-                            user_id,
-                            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✓ Successfully updated {adset_name} to {target_status}"
-                        )
-                    else:
-                        append_redis_message_adsets(
-                            user_id,
-                            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✗ Failed to update {adset_name} to {target_status}"
-                        )
-                else:
-                    append_redis_message_adsets(
-                        user_id,
-                        f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ➤ {adset_name} already in correct state ({current_status})"
-                    )
 
         # Final summary
         append_redis_message_adsets(
@@ -0,0 +1,17 @@
+from sqlalchemy.orm import scoped_session, sessionmaker
+from models.models import db
+
+# One session factory per worker process, bound to the app's engine on first use
+_session_factory = None
+
+
+def worker_session():
+    """Return the process-wide scoped session factory for beat/worker tasks.
+
+    Must be called inside the app context that FlaskTask provides. Callers
+    use `session = SessionLocal()` and finish with `SessionLocal.remove()`.
+    """
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = scoped_session(sessionmaker(bind=db.engine))
+    return _session_factory